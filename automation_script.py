@@ -1,6 +1,6 @@
 import pandas as pd
 import requests
-from io import StringIO
+from io import BytesIO, StringIO
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -16,16 +16,88 @@ from datetime import datetime, timedelta
 import time
 import random
 import json
+import logging
 import os
+import argparse
+import base64
 import sys
+import copy
+import gzip
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import wraps
 import pytz
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.remote_connection import RemoteConnection
+from urllib3.exceptions import HTTPError as DriverConnectionError
+
+import lims_http_client
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# ============================================================================
+# LOGGING
+# ============================================================================
+
+# DEBUG adds click-level detail, full state dumps and DataFrame previews
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# 'text' keeps the familiar console lines; 'json' writes one object per line for log tooling
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+
+log = logging.getLogger('automation')
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per record, tagged with the current step, user, project and sample."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname.lower(),
+            'message': record.getMessage().strip(),
+        }
+        if active_steps:
+            entry['step'] = active_steps[-1][0]
+        for key in ('username', 'project', 'sample'):
+            if span_context.get(key) is not None:
+                entry[key] = span_context[key]
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def configure_logging(level=None, fmt=None):
+    """(Re)configure the automation logger; level and format default to LOG_LEVEL / LOG_FORMAT."""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonLogFormatter() if (fmt or LOG_FORMAT) == 'json' else logging.Formatter('%(message)s'))
+    for old in list(log.handlers):
+        log.removeHandler(old)
+    log.addHandler(handler)
+    log.setLevel(level or LOG_LEVEL)
+    log.propagate = False
+
+if not log.handlers:
+    configure_logging()
 
 # ============================================================================
 # USER CONFIGURATION
 # ============================================================================
 
-# Configuration for different users
+# The LIMS to drive; point it at mock_lims.py for offline runs and benchmarks
+LIMS_BASE_URL = os.environ.get('LIMS_BASE_URL', 'https://crucial-enviro.alphatracker.online/')
+
+# Configuration for different users. A user's results can be split across several
+# sheets/tabs by giving 'spreadsheet_urls' (a list) instead of 'spreadsheet_url';
+# sources are fetched concurrently and merged, earlier sources winning on duplicates.
+# 'project_order' (a list of PROJECT_ORDER_KEYS names) sets how projects are prioritised.
 USER_CONFIG = {
     'ryan': {
         'spreadsheet_url': 'https://docs.google.com/spreadsheets/d/1cK7Agui9UMlPr2p1K2jI3jtZxyJuYtm7jP5hi9g4i4Q/export?format=csv&gid=433984109',
@@ -45,6 +117,20 @@ def get_user_config(username):
         raise ValueError(f"Unknown user: {username}. Available users: {list(USER_CONFIG.keys())}")
     return USER_CONFIG[username]
 
+def get_spreadsheet_urls(config):
+    """All result sheet sources configured for a user."""
+    return list(config.get('spreadsheet_urls') or [config['spreadsheet_url']])
+
+# Working hours (UK time) used by watcher mode; a user can override them with a
+# 'schedule' entry in USER_CONFIG. Matches the workflows' weekday cron window.
+DEFAULT_SCHEDULE = {'days': [0, 1, 2, 3, 4], 'start': '09:00', 'end': '18:00'}
+
+def within_schedule(config, now=None):
+    """True if the user's schedule allows processing at the given UK time."""
+    schedule = config.get('schedule', DEFAULT_SCHEDULE)
+    now = now or get_uk_time()
+    return now.weekday() in schedule['days'] and schedule['start'] <= now.strftime('%H:%M') < schedule['end']
+
 # ============================================================================
 # REAL-TIME UK TIMING FUNCTIONS
 # ============================================================================
@@ -76,10 +162,10 @@ def calculate_realistic_times():
     start_time_str = start_time.strftime('%d/%m/%Y %H:%M:%S')
     end_time_str = end_time.strftime('%d/%m/%Y %H:%M:%S')
     
-    print(f"🕐 Calculated realistic times:")
-    print(f"   📅 Start Time: {start_time_str}")
-    print(f"   🏁 End Time: {end_time_str}")
-    print(f"   ⏱️  Duration: {minutes_ago/60:.1f} minutes")
+    log.info("🕐 Calculated realistic times:")
+    log.info("   📅 Start Time: %s", start_time_str)
+    log.info("   🏁 End Time: %s", end_time_str)
+    log.info("   ⏱️  Duration: %.1f minutes", minutes_ago / 60)
     
     return start_time_str, end_time_str
 
@@ -108,6 +194,12 @@ def setup_chrome_for_github():
     # Additional options to help with rendering
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
     chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    
+    # Network events in the performance log are used to confirm saves
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    # Hard limit on every WebDriver command, so a wedged chromedriver raises instead of hanging
+    RemoteConnection.set_timeout(DRIVER_COMMAND_TIMEOUT)
 
     from webdriver_manager.chrome import ChromeDriverManager
     service = Service(ChromeDriverManager().install()) 
@@ -120,10 +212,18 @@ def setup_chrome_for_github():
     driver.execute_script("window.moveTo(0, 0);")
     driver.execute_script("window.resizeTo(1920, 1080);")
     
+    # Async probes (e.g. the UI idle detector) bound their own waits; these are
+    # backstops that fire before the hard command timeout
+    driver.set_script_timeout(DRIVER_COMMAND_TIMEOUT - 10)
+    driver.set_page_load_timeout(DRIVER_COMMAND_TIMEOUT - 10)
+    
     return driver
 
-def capture_screenshot(driver, filename, username):
-    """Captures a screenshot with user-specific naming"""
+def capture_screenshot(driver, filename, username, failure=False):
+    """
+    Record the page at a call site. Error sites pass failure=True and get a
+    compact artifact bundle; other screenshots are only taken with DEBUG_SCREENSHOTS.
+    """
     try:
         # Add username prefix to filename
         user_filename = f"{username}_{filename}"
@@ -147,51 +247,650 @@ def capture_screenshot(driver, filename, username):
         if len(sanitized_filename) > 100:
             sanitized_filename = sanitized_filename[:96] + '.png'
         
-        driver.save_screenshot(sanitized_filename)
-        print(f"Screenshot saved: {sanitized_filename}")
+        if failure:
+            write_failure_bundle(driver, sanitized_filename[:-len('.png')], username)
+        elif DEBUG_SCREENSHOTS:
+            driver.save_screenshot(sanitized_filename)
+            log.debug("Screenshot saved: %s", sanitized_filename)
+    except Exception as e:
+        log.warning("Could not save screenshot: %s", e)
+
+# ============================================================================
+# FAILURE ARTIFACTS
+# ============================================================================
+
+# Each failure is written to <FAILURE_ARTIFACT_DIR>/<user>/ as a small JSON bundle
+# (name, step, URL, project, sample) pointing at a gzipped copy of the page
+# source and one downscaled JPEG screenshot. Pages and images are shared
+# between bundles: page sources by content hash, images by perceptual hash
+# (or byte hash without Pillow), so a cascade of failures on one screen costs
+# one image.
+FAILURE_ARTIFACT_DIR = os.environ.get('FAILURE_ARTIFACT_DIR', 'failure_artifacts')
+# Screenshots of steps that went fine are only useful when debugging
+DEBUG_SCREENSHOTS = os.environ.get('DEBUG_SCREENSHOTS', 'false').lower() == 'true'
+SCREENSHOT_SCALE = 0.5
+SCREENSHOT_JPEG_QUALITY = 60
+# Perceptual hashes this many bits apart or less count as the same image
+IMAGE_HASH_MAX_DISTANCE = 4
+
+def capture_downscaled_screenshot(driver):
+    """The visible page as (bytes, extension): a scaled-down JPEG over CDP, else a full PNG."""
+    try:
+        metrics = driver.execute_cdp_cmd('Page.getLayoutMetrics', {})
+        viewport = metrics.get('cssLayoutViewport') or metrics['layoutViewport']
+        shot = driver.execute_cdp_cmd('Page.captureScreenshot', {
+            'format': 'jpeg',
+            'quality': SCREENSHOT_JPEG_QUALITY,
+            'clip': {
+                'x': viewport.get('pageX', 0),
+                'y': viewport.get('pageY', 0),
+                'width': viewport['clientWidth'],
+                'height': viewport['clientHeight'],
+                'scale': SCREENSHOT_SCALE,
+            },
+        })
+        return base64.b64decode(shot['data']), 'jpg'
+    except Exception:
+        try:
+            return driver.get_screenshot_as_png(), 'png'
+        except Exception:
+            return None, None
+
+def image_hash(data):
+    """'p' + 64-bit difference hash with Pillow, else 's' + a byte hash."""
+    if Image is not None:
+        try:
+            pixels = list(Image.open(BytesIO(data)).convert('L').resize((9, 8)).getdata())
+            bits = 0
+            for row in range(8):
+                for col in range(8):
+                    bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+            return f"p{bits:016x}"
+        except Exception:
+            pass
+    return 's' + hashlib.sha256(data).hexdigest()[:16]
+
+# Images already stored per artifact folder, read from disk once per process:
+# {folder: {hash: file name}}, plus the perceptual hashes as ints for the distance check
+image_index = {}
+perceptual_image_hashes = {}
+
+def _image_index(folder):
+    if folder not in image_index:
+        index = {}
+        for existing in os.listdir(folder):
+            if existing.startswith('img_'):
+                index.setdefault(existing[len('img_'):].split('.')[0], existing)
+        image_index[folder] = index
+        perceptual_image_hashes[folder] = [(int(k[1:], 16), k) for k in index if k[0] == 'p']
+    return image_index[folder]
+
+def store_deduplicated_image(folder, data, extension):
+    """Save an image unless a (perceptually) identical one is already there; returns its file name."""
+    key = image_hash(data)
+    index = _image_index(folder)
+    if key in index:
+        return index[key]
+    if key[0] == 'p':
+        bits = int(key[1:], 16)
+        for existing_bits, existing_key in perceptual_image_hashes[folder]:
+            if bin(bits ^ existing_bits).count('1') <= IMAGE_HASH_MAX_DISTANCE:
+                return index[existing_key]
+    filename = f"img_{key}.{extension}"
+    with open(os.path.join(folder, filename), 'wb') as f:
+        f.write(data)
+    index[key] = filename
+    if key[0] == 'p':
+        perceptual_image_hashes[folder].append((bits, key))
+    return filename
+
+def write_failure_bundle(driver, name, username):
+    """Write the failure bundle for one call site."""
+    folder = os.path.join(FAILURE_ARTIFACT_DIR, username)
+    os.makedirs(folder, exist_ok=True)
+    bundle = {
+        'name': name,
+        'time': get_uk_time().isoformat(),
+        'step': active_steps[-1][0] if active_steps else None,
+        'project': span_context.get('project'),
+        'sample': span_context.get('sample'),
+        'url': None,
+        'dom': None,
+        'screenshot': None,
+    }
+    try:
+        bundle['url'] = driver.current_url
+        html = driver.page_source
+        dom_file = f"dom_{hashlib.sha256(html.encode('utf-8')).hexdigest()[:16]}.html.gz"
+        if not os.path.exists(os.path.join(folder, dom_file)):
+            with gzip.open(os.path.join(folder, dom_file), 'wt', encoding='utf-8') as f:
+                f.write(html)
+        bundle['dom'] = dom_file
+    except Exception as e:
+        bundle['dom_error'] = str(e)
+
+    data, extension = capture_downscaled_screenshot(driver)
+    if data:
+        bundle['screenshot'] = store_deduplicated_image(folder, data, extension)
+
+    bundle_file = os.path.join(folder, f"{get_uk_time().strftime('%Y%m%d-%H%M%S')}_{name}.json")
+    with open(bundle_file, 'w') as f:
+        json.dump(bundle, f, indent=2, default=str)
+    log.info("🧾 Failure artifacts saved: %s", bundle_file)
+
+# ============================================================================
+# ADAPTIVE WAIT TIMEOUTS
+# ============================================================================
+
+# Timeouts are derived from the observed latency of each wait site instead of
+# fixed values. The hard-coded timeout at each call site is used until enough
+# history exists, and always bounds how far the adaptive value may grow.
+ADAPTIVE_TIMEOUT_WINDOW = 50          # Latencies kept per wait site
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 5      # Observations needed before adapting
+ADAPTIVE_TIMEOUT_PERCENTILE = 95
+ADAPTIVE_TIMEOUT_MULTIPLIER = 1.5     # Headroom on top of the percentile
+ADAPTIVE_TIMEOUT_PADDING = 2.0        # Seconds added after the multiplier
+ADAPTIVE_TIMEOUT_MIN = 3.0            # Never wait less than this
+ADAPTIVE_TIMEOUT_MAX_FACTOR = 3.0     # Never wait more than default * factor
+
+# Rolling latency history per wait site. Kept out of the committed state file (it changes
+# on every run) in wait_latencies/<user>.json, which is not committed
+wait_latencies = {}
+WAIT_LATENCY_DIR = os.environ.get('WAIT_LATENCY_DIR', 'wait_latencies')
+
+def wait_latency_file(username):
+    return os.path.join(WAIT_LATENCY_DIR, f"{username}.json")
+
+def load_wait_latencies(username, legacy=None):
+    """Load a user's wait latencies, falling back to those an older state file carried."""
+    path = wait_latency_file(username)
+    latencies = legacy or {}
+    try:
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                latencies = json.load(f)
+    except Exception as e:
+        log.warning("⚠️ Could not load wait latencies for %s: %s", username, e)
+    wait_latencies.clear()
+    wait_latencies.update(latencies)
+
+def save_wait_latencies(username):
+    try:
+        os.makedirs(WAIT_LATENCY_DIR, exist_ok=True)
+        with open(wait_latency_file(username), 'w') as f:
+            json.dump(wait_latencies, f)
+    except Exception as e:
+        log.warning("⚠️ Could not save wait latencies for %s: %s", username, e)
+
+def latency_percentile(values, percentile):
+    """Nearest-rank percentile of a list of latencies."""
+    ordered = sorted(values)
+    rank = max(1, int(round(percentile / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def adaptive_timeout(site, default_timeout):
+    """Return the timeout to use for a wait site based on its latency history."""
+    history = wait_latencies.get(site, [])
+    if len(history) < ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+        return default_timeout
+
+    observed = latency_percentile(history, ADAPTIVE_TIMEOUT_PERCENTILE)
+    timeout = observed * ADAPTIVE_TIMEOUT_MULTIPLIER + ADAPTIVE_TIMEOUT_PADDING
+    return round(max(ADAPTIVE_TIMEOUT_MIN, min(timeout, default_timeout * ADAPTIVE_TIMEOUT_MAX_FACTOR)), 2)
+
+def record_wait_latency(site, seconds):
+    """Add an observed latency to the rolling window of a wait site."""
+    history = wait_latencies.setdefault(site, [])
+    history.append(round(seconds, 3))
+    del history[:-ADAPTIVE_TIMEOUT_WINDOW]
+
+def _timed_wait(driver, site, default_timeout, condition, negate, record_timeouts):
+    timeout = adaptive_timeout(site, default_timeout)
+    wait = WebDriverWait(driver, timeout)
+    started = time.monotonic()
+    try:
+        result = wait.until_not(condition) if negate else wait.until(condition)
+    except TimeoutException:
+        # A timeout is a lower bound on the real latency; recording it lets the
+        # timeout grow on its own while the LIMS is slow.
+        if record_timeouts:
+            record_wait_latency(site, timeout)
+        raise
+    record_wait_latency(site, time.monotonic() - started)
+    return result
+
+def wait_until(driver, site, default_timeout, condition, record_timeouts=True):
+    """
+    WebDriverWait(...).until() with a timeout learned from the site's history.
+
+    Set record_timeouts=False for probes that are expected to time out (e.g.
+    optional popups), so that only real appearances shape their timeout.
+    """
+    return _timed_wait(driver, site, default_timeout, condition, False, record_timeouts)
+
+def wait_until_not(driver, site, default_timeout, condition, record_timeouts=True):
+    """WebDriverWait(...).until_not() with a timeout learned from the site's history."""
+    return _timed_wait(driver, site, default_timeout, condition, True, record_timeouts)
+
+# ============================================================================
+# STEP TIMINGS
+# ============================================================================
+
+# Wall time of every named pipeline step in this process: {step: [seconds, ...]}
+STEP_TIMINGS = {}
+
+# The browser and sample the current run is working on, for instrumentation
+# that hooks into step spans: {'driver', 'username', 'project', 'sample'}
+span_context = {}
+
+# Step spans in progress, innermost last: [(name, HAR page id), ...]
+active_steps = []
+
+@contextmanager
+def step_span(name):
+    """Time a pipeline step (e.g. 'project.open', 'step.sample_size') into STEP_TIMINGS."""
+    if CAPTURE_HAR and span_context.get('driver') is not None:
+        # Network events so far belong to the enclosing step (or to no step)
+        read_performance_log(span_context['driver'])
+    capture = CAPTURE_HAR and span_context.get('driver') is not None
+    active_steps.append((name, start_har_page(name) if capture else None))
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - started
+        STEP_TIMINGS.setdefault(name, []).append(elapsed)
+        driver = span_context.get('driver')
+        if RECORD_DOM_DIR and driver is not None:
+            record_dom_snapshot(driver, name)
+        if CAPTURE_HAR:
+            if driver is not None:
+                read_performance_log(driver)
+            end_har_page(active_steps[-1][1], elapsed)
+        if PAGE_METRICS_FILE and driver is not None:
+            record_page_metrics(driver, name, elapsed)
+        active_steps.pop()
+
+# ============================================================================
+# DOM RECORDING FOR OFFLINE REPLAY
+# ============================================================================
+
+# When set, the page HTML is saved at the end of every step span and before every
+# result-plan click, for dom_replay.py to check locator changes without a browser.
+# Each run gets <RECORD_DOM_DIR>/<user>-<timestamp>/ with a manifest.jsonl index.
+RECORD_DOM_DIR = os.environ.get('RECORD_DOM_DIR', '')
+
+def record_dom_snapshot(driver, label, action=None):
+    """Save the current page HTML (gzipped) under label with the run's project and sample."""
+    try:
+        if 'record_dir' not in span_context:
+            run_name = f"{span_context.get('username', 'run')}-{get_uk_time().strftime('%Y%m%d-%H%M%S')}"
+            span_context['record_dir'] = os.path.join(RECORD_DOM_DIR, run_name)
+            span_context['record_seq'] = 0
+            os.makedirs(span_context['record_dir'], exist_ok=True)
+        span_context['record_seq'] += 1
+
+        # page_source serializes attributes, not live properties; copy typed input values across
+        driver.execute_script(
+            "document.querySelectorAll('input, textarea').forEach(function (el) { el.setAttribute('value', el.value); });"
+        )
+        filename = f"{span_context['record_seq']:04d}_{re.sub(r'[^A-Za-z0-9_.-]', '_', label)}.html.gz"
+        with gzip.open(os.path.join(span_context['record_dir'], filename), 'wt', encoding='utf-8') as f:
+            f.write(driver.page_source)
+
+        entry = {
+            'seq': span_context['record_seq'],
+            'label': label,
+            'file': filename,
+            'url': driver.current_url,
+            'project': span_context.get('project'),
+            'sample': span_context.get('sample'),
+            'action': action,
+        }
+        with open(os.path.join(span_context['record_dir'], 'manifest.jsonl'), 'a') as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+    except Exception as e:
+        log.warning("⚠️ Could not record DOM snapshot '%s': %s", label, e)
+
+# ============================================================================
+# NETWORK CAPTURE (HAR)
+# ============================================================================
+
+# When set, every CDP network event read from Chrome's performance log is also
+# kept, and each run is written to <CAPTURE_HAR>/<user>-<timestamp>.har.gz.
+# Every step span occurrence is a HAR page, so requests are tagged with the
+# step they ran in; har_summary.py reports the slowest requests per step.
+CAPTURE_HAR = os.environ.get('CAPTURE_HAR', '')
+
+# Network capture of the current run: HAR pages, and requests by CDP request id
+har_recorder = {'pages': [], 'requests': {}, 'order': []}
+
+def start_har_page(name):
+    page_id = f"{name}#{len(har_recorder['pages']) + 1}"
+    har_recorder['pages'].append({
+        'startedDateTime': datetime.now(pytz.utc).isoformat(),
+        'id': page_id,
+        'title': name,
+        'pageTimings': {},
+    })
+    return page_id
+
+def end_har_page(page_id, seconds):
+    for page in har_recorder['pages']:
+        if page['id'] == page_id:
+            page['pageTimings']['onLoad'] = round(seconds * 1000, 1)
+
+def _har_headers(headers):
+    return [{'name': name, 'value': str(value)} for name, value in (headers or {}).items()]
+
+def record_network_events(messages):
+    """Fold CDP Network.* events into har_recorder, tagged with the current step span."""
+    page_id = active_steps[-1][1] if active_steps else None
+    requests_by_id = har_recorder['requests']
+    for message in messages:
+        method = message.get('method', '')
+        params = message.get('params', {})
+        request_id = params.get('requestId')
+        if not method.startswith('Network.') or request_id is None:
+            continue
+
+        if method == 'Network.requestWillBeSent':
+            if request_id in requests_by_id and params.get('redirectResponse'):
+                # A redirect reuses the request id; keep the hop as its own entry
+                hop_id = f"{request_id}:{len(har_recorder['order'])}"
+                hop = requests_by_id.pop(request_id)
+                hop['response'] = params['redirectResponse']
+                hop['finished'] = params.get('timestamp')
+                requests_by_id[hop_id] = hop
+                har_recorder['order'][har_recorder['order'].index(request_id)] = hop_id
+            requests_by_id[request_id] = {
+                'request': params.get('request', {}),
+                'started': params.get('timestamp'),
+                'wall_time': params.get('wallTime'),
+                'page': page_id,
+            }
+            har_recorder['order'].append(request_id)
+            continue
+
+        record = requests_by_id.get(request_id)
+        if record is None:
+            continue
+        if record.get('page') is None:
+            record['page'] = page_id
+        if method == 'Network.responseReceived':
+            record['response'] = params.get('response', {})
+        elif method == 'Network.loadingFinished':
+            record['finished'] = params.get('timestamp')
+            record['encoded_size'] = params.get('encodedDataLength', 0)
+        elif method == 'Network.loadingFailed':
+            record['finished'] = params.get('timestamp')
+            record['error'] = params.get('errorText', 'failed')
+
+def _har_timings(record):
+    """HAR timings (ms) from the CDP ResourceTiming of a response."""
+    timing = (record.get('response') or {}).get('timing')
+    total = ((record.get('finished') or record['started']) - record['started']) * 1000
+    if not timing:
+        return {'send': 0, 'wait': max(total, 0), 'receive': 0}, total
+
+    def span(start, end):
+        return max(timing[end] - timing[start], 0) if timing.get(start, -1) >= 0 else -1
+
+    first = next((timing[k] for k in ('dnsStart', 'connectStart', 'sendStart') if timing.get(k, -1) >= 0), 0)
+    headers_end = timing['requestTime'] * 1000 + timing['receiveHeadersEnd']
+    receive = (record['finished'] * 1000 - headers_end) if record.get('finished') else 0
+    timings = {
+        'blocked': max(first, 0),
+        'dns': span('dnsStart', 'dnsEnd'),
+        'connect': span('connectStart', 'connectEnd'),
+        'ssl': span('sslStart', 'sslEnd'),
+        'send': span('sendStart', 'sendEnd'),
+        'wait': max(timing['receiveHeadersEnd'] - timing['sendEnd'], 0),
+        'receive': max(receive, 0),
+    }
+    return timings, total
+
+def build_har():
+    """The captured run as a HAR 1.2 document."""
+    entries = []
+    for request_id in har_recorder['order']:
+        record = har_recorder['requests'].get(request_id)
+        if record is None or record.get('started') is None:
+            continue
+        request, response = record['request'], record.get('response') or {}
+        timings, total = _har_timings(record)
+        started = datetime.fromtimestamp(record['wall_time'], pytz.utc) if record.get('wall_time') else None
+        entry = {
+            'startedDateTime': started.isoformat() if started else '',
+            'time': round(total, 1),
+            'request': {
+                'method': request.get('method', 'GET'),
+                'url': request.get('url', ''),
+                'httpVersion': response.get('protocol', ''),
+                'headers': _har_headers(request.get('headers')),
+                'queryString': [],
+                'cookies': [],
+                'headersSize': -1,
+                'bodySize': len(request.get('postData', '')),
+            },
+            'response': {
+                'status': response.get('status', 0),
+                'statusText': response.get('statusText', ''),
+                'httpVersion': response.get('protocol', ''),
+                'headers': _har_headers(response.get('headers')),
+                'cookies': [],
+                'content': {'size': record.get('encoded_size', 0), 'mimeType': response.get('mimeType', '')},
+                'redirectURL': '',
+                'headersSize': -1,
+                'bodySize': record.get('encoded_size', -1),
+            },
+            'cache': {},
+            'timings': {k: round(v, 1) for k, v in timings.items()},
+        }
+        if request.get('postData'):
+            entry['request']['postData'] = {'mimeType': '', 'text': request['postData']}
+        if record.get('page'):
+            entry['pageref'] = record['page']
+        if record.get('error'):
+            entry['_error'] = record['error']
+        entries.append(entry)
+    return {'log': {
+        'version': '1.2',
+        'creator': {'name': 'automation_script', 'version': '1'},
+        'pages': har_recorder['pages'],
+        'entries': entries,
+    }}
+
+def write_har(username):
+    """Write the captured run to CAPTURE_HAR and start a fresh capture."""
+    try:
+        if har_recorder['order']:
+            os.makedirs(CAPTURE_HAR, exist_ok=True)
+            path = os.path.join(CAPTURE_HAR, f"{username}-{get_uk_time().strftime('%Y%m%d-%H%M%S')}.har.gz")
+            with gzip.open(path, 'wt', encoding='utf-8') as f:
+                json.dump(build_har(), f)
+            log.info("🌐 Network capture written to %s (%s request(s))", path, len(har_recorder['order']))
+    except Exception as e:
+        log.warning("⚠️ Could not write network capture: %s", e)
+    har_recorder.update(pages=[], requests={}, order=[])
+
+# ============================================================================
+# PAGE PERFORMANCE METRICS
+# ============================================================================
+
+# When set, Chrome's page metrics (DOM nodes, listeners, JS heap, layout and
+# script time) are sampled over CDP at the end of every step span and appended
+# to this JSON-lines file, to see how the LIMS page grows over a long session.
+PAGE_METRICS_FILE = os.environ.get('PAGE_METRICS_FILE', '')
+
+# Performance.getMetrics values kept per sample; the rest are noise for this purpose
+PAGE_METRIC_NAMES = (
+    'Nodes', 'Documents', 'Frames', 'JSEventListeners', 'JSHeapUsedSize', 'JSHeapTotalSize',
+    'LayoutCount', 'RecalcStyleCount', 'LayoutDuration', 'RecalcStyleDuration',
+    'ScriptDuration', 'TaskDuration',
+)
+
+# Browser sessions with the Performance domain enabled: {session id: samples navigated to}
+_metrics_sessions = {}
+
+def record_page_metrics(driver, step, seconds):
+    """Append one metrics sample for the page after a step."""
+    try:
+        session_id = driver.session_id
+        if session_id not in _metrics_sessions:
+            driver.execute_cdp_cmd('Performance.enable', {})
+            _metrics_sessions[session_id] = 0
+        if step == 'sample.navigate':
+            _metrics_sessions[session_id] += 1
+
+        metrics = driver.execute_cdp_cmd('Performance.getMetrics', {}).get('metrics', [])
+        heap = driver.execute_cdp_cmd('Runtime.getHeapUsage', {})
+        entry = {
+            'time': get_uk_time().isoformat(),
+            'user': span_context.get('username'),
+            'project': span_context.get('project'),
+            'sample': span_context.get('sample'),
+            'step': step,
+            'step_seconds': round(seconds, 3),
+            'browser_session': session_id,
+            # How many samples this browser has paged through so far
+            'session_samples': _metrics_sessions[session_id],
+            'metrics': {m['name']: m['value'] for m in metrics if m['name'] in PAGE_METRIC_NAMES},
+            'heap_used': heap.get('usedSize'),
+            'heap_total': heap.get('totalSize'),
+        }
+        with open(PAGE_METRICS_FILE, 'a') as f:
+            f.write(json.dumps(entry, default=str) + "\n")
     except Exception as e:
-        print(f"Could not save screenshot: {e}")
+        log.warning("⚠️ Could not sample page metrics after '%s': %s", step, e)
 
 # ============================================================================
 # YOUR ORIGINAL FUNCTIONS FROM COLAB BLOCKS (Updated for multi-user)
 # ============================================================================
 
-def load_data_from_google_sheets(url, columns, row_index=0):
+SHEET_FETCH_TIMEOUT = 30
+
+# Last response per sheet URL: validators for conditional requests, a digest of
+# the body and the parsed DataFrame. An unchanged sheet costs a 304 (or a hash
+# compare when the server sends no validators) instead of a CSV parse.
+sheet_cache = {}
+
+def _cached_sheet(url):
+    return sheet_cache[url]['df'].copy()
+
+def load_data_from_google_sheets(url, columns, row_index=0, session=None):
     """Load and process data from a Google Sheets URL."""
     try:
-        response = requests.get(url)
+        cached = sheet_cache.get(url)
+        headers = {}
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        
+        response = (session or requests).get(url, timeout=SHEET_FETCH_TIMEOUT, headers=headers)
+        if response.status_code == 304 and cached:
+            return _cached_sheet(url)
         if response.status_code == 200:
+            digest = hashlib.sha256(response.content).hexdigest()
+            if cached and cached['digest'] == digest:
+                return _cached_sheet(url)
+            
             df = pd.read_csv(StringIO(response.text))
+            df['_source_row'] = df.index + 2  # Sheet row number: header is row 1
 
             if 'Project Number' in df.columns:
                 df['Project Number'] = df['Project Number'].ffill()
-                df['Project Number'] = df['Project Number'].astype(int)
-                print("Forward-filled and converted 'Project Number' column to integers.")
+                try:
+                    df['Project Number'] = df['Project Number'].astype(int)
+                    log.info("Forward-filled and converted 'Project Number' column to integers.")
+                except (ValueError, TypeError):
+                    # Leading gaps or non-numeric values; validate_results_sheet() reports them
+                    log.warning("Warning: 'Project Number' has values that are not integers after forward-filling.")
             else:
-                print("Error: 'Project Number' column not found.")
-
-            print("Data loaded successfully.")
-            print("First few rows of the processed data:\n", df.head())
+                log.error("Error: 'Project Number' column not found.")
+
+            log.info("Data loaded successfully.")
+            log.debug("First few rows of the processed data:\n %s", df.head())
+            sheet_cache[url] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'digest': digest,
+                'version': (cached or {}).get('version', 0) + 1,
+                'df': df.copy()
+            }
             return df
         else:
-            print(f"Error: Failed to fetch Google Sheets data. Status code: {response.status_code}")
+            log.error("Error: Failed to fetch Google Sheets data. Status code: %s", response.status_code)
             return None
     except Exception as e:
-        print(f"An error occurred while extracting data: {e}")
+        log.error("An error occurred while extracting data: %s", e)
+        return None
+
+def _sample_number_keys(df):
+    """Vectorized (project, sample) keys used to de-duplicate rows across sources."""
+    projects = pd.to_numeric(df.get("Project Number"), errors='coerce')
+    samples = pd.to_numeric(df["Sample No."].astype(str).str.strip(), errors='coerce')
+    return projects.astype(str) + ':' + samples.astype(str)
+
+def load_data_from_sources(urls, columns):
+    """
+    Fetch every result sheet source concurrently over one pooled session and
+    merge them into a single DataFrame. A sample that appears in more than one
+    source is taken from the earliest source. If any source fails the whole
+    load fails, so missing rows are never mistaken for removed samples.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=len(urls), pool_maxsize=len(urls))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    
+    started = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+            frames = list(pool.map(lambda url: load_data_from_google_sheets(url, columns, session=session), urls))
+    finally:
+        session.close()
+    
+    if any(frame is None for frame in frames):
+        failed = [i for i, frame in enumerate(frames) if frame is None]
+        log.error("❌ Failed to load sheet source(s) %s of %s", failed, len(urls))
         return None
+    
+    merged = []
+    seen_keys = set()
+    for source, frame in enumerate(frames):
+        frame['_source'] = source
+        if 'Sample No.' in frame.columns and 'Project Number' in frame.columns:
+            keys = _sample_number_keys(frame)
+            duplicate = keys.isin(seen_keys) & ~keys.str.contains('nan')
+            if duplicate.any():
+                log.info("ℹ️  Source %s: %s sample(s) already provided by an earlier source", source, int(duplicate.sum()))
+            frame = frame[~duplicate]
+            seen_keys.update(keys[~duplicate])
+        merged.append(frame)
+    
+    df = pd.concat(merged, ignore_index=True)
+    if len(urls) > 1:
+        log.info("📥 Loaded %s rows from %s sources in %.1fs", len(df), len(urls), time.monotonic() - started)
+    return df
+
+# Main menu URL each browser session landed on after logging in: {session id: url}.
+# Other tabs of that browser share its cookies, so they can start here without a login.
+main_menu_urls = {}
 
 def login(driver, username, password, user_for_screenshot):
     """Perform the login process on the specified driver."""
     try:
-        driver.get("https://crucial-enviro.alphatracker.online/")
+        driver.get(LIMS_BASE_URL)
 
-        username_field = WebDriverWait(driver, 10).until(
+        username_field = wait_until(driver, "login.username_field", 10,
             EC.visibility_of_element_located((By.ID, "LOGIN_UX.V.R1.USERID"))
         )
-        password_field = WebDriverWait(driver, 10).until(
+        password_field = wait_until(driver, "login.password_field", 10,
             EC.visibility_of_element_located((By.ID, "LOGIN_UX.V.R1.PASSWORD"))
         )
-        submit_button = WebDriverWait(driver, 10).until(
+        submit_button = wait_until(driver, "login.submit_button", 10,
             EC.element_to_be_clickable((By.ID, "LOGIN_UX.V.R1.LOGIN_BTN"))
         )
 
@@ -201,60 +900,61 @@ def login(driver, username, password, user_for_screenshot):
         password_field.send_keys(password)
         submit_button.click()
 
-        WebDriverWait(driver, 10).until(EC.url_contains("TabbedUI_MainMenu"))
-        print(f"Login successful for user '{username}'!")
+        wait_until(driver, "login.main_menu", 10, EC.url_contains("TabbedUI_MainMenu"))
+        main_menu_urls[driver.session_id] = driver.current_url
+        log.info("Login successful for user '%s'!", username)
         capture_screenshot(driver, f"screenshot_after_login_{username}.png", username)
         return True
 
     except Exception as e:
-        print(f"Error occurred during login for user '{username}': {e}")
-        capture_screenshot(driver, f"login_error_{username}.png", username)
+        log.error("Error occurred during login for user '%s': %s", username, e)
+        capture_screenshot(driver, f"login_error_{username}.png", username, failure=True)
         return False
 
 def click_lab_button(driver):
     try:
-        lab_button = WebDriverWait(driver, 10).until(
+        lab_button = wait_until(driver, "nav.lab_button", 10,
             EC.element_to_be_clickable((By.ID, "tb1FRAME_12.A"))
         )
         lab_button.click()
-        print("Lab button clicked successfully!")
+        log.info("Lab button clicked successfully!")
         return True
     except TimeoutException:
-        print("Timeout: Lab button not clickable or not found.")
+        log.warning("Timeout: Lab button not clickable or not found.")
         return False
 
 def click_lab_project_list_button(driver):
     try:
-        lab_project_list_button = WebDriverWait(driver, 10).until(
+        lab_project_list_button = wait_until(driver, "nav.lab_project_list", 10,
             EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Lab Project List')]"))
         )
         lab_project_list_button.click()
-        print("Lab Project List button clicked successfully!")
+        log.info("Lab Project List button clicked successfully!")
         return True
     except TimeoutException:
-        print("Timeout: Lab Project List button not clickable or not found.")
+        log.warning("Timeout: Lab Project List button not clickable or not found.")
         return False
 
 def input_project_number(driver, project_number, username):
     """Inputs the project number into the appropriate field."""
     try:
-        project_number_field = WebDriverWait(driver, 10).until(
+        project_number_field = wait_until(driver, "project.number_field", 10,
             EC.visibility_of_element_located((By.ID, "TBI_LAB_PROJEC_162148FIEL.S.PROJECT_NUMBER"))
         )
 
         project_number_field.clear()
         project_number = str(int(float(project_number)))
         project_number_field.send_keys(project_number)
-        print(f"Project number {project_number} input successful!")
+        log.info("Project number %s input successful!", project_number)
         capture_screenshot(driver, "project_number_input.png", username)
         return True
     except TimeoutException:
-        print("Error: Could not find the project number input field.")
-        capture_screenshot(driver, "project_number_input_error.png", username)
+        log.error("Error: Could not find the project number input field.")
+        capture_screenshot(driver, "project_number_input_error.png", username, failure=True)
         return False
     except Exception as e:
-        print(f"An error occurred while inputting project number: {str(e)}")
-        capture_screenshot(driver, "project_number_input_error.png", username)
+        log.error("An error occurred while inputting project number: %s", str(e))
+        capture_screenshot(driver, "project_number_input_error.png", username, failure=True)
         return False
 
 def press_enter_or_search_on_project_number(driver, project_number):
@@ -264,144 +964,213 @@ def press_enter_or_search_on_project_number(driver, project_number):
 
     for attempt in range(1, max_retries + 1):
         try:
-            print(f"Attempt {attempt}: Clearing previous search results...")
+            log.info("Attempt %s: Clearing previous search results...", attempt)
             clear_search_criteria(driver)
 
-            print("Attempting to click the Search button...")
-            search_button = WebDriverWait(driver, 10).until(
+            log.debug("Attempting to click the Search button...")
+            search_button = wait_until(driver, "project.search_button", 10,
                 EC.element_to_be_clickable((By.ID, "TBI_LAB_PROJEC_162148FIEL.SEARCHBTN"))
             )
             search_button.click()
-            print("Search button clicked.")
+            log.info("Search button clicked.")
 
-            WebDriverWait(driver, 10).until(
+            wait_until(driver, "project.search_result", 10,
                 EC.text_to_be_present_in_element(
                     (By.ID, "TBI_LAB_PROJEC_162148FIEL.V.R1.PROJECT_NUMBER"), str(project_number)
                 )
             )
-            print(f"Project number updated successfully: {project_number}")
+            log.info("Project number updated successfully: %s", project_number)
             return True
 
         except TimeoutException:
             try:
-                project_number_field = WebDriverWait(driver, 10).until(
+                project_number_field = wait_until(driver, "project.number_field", 10,
                     EC.visibility_of_element_located((By.ID, "TBI_LAB_PROJEC_162148FIEL.S.PROJECT_NUMBER"))
                 )
                 project_number_field.click()
                 project_number_field.clear()
                 project_number_field.send_keys(str(project_number))
                 project_number_field.send_keys(Keys.RETURN)
-                print("Pressed Enter on the project number field.")
+                log.info("Pressed Enter on the project number field.")
 
-                WebDriverWait(driver, 10).until(
+                wait_until(driver, "project.search_result", 10,
                     EC.text_to_be_present_in_element(
                         (By.ID, "TBI_LAB_PROJEC_162148FIEL.V.R1.PROJECT_NUMBER"), str(project_number)
                     )
                 )
-                print(f"Project number updated successfully: {project_number}")
+                log.info("Project number updated successfully: %s", project_number)
                 return True
 
             except TimeoutException:
-                print(f"Attempt {attempt}: Enter key press did not update. Retrying in {delay} seconds...")
+                log.info("Attempt %s: Enter key press did not update. Retrying in %s seconds...", attempt, delay)
                 time.sleep(delay)
                 delay *= 2
 
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            log.error("An unexpected error occurred: %s", e)
 
-    print("Failed to update the project number after all retries.")
+    log.warning("Failed to update the project number after all retries.")
     return False
 
 def verify_project_numbers(driver, username):
     """Verifies that the project number in the input field matches the one in the span element."""
     try:
-        span_project_number = WebDriverWait(driver, 10).until(
+        span_project_number = wait_until(driver, "project.result_span", 10,
             EC.visibility_of_element_located((By.ID, "TBI_LAB_PROJEC_162148FIEL.V.R1.PROJECT_NUMBER"))
         )
         span_project_number_text = span_project_number.text.strip().split('-')[-1]
 
-        input_project_number = WebDriverWait(driver, 10).until(
+        input_project_number = wait_until(driver, "project.number_field", 10,
             EC.visibility_of_element_located((By.ID, "TBI_LAB_PROJEC_162148FIEL.S.PROJECT_NUMBER"))
         )
         input_project_number_value = input_project_number.get_attribute("value").strip()
 
-        print(f"Span Project Number Text (cleaned): {span_project_number_text}")
-        print(f"Input Project Number Value: {input_project_number_value}")
+        log.info("Span Project Number Text (cleaned): %s", span_project_number_text)
+        log.info("Input Project Number Value: %s", input_project_number_value)
 
         if span_project_number_text != input_project_number_value:
-            print("Error: The project numbers do not match.")
+            log.error("Error: The project numbers do not match.")
             raise ValueError(f"Project numbers mismatch: Span '{span_project_number_text}' vs Input '{input_project_number_value}'")
 
-        print("Project numbers match. Continuing execution.")
+        log.info("Project numbers match. Continuing execution.")
         screenshot_filename = f"project_numbers_match_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.png"
         capture_screenshot(driver, screenshot_filename, username)
 
     except TimeoutException:
-        print("Error: Could not locate one or both project number elements.")
+        log.error("Error: Could not locate one or both project number elements.")
     except ValueError as ve:
-        print(f"Verification failed: {ve}")
+        log.error("Verification failed: %s", ve)
         raise
     except Exception as e:
-        print(f"An unexpected error occurred during verification: {str(e)}")
+        log.error("An unexpected error occurred during verification: %s", str(e))
 
 def click_view_fibre_analysis_button(driver, username):
     """Locates and clicks the 'View Fibre Analysis' button."""
     try:
-        fibre_analysis_button = WebDriverWait(driver, 15).until(
+        fibre_analysis_button = wait_until(driver, "fibre.view_button", 15,
             EC.element_to_be_clickable((By.ID, "TBI_LAB_PROJEC_162148FIEL.V.R1._UNBOUND_BUTTON_1"))
         )
 
         driver.execute_script("arguments[0].scrollIntoView(true);", fibre_analysis_button)
         capture_screenshot(driver, "before_click_view_fibre_analysis_button.png", username)
         fibre_analysis_button.click()
-        print("Clicked the 'View Fibre Analysis' button successfully!")
+        log.info("Clicked the 'View Fibre Analysis' button successfully!")
 
-        WebDriverWait(driver, 15).until(
+        wait_until(driver, "fibre.creating_popup_shown", 15,
             EC.visibility_of_element_located((By.XPATH, "//div[contains(text(), 'Creating Fibre Analysis records')]"))
         )
-        print("Loading pop-up detected.")
+        log.info("Loading pop-up detected.")
 
-        WebDriverWait(driver, 30).until_not(
+        wait_until_not(driver, "fibre.creating_popup_dismissed", 30,
             EC.visibility_of_element_located((By.XPATH, "//div[contains(text(), 'Creating Fibre Analysis records')]"))
         )
-        print("Loading pop-up dismissed.")
+        log.info("Loading pop-up dismissed.")
 
         capture_screenshot(driver, "after_loading_fibre_analysis.png", username)
         return True
 
     except TimeoutException:
-        print("Timeout: Loading did not finish in the expected time.")
-        capture_screenshot(driver, "timeout_loading_fibre_analysis.png", username)
+        log.warning("Timeout: Loading did not finish in the expected time.")
+        capture_screenshot(driver, "timeout_loading_fibre_analysis.png", username, failure=True)
         return False
     except Exception as e:
-        print(f"An error occurred while clicking 'View Fibre Analysis' button: {e}")
-        capture_screenshot(driver, "error_clicking_view_fibre_analysis_button.png", username)
+        log.error("An error occurred while clicking 'View Fibre Analysis' button: %s", e)
+        capture_screenshot(driver, "error_clicking_view_fibre_analysis_button.png", username, failure=True)
         return False
 
 def clear_search_criteria(driver):
     try:
-        clear_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.LINK_TEXT, "Clear Search Criteria"))
+        clear_button = wait_until(driver, "project.clear_search", 10,
+            EC.element_to_be_clickable((By.LINK_TEXT, "Clear Search Criteria")),
+            record_timeouts=False
         )
         clear_button.click()
-        print("Cleared previous search criteria.")
+        log.info("Cleared previous search criteria.")
         return True
     except TimeoutException:
-        print("No 'Clear Search Criteria' button found. Continuing.")
+        log.info("No 'Clear Search Criteria' button found. Continuing.")
         return False
 
-def wait_for_no_overlay(driver, timeout=10):
-    """Waits until overlays disappear."""
+# Milliseconds without DOM mutations before the page counts as idle
+UI_IDLE_QUIET_MS = int(os.environ.get('UI_IDLE_QUIET_MS', '250'))
+
+# Resolves once the lock overlay and loading indicators are gone and the DOM has
+# been quiet for the requested window, or when the time limit runs out.
+# 'unlocked' is how long the page took to unlock (for good), null if it never did.
+UI_IDLE_SCRIPT = """
+    var quietMs = arguments[0], limitMs = arguments[1], done = arguments[arguments.length - 1];
+    var started = Date.now(), lastMutation = Date.now(), unlockedAt = null;
+    var observer = new MutationObserver(function () { lastMutation = Date.now(); });
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+    function locked() {
+        return !!(document.getElementById('AUILockUIPage') || document.querySelector('.loading'));
+    }
+    (function check() {
+        var now = Date.now();
+        var isLocked = locked();
+        unlockedAt = isLocked ? null : (unlockedAt === null ? now : unlockedAt);
+        if ((!isLocked && now - lastMutation >= quietMs) || now - started >= limitMs) {
+            observer.disconnect();
+            done({idle: !isLocked && now - lastMutation >= quietMs, locked: isLocked, waited: now - started,
+                  unlocked: unlockedAt === null ? null : unlockedAt - started});
+            return;
+        }
+        setTimeout(check, 50);
+    })();
+"""
+
+def wait_for_ui_idle(driver, timeout=10, quiet_ms=None, site="ui.idle"):
+    """
+    Wait in the page itself until the UI is unlocked and the DOM is quiet.
+    Costs a single async script round trip. Returns the probe result
+    ({'idle', 'locked', 'waited', 'unlocked'}) or None if the probe could not run.
+    With site=None the timeout is used as given and nothing is learned.
+    """
+    limit = adaptive_timeout(site, timeout) if site else timeout
+    quiet_ms = UI_IDLE_QUIET_MS if quiet_ms is None else quiet_ms
     try:
-        WebDriverWait(driver, timeout).until_not(
-            EC.presence_of_element_located((By.ID, "AUILockUIPage"))
-        )
-        print("Overlay removed.")
+        result = driver.execute_async_script(UI_IDLE_SCRIPT, quiet_ms, int(limit * 1000))
+    except Exception as e:
+        log.warning("⚠️ UI idle probe failed: %s", e)
+        return None
+    
+    # A probe that ran out of time while locked is a censored observation. One that
+    # unlocked but never went quiet (a busy DOM) learns how long the unlock took.
+    if site:
+        if result['locked']:
+            record_wait_latency(site, limit)
+        elif result['idle']:
+            record_wait_latency(site, result['waited'] / 1000.0)
+        elif result.get('unlocked') is not None:
+            record_wait_latency(site, result['unlocked'] / 1000.0)
+    return result
+
+def _poll_for_no_overlay(driver, timeout, site):
+    """WebDriver polling fallback for when the idle probe cannot run."""
+    locked = EC.presence_of_element_located((By.ID, "AUILockUIPage"))
+    try:
+        if site:
+            wait_until_not(driver, f"{site}.poll", timeout, locked)
+        else:
+            WebDriverWait(driver, timeout).until_not(locked)
         return True
     except TimeoutException:
-        print("Overlay did not disappear.")
         return False
 
+def wait_for_no_overlay(driver, timeout=10, site="ui.idle"):
+    """
+    Waits until overlays disappear. Each caller passes its own wait site, so
+    quick unlocks elsewhere do not shrink the timeout of a slow one; site=None
+    waits the full timeout the caller already worked out.
+    """
+    result = wait_for_ui_idle(driver, timeout, site=site)
+    unlocked = _poll_for_no_overlay(driver, timeout, site) if result is None else not result['locked']
+    if unlocked:
+        log.info("Overlay removed.")
+    else:
+        log.warning("Overlay did not disappear.")
+    return unlocked
+
 # ============================================================================
 # POPUP HANDLING AND SAMPLE PROCESSING FUNCTIONS
 # ============================================================================
@@ -409,16 +1178,17 @@ def wait_for_no_overlay(driver, timeout=10):
 def handle_popup_ok_button(driver):
     """Detects and clicks the 'OK' button on a popup if it appears."""
     try:
-        ok_button = WebDriverWait(driver, 5).until(
-            EC.element_to_be_clickable((By.ID, "A5dlg1.BUTTON.ok"))
+        ok_button = wait_until(driver, "popup.ok", 5,
+            EC.element_to_be_clickable((By.ID, "A5dlg1.BUTTON.ok")),
+            record_timeouts=False
         )
         ok_button.click()
-        print("Popup 'OK' button clicked successfully.")
+        log.info("Popup 'OK' button clicked successfully.")
         return True
     except TimeoutException:
         return False
     except Exception as e:
-        print(f"An error occurred while handling popup: {e}")
+        log.error("An error occurred while handling popup: %s", e)
         return False
 
 def handle_popup(func):
@@ -429,13 +1199,13 @@ def handle_popup(func):
             result = func(driver, *args, **kwargs)
             
             if handle_popup_ok_button(driver):
-                print(f"Popup handled after executing {func.__name__}.")
+                log.info("Popup handled after executing %s.", func.__name__)
                 # Don't call save button here - just return the original result
                 return result
             
             return result
         except Exception as e:
-            print(f"Error in {func.__name__}: {e}")
+            log.error("Error in %s: %s", func.__name__, e)
             return False
     return wrapper
 
@@ -445,7 +1215,7 @@ def normalize_sample_number(sample_no):
         # Handle string, float, or int input
         return int(float(str(sample_no).strip()))
     except (ValueError, TypeError):
-        print(f"Warning: Could not convert sample number '{sample_no}' to integer")
+        log.warning("Warning: Could not convert sample number '%s' to integer", sample_no)
         return None
 
 def click_element_safely(driver, element, element_name="element"):
@@ -457,17 +1227,17 @@ def click_element_safely(driver, element, element_name="element"):
         element.click()
         return True
     except ElementClickInterceptedException:
-        print(f"Regular click intercepted for {element_name}, trying JavaScript click...")
+        log.info("Regular click intercepted for %s, trying JavaScript click...", element_name)
         try:
             # If regular click fails, use JavaScript
             driver.execute_script("arguments[0].click();", element)
-            print(f"JavaScript click successful for {element_name}")
+            log.info("JavaScript click successful for %s", element_name)
             return True
         except Exception as e:
-            print(f"JavaScript click also failed for {element_name}: {e}")
+            log.warning("JavaScript click also failed for %s: %s", element_name, e)
             return False
     except Exception as e:
-        print(f"Click failed for {element_name}: {e}")
+        log.warning("Click failed for %s: %s", element_name, e)
         return False
 
 
@@ -486,7 +1256,7 @@ def click_sample_row_with_next_button(driver, sample_no, is_new_project=False, u
         # If this is a new project, first go back to sample 1
         if is_new_project and sample_no != 1:
             if not navigate_to_first_sample(driver, username):
-                print("❌ Failed to navigate to first sample for new project")
+                log.error("❌ Failed to navigate to first sample for new project")
                 return False
         
         # Calculate how many Next clicks we need
@@ -495,26 +1265,26 @@ def click_sample_row_with_next_button(driver, sample_no, is_new_project=False, u
         # Sample 3: 2 clicks, etc.
         clicks_required = sample_no - 1
         
-        print(f"📍 Navigating to Sample No. {sample_no}")
-        print(f"   Next clicks required: {clicks_required}")
+        log.info("📍 Navigating to Sample No. %s", sample_no)
+        log.info("   Next clicks required: %s", clicks_required)
 
         # If sample 1, it's already selected - no clicks needed
         if clicks_required == 0:
-            print(f"✅ Sample 1 is already selected by default")
+            log.info("✅ Sample 1 is already selected by default")
             capture_screenshot(driver, f"sample_{sample_no}_selected.png", username)
             
             # Wait a moment and verify
             time.sleep(2)
-            return verify_correct_sample_loaded(driver, sample_no)
+            return verify_correct_sample_loaded(driver, sample_no, username)
 
         # For samples 2+, click Next the required number of times
         for click_num in range(clicks_required):
-            print(f"  Clicking 'Next' button ({click_num + 1}/{clicks_required})...")
+            log.info("  Clicking 'Next' button (%s/%s)...", click_num + 1, clicks_required)
             try:
                 # Wait for any overlays to disappear first
-                wait_for_no_overlay(driver)
+                wait_for_no_overlay(driver, site="nav.next_overlay")
                 
-                next_button = WebDriverWait(driver, 10).until(
+                next_button = wait_until(driver, "nav.next_button", 10,
                     EC.element_to_be_clickable((By.ID, "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.FOOTER_CONTROLS.Next.ICON"))
                 )
                 
@@ -524,65 +1294,65 @@ def click_sample_row_with_next_button(driver, sample_no, is_new_project=False, u
                 
                 # Try to click using our safe click method
                 if click_element_safely(driver, next_button, "Next button"):
-                    print(f"  ✓ Clicked 'Next' button successfully.")
+                    log.info("  ✓ Clicked 'Next' button successfully.")
                 else:
                     # If both click methods fail, try one more approach
-                    print("  Trying alternative click method...")
+                    log.info("  Trying alternative click method...")
                     actions = ActionChains(driver)
                     actions.move_to_element(next_button).click().perform()
-                    print(f"  ✓ Clicked 'Next' button using ActionChains.")
+                    log.info("  ✓ Clicked 'Next' button using ActionChains.")
                 
                 # Wait for the form to update
                 time.sleep(2)
                 
             except TimeoutException:
-                print(f"❌ Error: Next button not found or not clickable")
-                capture_screenshot(driver, f"sample_{sample_no}_selected.png", username)
+                log.error("❌ Error: Next button not found or not clickable")
+                capture_screenshot(driver, f"next_button_timeout_sample_{sample_no}.png", username, failure=True)
                 return False
             except Exception as e:
-                print(f"❌ Error clicking Next button: {e}")
-                capture_screenshot(driver, f"next_button_exception_sample_{sample_no}.png", username)
+                log.error("❌ Error clicking Next button: %s", e)
+                capture_screenshot(driver, f"next_button_exception_sample_{sample_no}.png", username, failure=True)
                 return False
 
-        print(f"✅ Successfully navigated to Sample {sample_no}")
+        log.info("✅ Successfully navigated to Sample %s", sample_no)
         capture_screenshot(driver, f"sample_{sample_no}_selected.png", username)
         
         # Verify the correct sample is loaded
         time.sleep(2)
-        return verify_correct_sample_loaded(driver, sample_no)
+        return verify_correct_sample_loaded(driver, sample_no, username)
 
     except Exception as e:
-        print(f"❌ Failed to navigate to Sample No. {sample_no}: {e}")
-        capture_screenshot(driver, f"error_sample_{sample_no}.png", username)
+        log.error("❌ Failed to navigate to Sample No. %s: %s", sample_no, e)
+        capture_screenshot(driver, f"error_sample_{sample_no}.png", username, failure=True)
         return False
 
-def verify_correct_sample_loaded(driver, expected_sample_no):
+# Fields that might contain the sample number, tried in order. Entries starting
+# with '[' are CSS selectors, the rest are element ids.
+SAMPLE_VERIFICATION_SELECTORS = [
+    # Direct sample ID/number fields
+    "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.SAMPLE_ID",
+    "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.SAMPLE_NO",
+    "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.SAMPLE_NUMBER",
+    # Try looking in the form title or header
+    "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA.TITLE",
+    # Look for any element containing SAMPLE
+    "[id*='SAMPLE'][id*='ID']",
+    "[id*='SAMPLE'][id*='NO']",
+    "[id*='SAMPLE'][id*='NUMBER']"
+]
+
+def verify_correct_sample_loaded(driver, expected_sample_no, username="unknown"):
     """
     Verify that the correct sample is loaded in the form.
     Returns True if verified, False otherwise.
     """
     try:
-        print(f"🔍 Verifying Sample {expected_sample_no} is loaded...")
-        
-        # Look for fields that might contain the sample number
-        # These are common patterns in the existing IDs
-        possible_selectors = [
-            # Direct sample ID/number fields
-            "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.SAMPLE_ID",
-            "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.SAMPLE_NO",
-            "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.SAMPLE_NUMBER",
-            # Try looking in the form title or header
-            "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA.TITLE",
-            # Look for any element containing SAMPLE
-            "[id*='SAMPLE'][id*='ID']",
-            "[id*='SAMPLE'][id*='NO']",
-            "[id*='SAMPLE'][id*='NUMBER']"
-        ]
+        log.info("🔍 Verifying Sample %s is loaded...", expected_sample_no)
         
         sample_found = False
         found_value = None
         
-        for selector in possible_selectors:
+        for selector in SAMPLE_VERIFICATION_SELECTORS:
             try:
                 if selector.startswith('['):
                     # CSS selector
@@ -597,13 +1367,13 @@ def verify_correct_sample_loaded(driver, expected_sample_no):
                         if value.strip():
                             # Check if the expected sample number is in the value
                             if str(expected_sample_no) in str(value):
-                                print(f"   ✓ Found sample {expected_sample_no} in: {value}")
+                                log.info("   ✓ Found sample %s in: %s", expected_sample_no, value)
                                 sample_found = True
                                 found_value = value
                                 break
                             else:
                                 # Log what we found for debugging
-                                print(f"   - Found value '{value}' but doesn't match expected {expected_sample_no}")
+                                log.debug("   - Found value '%s' but doesn't match expected %s", value, expected_sample_no)
                                 
             except Exception as e:
                 continue
@@ -612,20 +1382,20 @@ def verify_correct_sample_loaded(driver, expected_sample_no):
                 break
         
         if sample_found:
-            print(f"✅ Verified: Sample {expected_sample_no} is loaded correctly")
+            log.info("✅ Verified: Sample %s is loaded correctly", expected_sample_no)
             return True
         else:
-            print(f"❌ Could not verify Sample {expected_sample_no} is loaded")
-            print(f"   Expected: Sample {expected_sample_no}")
+            log.error("❌ Could not verify Sample %s is loaded", expected_sample_no)
+            log.info("   Expected: Sample %s", expected_sample_no)
             if found_value:
-                print(f"   Found: {found_value}")
+                log.info("   Found: %s", found_value)
             
             # Take a screenshot for debugging
-            capture_screenshot(driver, f"sample_verification_failed_{expected_sample_no}.png", username)
+            capture_screenshot(driver, f"sample_verification_failed_{expected_sample_no}.png", username, failure=True)
             return False
             
     except Exception as e:
-        print(f"❌ Error during sample verification: {e}")
+        log.error("❌ Error during sample verification: %s", e)
         return False
 
 
@@ -633,21 +1403,17 @@ def wait_for_form_update(driver, timeout=5):
     """
     Wait for the form to finish updating after navigation.
     """
-    try:
-        # Wait for any loading indicators to disappear
-        WebDriverWait(driver, timeout).until_not(
-            EC.presence_of_element_located((By.CLASS_NAME, "loading"))
-        )
-        
-        # Also check for the overlay
-        WebDriverWait(driver, timeout).until_not(
-            EC.presence_of_element_located((By.ID, "AUILockUIPage"))
-        )
-        
-        return True
-    except:
-        # If no loading indicators found, that's fine
-        return True
+    result = wait_for_ui_idle(driver, timeout, site="form.idle")
+    if result is None:
+        return _poll_for_no_overlay(driver, timeout, "form.idle")
+    
+    if result['locked']:
+        log.warning("⚠️ Form still locked after waiting for it to update")
+        return False
+    if not result['idle']:
+        # Unlocked but still changing; good enough to carry on
+        log.warning("⚠️ Form unlocked but the page never went quiet")
+    return True
 
 # ============================================================================
 # MODIFIED TIMING FUNCTIONS - USING REAL UK TIME
@@ -662,21 +1428,21 @@ def input_realistic_stereo_binocular_start_time(driver):
     try:
         start_time_str, _ = calculate_realistic_times()
         
-        input_field = WebDriverWait(driver, 10).until(
+        input_field = wait_until(driver, "form.start_time", 10,
             EC.visibility_of_element_located((By.ID, "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.STEREOBINOCULARSTARTTIME"))
         )
 
         input_field.clear()
         input_field.send_keys(start_time_str)
-        print(f"✅ Stereo Binocular Start Time set to: {start_time_str}")
+        log.info("✅ Stereo Binocular Start Time set to: %s", start_time_str)
 
         return True, start_time_str
 
     except TimeoutException:
-        print("❌ Error: Stereo Binocular Start Time input field not found.")
+        log.error("❌ Error: Stereo Binocular Start Time input field not found.")
         return False, None
     except Exception as e:
-        print(f"❌ An error occurred while inputting Stereo Binocular Start Time: {e}")
+        log.error("❌ An error occurred while inputting Stereo Binocular Start Time: %s", e)
         return False, None
 
 @handle_popup
@@ -688,23 +1454,23 @@ def set_realistic_plm_end_time(driver, username):
     try:
         _, end_time_str = calculate_realistic_times()
         
-        plm_end_time_field = WebDriverWait(driver, 10).until(
+        plm_end_time_field = wait_until(driver, "form.plm_end_time", 10,
             EC.visibility_of_element_located((By.ID, "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.PLMENDTIME"))
         )
 
         plm_end_time_field.clear()
         plm_end_time_field.send_keys(end_time_str)
 
-        print(f"✅ PLM End Time set to current UK time: {end_time_str}")
+        log.info("✅ PLM End Time set to current UK time: %s", end_time_str)
         capture_screenshot(driver, "realistic_plm_end_time_set.png", username)
 
         return True
 
     except TimeoutException:
-        print("❌ Error: PLM End Time input field not found.")
+        log.error("❌ Error: PLM End Time input field not found.")
         return False
     except Exception as e:
-        print("❌ An error occurred while setting PLM End Time:", str(e))
+        log.error("❌ An error occurred while setting PLM End Time: %s", str(e))
         return False
 
 # ============================================================================
@@ -714,37 +1480,37 @@ def set_realistic_plm_end_time(driver, username):
 @handle_popup
 def copy_value_to_dropdown(driver):
     try:
-        text_input = WebDriverWait(driver, 10).until(
+        text_input = wait_until(driver, "form.surveyors_assessment", 10,
             EC.visibility_of_element_located((By.ID, "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.SURVEYORS_ASSESSMENT"))
         )
 
         value = text_input.get_attribute("value")
 
-        dropdown = WebDriverWait(driver, 10).until(
+        dropdown = wait_until(driver, "form.analyst_assessment", 10,
             EC.visibility_of_element_located((By.ID, "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.ANALYST_ASSESSMENT"))
         )
 
-        dropdown_option = WebDriverWait(dropdown, 10).until(
+        dropdown_option = wait_until(dropdown, "form.assessment_option", 10,
             EC.visibility_of_element_located((By.XPATH, f"//option[text()='{value}']"))
         )
         dropdown_option.click()
 
         dropdown.send_keys(Keys.ENTER)
 
-        print("Value copied to dropdown and Enter key pressed successfully!")
+        log.info("Value copied to dropdown and Enter key pressed successfully!")
         return True
 
     except TimeoutException:
-        print("Error: Element not found.")
+        log.error("Error: Element not found.")
         return False
     except Exception as e:
-        print("An error occurred:", str(e))
+        log.error("An error occurred: %s", str(e))
         return False
 
 @handle_popup
 def set_sample_size_value(driver, username):
     try:
-        sample_size_field = WebDriverWait(driver, 10).until(
+        sample_size_field = wait_until(driver, "form.sample_size", 10,
             EC.element_to_be_clickable((By.ID, "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.SAMPLE_SIZE"))
         )
 
@@ -758,52 +1524,52 @@ def set_sample_size_value(driver, username):
 
         entered_value = sample_size_field.get_attribute("value")
         if entered_value.lower() != "sufficient":
-            print(f"⚠️ Warning: Expected 'sufficient', but found '{entered_value}'. Retrying...")
+            log.warning("⚠️ Warning: Expected 'sufficient', but found '%s'. Retrying...", entered_value)
             sample_size_field.clear()
             sample_size_field.send_keys("sufficient")
             sample_size_field.send_keys(Keys.ENTER)
 
-        print("✅ Sample size set to 'sufficient' successfully!")
+        log.info("✅ Sample size set to 'sufficient' successfully!")
         capture_screenshot(driver, "sample_size_set.png", username)
 
         return True
 
     except TimeoutException:
-        print("❌ Error: Sample size field not found within the timeout.")
+        log.error("❌ Error: Sample size field not found within the timeout.")
         return False
     except Exception as e:
-        print(f"❌ An error occurred while setting sample size: {str(e)}")
+        log.error("❌ An error occurred while setting sample size: %s", str(e))
         return False
 
 @handle_popup
 def click_analysis_tab(driver, username):
     """Clicks on the 'Analysis' tab in the Fibre Analysis pop-up."""
     try:
-        print("Attempting to locate 'Analysis' tab...")
+        log.info("Attempting to locate 'Analysis' tab...")
         analysis_tab_id = "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.MAIN_TAB.1.TAB"
 
-        analysis_tab = WebDriverWait(driver, 10).until(
+        analysis_tab = wait_until(driver, "form.analysis_tab", 10,
             EC.presence_of_element_located((By.ID, analysis_tab_id))
         )
         driver.execute_script("arguments[0].scrollIntoView(true);", analysis_tab)
         driver.execute_script("arguments[0].click();", analysis_tab)
-        print("Clicked on the 'Analysis' tab using ID successfully.")
+        log.debug("Clicked on the 'Analysis' tab using ID successfully.")
 
         time.sleep(2)
 
-        WebDriverWait(driver, 10).until(
+        wait_until(driver, "form.analysis_1_content", 10,
             EC.presence_of_element_located((By.XPATH, "//div[text()='Analysis 1']"))
         )
-        print("Analysis tab content loaded successfully.")
+        log.info("Analysis tab content loaded successfully.")
         return True
 
     except TimeoutException:
-        print("Timeout: 'Analysis' tab content not found or not clickable.")
-        capture_screenshot(driver, "analysis_tab_not_found.png", username)
+        log.warning("Timeout: 'Analysis' tab content not found or not clickable.")
+        capture_screenshot(driver, "analysis_tab_not_found.png", username, failure=True)
         return False
     except Exception as e:
-        print(f"An error occurred while clicking the 'Analysis' tab: {e}")
-        capture_screenshot(driver, "analysis_tab_error.png", username)
+        log.error("An error occurred while clicking the 'Analysis' tab: %s", e)
+        capture_screenshot(driver, "analysis_tab_error.png", username, failure=True)
         return False
 
 @handle_popup
@@ -814,59 +1580,46 @@ def handle_analysis_1_result(driver, df, row_index, username):
         sample_no = df.loc[row_index, 'Sample No.']
 
         if pd.isna(analysis_1_result):
-            print(f"Analysis result is empty or NaN for Sample No. {sample_no}. Skipping.")
+            log.info("Analysis result is empty or NaN for Sample No. %s. Skipping.", sample_no)
             return False
 
-        print(f"Processing Analysis 1 result for Sample No. {sample_no} (DataFrame row {row_index}): {analysis_1_result}")
+        log.info("Processing Analysis 1 result for Sample No. %s (DataFrame row %s): %s", sample_no, row_index, analysis_1_result)
 
-        if "NAD" in analysis_1_result:
-            print("Handling NAD result...")
-            if not click_NAD_result_elements(driver, NAD_result_elements, username):
-                print("❌ Failed to handle NAD result")
+        kind = analysis_result_kind(analysis_1_result)
+        if RESULT_ENTRY_MODE == 'desired_state' and kind in result_targets:
+            log.info("Handling %s result in desired-state mode...", kind)
+            if not apply_desired_result_state(driver, kind, username):
+                log.error("❌ Failed to reach the desired %s result state", kind)
                 return False
-            capture_screenshot(driver, "NAD_result.png", username)
-        
-        elif "Chrysotile" in analysis_1_result:
-            print("Handling Chrysotile result...")
-            if not click_Chrysotile_result_elements(driver, Chrysotile_result_elements, username):
-                print("❌ Failed to handle Chrysotile result")
-                return False
-            capture_screenshot(driver, "Chrysotile_result.png", username)
-        
-        elif "Amosite" in analysis_1_result:
-            print("Handling Amosite result...")
-            if not click_amosite_result_elements(driver, amosite_result_elements, username):
-                print("❌ Failed to handle Amosite result")
-                return False
-            capture_screenshot(driver, "Amosite_result.png", username)
-        
-        elif "Crocidolite" in analysis_1_result:
-            print("Handling Crocidolite result...")
-            if not click_crocidolite_result_elements(driver, crocidolite_result_elements, username):
-                print("❌ Failed to handle Crocidolite result")
-                return False
-            capture_screenshot(driver, "Crocidolite_result.png", username)
+            log.info("Analysis result handled successfully for Sample No. %s", sample_no)
+            return True
 
-        else:
-            print(f"Unknown analysis result for Sample No. {sample_no}: {analysis_1_result}")
-            capture_screenshot(driver, "unknown_analysis_result.png", username)
+        if kind is None:
+            log.warning("Unknown analysis result for Sample No. %s: %s", sample_no, analysis_1_result)
+            capture_screenshot(driver, "unknown_analysis_result.png", username, failure=True)
             return False
 
-        print(f"Analysis result handled successfully for Sample No. {sample_no}")
+        log.info("Handling %s result...", kind)
+        if not run_result_plan(driver, kind, username):
+            log.error("❌ Failed to handle %s result", kind)
+            return False
+        capture_screenshot(driver, f"{kind}_result.png", username)
+
+        log.info("Analysis result handled successfully for Sample No. %s", sample_no)
         capture_screenshot(driver, "analysis_result_handling_success.png", username)
         return True
 
     except KeyError as e:
-        print(f"KeyError: Missing column in DataFrame - {e}")
-        capture_screenshot(driver, "analysis_result_keyerror.png", username)
+        log.error("KeyError: Missing column in DataFrame - %s", e)
+        capture_screenshot(driver, "analysis_result_keyerror.png", username, failure=True)
         return False
     except TimeoutException:
-        print("Error: Element not found within the specified time.")
-        capture_screenshot(driver, "analysis_result_timeout.png", username)
+        log.error("Error: Element not found within the specified time.")
+        capture_screenshot(driver, "analysis_result_timeout.png", username, failure=True)
         return False
     except Exception as e:
-        print(f"An error occurred while handling analysis 1 result: {str(e)}")
-        capture_screenshot(driver, "analysis_result_error.png", username)
+        log.error("An error occurred while handling analysis 1 result: %s", str(e))
+        capture_screenshot(driver, "analysis_result_error.png", username, failure=True)
         return False
 
 # Analysis element lists (your original data)
@@ -948,242 +1701,544 @@ crocidolite_result_elements = [
     "id=TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.FIBRE_ANALYSIS_OPTIONS_LIST.VALUE.I.4",
 ]
 
-@handle_popup
-def click_NAD_result_elements(driver, NAD_result_elements, username):
-    """Iterates over the list of NAD result elements and performs actions."""
-    try:
-        for action in NAD_result_elements:
-            try:
-                element_type, element_selector = action.split("=")
-                if element_type == "id":
-                    locator = (By.ID, element_selector)
-                elif element_type == "css":
-                    locator = (By.CSS_SELECTOR, element_selector)
-                else:
-                    print(f"Unknown locator type '{element_type}'. Skipping this element.")
-                    continue
-                print(f"Attempting to click element: {element_selector}")
-                for attempt in range(3):
-                    try:
-                        element = WebDriverWait(driver, 20).until(
-                            EC.element_to_be_clickable(locator)
-                        )
-                        driver.execute_script("arguments[0].scrollIntoView(true);", element)
-                        element.click()
-                        print(f"Clicked on {element_selector} successfully!")
-                        capture_screenshot(driver, f"clicked_{element_selector.replace('#', '').replace('.', '')}.png", username)
-                        break
-                    except StaleElementReferenceException:
-                        print(f"Stale element reference encountered for {element_selector}. Retrying...")
-                        continue
-                    except TimeoutException:
-                        print(f"Timeout waiting for {element_selector}. Retrying...")
-                        continue
-                else:
-                    print(f"Failed to click on {element_selector} after 3 retries.")
-            except ValueError:
-                print(f"Malformed action: {action}. Expected format 'type=value'. Skipping.")
-                continue
-        
-        return True  
-        
-    except Exception as e:
-        print(f"An error occurred while performing actions on NAD result elements: {str(e)}")
-        capture_screenshot(driver, "nad_result_error.png", username)
-        return False  
+# Result-entry click plans by analyte kind (see ANALYTE_KINDS)
+RESULT_ELEMENT_PLANS = {
+    "NAD": NAD_result_elements,
+    "Chrysotile": Chrysotile_result_elements,
+    "Amosite": amosite_result_elements,
+    "Crocidolite": crocidolite_result_elements,
+}
+
+def parse_locator(action):
+    """Turn a plan entry ('id=...' or 'css=...') into a Selenium locator; ValueError if malformed."""
+    element_type, separator, element_selector = action.partition("=")
+    if not separator:
+        raise ValueError(f"Malformed action: {action}. Expected format 'type=value'")
+    if element_type == "id":
+        return (By.ID, element_selector)
+    if element_type == "css":
+        return (By.CSS_SELECTOR, element_selector)
+    raise ValueError(f"Unknown locator type '{element_type}' in {action}")
 
 @handle_popup
-def click_Chrysotile_result_elements(driver, Chrysotile_result_elements, username):
-    """Iterates over the list of Chrysotile result elements and performs actions."""
+def run_result_plan(driver, kind, username):
+    """
+    Replays the click plan of an analyte kind (RESULT_ELEMENT_PLANS) on the Analysis tab.
+    The options lists are read back after every click, per analysis row the plan
+    selects; if every click went through, that is staged as the analyte's
+    candidate desired state (see commit_staged_result_target).
+    """
+    _staged_result_target.clear()
+    sections, failed, previous_selected_row = [], [], False
     try:
-        for action in Chrysotile_result_elements:
+        for index, action in enumerate(RESULT_ELEMENT_PLANS[kind]):
             try:
-                element_type, element_selector = action.split("=")
-                if element_type == "id":
-                    locator = (By.ID, element_selector)
-                elif element_type == "css":
-                    locator = (By.CSS_SELECTOR, element_selector)
-                else:
-                    print(f"Unknown locator type '{element_type}'. Skipping this element.")
-                    continue
+                locator = parse_locator(action)
+                element_selector = locator[1]
+                if RECORD_DOM_DIR:
+                    record_dom_snapshot(driver, f"plan.{kind}.{index}", action)
 
-                print(f"Attempting to click element: {element_selector}")
+                log.debug("Attempting to click element: %s", element_selector)
                 for attempt in range(3):
                     try:
-                        element = WebDriverWait(driver, 20).until(
+                        element = wait_until(driver, "result.element", 20,
                             EC.element_to_be_clickable(locator)
                         )
                         driver.execute_script("arguments[0].scrollIntoView(true);", element)
                         element.click()
-                        print(f"Clicked on {element_selector} successfully!")
+                        log.debug("Clicked on %s successfully!", element_selector)
                         capture_screenshot(driver, f"clicked_{element_selector.replace('#', '').replace('.', '')}.png", username)
                         break
                     except StaleElementReferenceException:
-                        print(f"Stale element reference encountered for {element_selector}. Retrying...")
+                        log.warning("Stale element reference encountered for %s. Retrying...", element_selector)
                         continue
                     except TimeoutException:
-                        print(f"Timeout waiting for {element_selector}. Retrying...")
+                        log.warning("Timeout waiting for %s. Retrying...", element_selector)
                         continue
                 else:
-                    print(f"Failed to click on {element_selector} after 3 retries.")
+                    log.warning("Failed to click on %s after 3 retries.", element_selector)
+                    failed.append(action)
+                    continue
 
-            except ValueError:
-                print(f"Malformed action: {action}. Expected format 'type=value'. Skipping.")
+            except ValueError as e:
+                log.info("%s. Skipping.", e)
+                failed.append(action)
                 continue
-                
+
+            # Consecutive row/tab clicks select one analysis row together
+            selected_row = selects_analysis_row(action)
+            if selected_row and not previous_selected_row:
+                sections.append({'select': [], 'options': {}})
+            if selected_row:
+                sections[-1]['select'].append(action)
+            previous_selected_row = selected_row
+            if sections:
+                sections[-1]['options'] = read_result_selections(driver)
+
+        if failed:
+            log.warning("⚠️ %s of %s %s plan clicks failed - not learning its result state", len(failed), len(RESULT_ELEMENT_PLANS[kind]), kind)
+        else:
+            stage_result_target(kind, sections)
         return True
-        
+
     except Exception as e:
-        print(f"An error occurred while performing actions on Chrysotile result elements: {str(e)}")
-        capture_screenshot(driver, "chrysotile_result_error.png", username)
+        log.error("An error occurred while performing actions on %s result elements: %s", kind, str(e))
+        capture_screenshot(driver, f"{kind.lower()}_result_error.png", username, failure=True)
         return False
 
-@handle_popup
-def click_amosite_result_elements(driver, amosite_result_elements, username):
-    """Iterates over the list of Amosite result elements and performs actions."""
+# ============================================================================
+# DESIRED-STATE RESULT ENTRY
+# ============================================================================
+
+# 'replay' (the default) always replays the blind click plans above;
+# 'desired_state' reads the current option selections and only clicks what
+# differs from the learned target for the analyte. Analytes replay until their
+# target is confirmed by RESULT_TARGET_CONFIRMATIONS saved replays that produced
+# the same selections. The option-list IDs and ANALYSIS_ROW_MARKERS below have
+# only been checked against mock_lims.py, so turn desired_state on per
+# deployment once it has been tried on the real LIMS.
+RESULT_ENTRY_MODE = os.environ.get('RESULT_ENTRY_MODE', 'replay')
+RESULT_TARGET_CONFIRMATIONS = 2
+
+FIBRE_UX_PREFIX = "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX"
+OPTIONS_CONTROL_PREFIX = FIBRE_UX_PREFIX + ".V.R1.FIBRE_ANALYSIS_OPTIONS_LIST.CONTROL."
+OPTION_VALUE_PREFIX = FIBRE_UX_PREFIX + ".FIBRE_ANALYSIS_OPTIONS_LIST.VALUE.I."
+# Plan entries that switch the analysis row (or tab) the options lists belong to
+ANALYSIS_ROW_MARKERS = ('FIBRE_ANALYSIS_LIST', '_analysis_tab_')
+
+# Confirmed target per analyte, one section per analysis row the plan selects:
+# {kind: [{'select': [plan entries], 'options': {control index: option text}}, ...]}
+# Persisted in the user's state file
+result_targets = {}
+
+# Replayed targets not confirmed yet: {kind: {'sections': [...], 'replays': n}}
+result_target_candidates = {}
+
+# Sections read during a clean replay, counted towards confirmation once the save succeeds
+_staged_result_target = {}
+
+def selects_analysis_row(action):
+    return any(marker in action for marker in ANALYSIS_ROW_MARKERS)
+
+def css_id(element_id):
+    """CSS selector for an element id containing dots."""
+    return "#" + element_id.replace(".", "\\.")
+
+def read_result_selections(driver):
+    """Read the displayed value of every Fibre Analysis options list in one call."""
+    script = """
+        var prefix = arguments[0], out = {};
+        document.querySelectorAll('[id^="' + prefix + '"]').forEach(function (el) {
+            var match = el.id.slice(prefix.length).match(/^(\\d+)$/);
+            if (!match) { return; }
+            var input = el.querySelector('input');
+            var text = input ? input.value : (el.innerText || el.textContent || '');
+            out[match[1]] = text.replace(/\\s+/g, ' ').trim();
+        });
+        return out;
+    """
     try:
-        for action in amosite_result_elements:
-            try:
-                element_type, element_selector = action.split("=")
-                if element_type == "id":
-                    locator = (By.ID, element_selector)
-                elif element_type == "css":
-                    locator = (By.CSS_SELECTOR, element_selector)
-                else:
-                    print(f"Unknown locator type '{element_type}'. Skipping this element.")
-                    continue
+        return driver.execute_script(script, OPTIONS_CONTROL_PREFIX) or {}
+    except Exception as e:
+        log.warning("⚠️ Could not read Fibre Analysis selections: %s", e)
+        return {}
+
+def diff_result_selections(current, target):
+    """Return {control index: option text} for every control that differs from the target."""
+    return {
+        control: text for control, text in target.items()
+        if text and current.get(control) != text
+    }
 
-                print(f"Attempting to click element: {element_selector}")
-                for attempt in range(3):
-                    try:
-                        element = WebDriverWait(driver, 20).until(
-                            EC.element_to_be_clickable(locator)
-                        )
-                        driver.execute_script("arguments[0].scrollIntoView(true);", element)
-                        element.click()
-                        print(f"Clicked on {element_selector} successfully!")
-                        capture_screenshot(driver, f"clicked_{element_selector.replace('#', '').replace('.', '')}.png", username)
-                        break
-                    except StaleElementReferenceException:
-                        print(f"Stale element reference encountered for {element_selector}. Retrying...")
-                        continue
-                    except TimeoutException:
-                        print(f"Timeout waiting for {element_selector}. Retrying...")
-                        continue
-                else:
-                    print(f"Failed to click on {element_selector} after 3 retries.")
+def stage_result_target(kind, sections):
+    """Hold the per-row selections produced by a clean replay until the sample is saved."""
+    _staged_result_target.clear()
+    sections = [section for section in sections if section['options']]
+    if sections:
+        _staged_result_target[kind] = sections
 
-            except ValueError:
-                print(f"Malformed action: {action}. Expected format 'type=value'. Skipping.")
-                continue
-                
-        return True
-        
-    except Exception as e:
-        print(f"An error occurred while performing actions on Amosite result elements: {str(e)}")
-        capture_screenshot(driver, "amosite_result_error.png", username)
+def commit_staged_result_target():
+    """
+    Count the staged selections towards their analyte's candidate target and
+    promote the candidate once RESULT_TARGET_CONFIRMATIONS replays agreed.
+    """
+    for kind, sections in _staged_result_target.items():
+        candidate = result_target_candidates.get(kind)
+        if candidate and candidate['sections'] == sections:
+            candidate['replays'] += 1
+        else:
+            candidate = result_target_candidates[kind] = {'sections': sections, 'replays': 1}
+        if candidate['replays'] >= RESULT_TARGET_CONFIRMATIONS and result_targets.get(kind) != sections:
+            log.info("🎯 Learned desired %s result state after %s matching replays: %s", kind, candidate['replays'], sections)
+            result_targets[kind] = sections
+    _staged_result_target.clear()
+
+def _select_option(driver, control, text, username):
+    """Open an options list and pick the option whose text matches."""
+    control_table = wait_until(driver, "result.options_control", 20,
+        EC.element_to_be_clickable((By.CSS_SELECTOR, css_id(OPTIONS_CONTROL_PREFIX + control) + " > table"))
+    )
+    driver.execute_script("arguments[0].scrollIntoView(true);", control_table)
+    if not click_element_safely(driver, control_table, f"options list {control}"):
         return False
-        
-def click_crocidolite_result_elements(driver, crocidolite_result_elements, username):
-    """Iterates over the list of Crocidolite result elements and performs actions."""
-    try:
-        for action in crocidolite_result_elements:
-            try:
-                element_type, element_selector = action.split("=")
-                if element_type == "id":
-                    locator = (By.ID, element_selector)
-                elif element_type == "css":
-                    locator = (By.CSS_SELECTOR, element_selector)
-                else:
-                    print(f"Unknown locator type '{element_type}'. Skipping this element.")
-                    continue
 
-                print(f"Attempting to click element: {element_selector}")
-                for attempt in range(3):
-                    try:
-                        element = WebDriverWait(driver, 20).until(
-                            EC.element_to_be_clickable(locator)
-                        )
-                        driver.execute_script("arguments[0].scrollIntoView(true);", element)
-                        element.click()
-                        print(f"Clicked on {element_selector} successfully!")
-                        capture_screenshot(driver, f"clicked_{element_selector.replace('#', '').replace('.', '')}.png", username)
-                        break
-                    except StaleElementReferenceException:
-                        print(f"Stale element reference encountered for {element_selector}. Retrying...")
-                        continue
-                    except TimeoutException:
-                        print(f"Timeout waiting for {element_selector}. Retrying...")
-                        continue
-                else:
-                    print(f"Failed to click on {element_selector} after 3 retries.")
-
-            except ValueError:
-                print(f"Malformed action: {action}. Expected format 'type=value'. Skipping.")
-                continue
-                
-        return True
-        
-    except Exception as e:
-        print(f"An error occurred while performing actions on Crocidolite result elements: {str(e)}")
-        capture_screenshot(driver, "crocidolite_result_error.png", username)
+    find_option = """
+        var prefix = arguments[0], wanted = arguments[1];
+        var options = document.querySelectorAll('[id^="' + prefix + '"]');
+        for (var i = 0; i < options.length; i++) {
+            var text = (options[i].innerText || options[i].textContent || '').replace(/\\s+/g, ' ').trim();
+            if (text === wanted && options[i].offsetParent !== null) { return options[i]; }
+        }
+        return null;
+    """
+    option = wait_until(driver, "result.option_value", 20,
+        lambda d: d.execute_script(find_option, OPTION_VALUE_PREFIX, text)
+    )
+    if not click_element_safely(driver, option, f"option '{text}'"):
         return False
+    wait_for_no_overlay(driver, site="result.option_overlay")
+    return True
 
-@handle_popup
-def click_save_button(driver, username):
-    """Clicks the save button on the Fibre Analysis page."""
-    try:
-        print("Attempting to click the save button...")
+def apply_desired_result_state(driver, kind, username):
+    """
+    Bring the options lists of every analysis row in the learned target to
+    their selections, clicking only the lists whose current selection differs.
+    """
+    for section in result_targets[kind]:
+        if not _apply_result_section(driver, kind, section, username):
+            return False
+    capture_screenshot(driver, f"{kind}_result.png", username)
+    return True
 
-        save_button = WebDriverWait(driver, 15).until(
-            EC.element_to_be_clickable((By.ID, "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.FOOTER_CONTROLS.PreSaveChecks.ICON"))
-        )
+def _apply_result_section(driver, kind, section, username):
+    target = section['options']
+    try:
+        for action in section['select']:
+            row = wait_until(driver, "result.analysis_row", 20,
+                EC.element_to_be_clickable(parse_locator(action))
+            )
+            click_element_safely(driver, row, "analysis row")
+        wait_for_no_overlay(driver, site="result.row_overlay")
 
-        driver.execute_script("arguments[0].scrollIntoView(true);", save_button)
-        save_button.click()
-        print("Save button clicked successfully!")
+        changes = diff_result_selections(read_result_selections(driver), target)
+        if not changes:
+            log.info("✅ %s result already in the desired state for this row - nothing to click", kind)
+            return True
 
-        WebDriverWait(driver, 15).until_not(
-            EC.presence_of_element_located((By.ID, "loading_indicator_id"))
-        )
-        print("Save action completed.")
-        capture_screenshot(driver, "Save_screenshot.png", username)
+        log.info("Setting %s of %s options lists: %s", len(changes), len(target), changes)
+        for control, text in sorted(changes.items(), key=lambda item: int(item[0])):
+            if not _select_option(driver, control, text, username):
+                log.error("❌ Could not select '%s' in options list %s", text, control)
+                return False
 
+        remaining = diff_result_selections(read_result_selections(driver), target)
+        if remaining:
+            log.error("❌ Options lists still differ from the desired %s state: %s", kind, remaining)
+            capture_screenshot(driver, f"desired_state_mismatch_{kind}.png", username, failure=True)
+            return False
         return True
 
     except TimeoutException:
-        print("Error: Save button not clickable or not found.")
-        capture_screenshot(driver, "save_button_error.png", username)
+        log.error("❌ Timeout while applying the desired %s result state", kind)
+        capture_screenshot(driver, f"desired_state_timeout_{kind}.png", username, failure=True)
         return False
     except Exception as e:
-        print(f"An error occurred while clicking the save button: {e}")
-        capture_screenshot(driver, "save_button_exception.png", username)
+        log.error("❌ Error while applying the desired %s result state: %s", kind, e)
+        capture_screenshot(driver, f"desired_state_error_{kind}.png", username, failure=True)
         return False
 
-@handle_popup
-def close_fiber_analysis(driver):
-    """Closes the Fibre Analysis dialog by clicking on the close button."""
-    try:
-        close_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.ID, "A5dlg2.TITLE.TOOLS."))
-        )
+# ============================================================================
+# SAVE CONFIRMATION
+# ============================================================================
 
-        close_button.click()
+# Substrings identifying the save request in its URL or POST body
+SAVE_REQUEST_MARKERS = ('PreSaveChecks',)
+# Seconds to wait for the save request to show up before relying on DOM signals only
+SAVE_REQUEST_GRACE = 3
+# Dialog text that means the LIMS rejected the save
+SAVE_ERROR_WORDS = ('error', 'failed', 'invalid', 'required', 'cannot', 'must')
 
-        print("Fibre Analysis dialog closed successfully.")
-        return True
+def read_performance_log(driver):
+    """Drain Chrome's performance log and return the CDP messages it held."""
+    try:
+        entries = driver.get_log('performance')
+    except Exception:
+        # Performance logging not enabled for this driver
+        return []
+
+    messages = []
+    for entry in entries:
+        try:
+            messages.append(json.loads(entry['message'])['message'])
+        except (KeyError, ValueError, TypeError):
+            continue
+    if CAPTURE_HAR:
+        record_network_events(messages)
+    return messages
+
+def _is_save_request(request):
+    text = request.get('url', '') + request.get('postData', '')
+    return any(marker in text for marker in SAVE_REQUEST_MARKERS)
+
+def wait_for_save_response(driver, timeout):
+    """
+    Follow the save request through the CDP network events in the performance log.
+    Returns (True/False, detail) once the server answered, or (None, detail)
+    when no save request was seen and the outcome is unknown.
+    """
+    started = time.monotonic()
+    save_requests = set()
+    
+    while time.monotonic() - started < timeout:
+        for message in read_performance_log(driver):
+            method = message.get('method')
+            params = message.get('params', {})
+            request_id = params.get('requestId')
+            
+            if method == 'Network.requestWillBeSent' and _is_save_request(params.get('request', {})):
+                save_requests.add(request_id)
+            elif request_id not in save_requests:
+                continue
+            elif method == 'Network.responseReceived':
+                status = params.get('response', {}).get('status', 0)
+                if status >= 400:
+                    return False, f"save request returned HTTP {status}"
+            elif method == 'Network.loadingFailed':
+                return False, f"save request failed: {params.get('errorText', 'unknown error')}"
+            elif method == 'Network.loadingFinished':
+                return True, f"server responded in {time.monotonic() - started:.1f}s"
+        
+        if not save_requests and time.monotonic() - started > SAVE_REQUEST_GRACE:
+            return None, "no save request seen in the network log"
+        time.sleep(0.1)
+    
+    if save_requests:
+        return False, f"no server response within {timeout:.0f}s"
+    return None, "no save request seen in the network log"
+
+def read_dialog_message(driver):
+    """Return the text of the LIMS message dialog if one is showing."""
+    try:
+        dialogs = driver.find_elements(By.CSS_SELECTOR, "[id^='A5dlg1']")
+        texts = [d.text.strip() for d in dialogs if d.is_displayed() and d.text.strip()]
+        return texts[0] if texts else ''
+    except Exception:
+        return ''
+
+def confirm_save(driver):
+    """
+    Decide whether a save went through. The server response to the save request
+    is authoritative when Chrome performance logging is available; the UI lock
+    overlay and any message dialog are checked in every case.
+    Returns (saved, detail).
+    """
+    timeout = adaptive_timeout("save.confirmation", 30)
+    started = time.monotonic()
+    
+    saved, detail = wait_for_save_response(driver, timeout)
+    if saved is False:
+        return False, detail
+    
+    # The form is locked while the LIMS processes the save; the remaining
+    # save.confirmation budget is already learned, so it is not adapted again
+    if not wait_for_no_overlay(driver, timeout=max(1, timeout - (time.monotonic() - started)), site=None):
+        return False, "UI still locked after saving"
+    record_wait_latency("save.confirmation", time.monotonic() - started)
+    
+    message = read_dialog_message(driver)
+    if message and any(word in message.lower() for word in SAVE_ERROR_WORDS):
+        return False, f"LIMS reported: {message}"
+    
+    if saved is None:
+        detail = "UI unlocked" + (f", LIMS said: {message}" if message else "")
+    return True, detail
+
+@handle_popup
+def click_save_button(driver, username):
+    """Clicks the save button on the Fibre Analysis page and confirms the save went through."""
+    try:
+        log.debug("Attempting to click the save button...")
+
+        save_button = wait_until(driver, "save.button", 15,
+            EC.element_to_be_clickable((By.ID, "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.FOOTER_CONTROLS.PreSaveChecks.ICON"))
+        )
+
+        driver.execute_script("arguments[0].scrollIntoView(true);", save_button)
+        
+        # Drop network events from earlier steps so only the save is tracked
+        read_performance_log(driver)
+        save_button.click()
+        log.info("Save button clicked successfully!")
+
+        saved, detail = confirm_save(driver)
+        if not saved:
+            log.error("❌ Save was not confirmed: %s", detail)
+            capture_screenshot(driver, "save_not_confirmed.png", username, failure=True)
+            return False
+        
+        log.info("Save action completed (%s).", detail)
+        capture_screenshot(driver, "Save_screenshot.png", username)
+
+        return True
+
+    except TimeoutException:
+        log.error("Error: Save button not clickable or not found.")
+        capture_screenshot(driver, "save_button_error.png", username, failure=True)
+        return False
+    except Exception as e:
+        log.error("An error occurred while clicking the save button: %s", e)
+        capture_screenshot(driver, "save_button_exception.png", username, failure=True)
+        return False
+
+@handle_popup
+def close_fiber_analysis(driver):
+    """Closes the Fibre Analysis dialog by clicking on the close button."""
+    try:
+        close_button = wait_until(driver, "fibre.close_button", 10,
+            EC.element_to_be_clickable((By.ID, "A5dlg2.TITLE.TOOLS."))
+        )
+
+        close_button.click()
+
+        log.info("Fibre Analysis dialog closed successfully.")
+        return True
     except TimeoutException:
-        print("Timeout: Close button not clickable or not found.")
+        log.warning("Timeout: Close button not clickable or not found.")
     except NoSuchElementException:
-        print("Error: Close button not found.")
+        log.error("Error: Close button not found.")
     except Exception as e:
-        print(f"An error occurred while closing the Fibre Analysis dialog: {str(e)}")
+        log.error("An error occurred while closing the Fibre Analysis dialog: %s", str(e))
     return False
 
+# ============================================================================
+# STATE HISTORY ARCHIVE
+# ============================================================================
+
+# Sample records older than this many days move out of the committed state file
+# into state_archive/<user>/YYYY-MM.json.gz; 0 keeps the whole history in the state
+STATE_ARCHIVE_DAYS = int(os.environ.get('STATE_ARCHIVE_DAYS', '30'))
+STATE_ARCHIVE_DIR = os.environ.get('STATE_ARCHIVE_DIR', 'state_archive')
+ARCHIVED_HISTORIES = ('processed_samples', 'failed_samples')
+
+def archive_dir_for(username):
+    return os.path.join(STATE_ARCHIVE_DIR, username)
+
+def _archive_month(record, cutoff):
+    """'YYYY-MM' of a record older than cutoff, or None to keep it in the state."""
+    try:
+        timestamp = datetime.fromisoformat(str(record['timestamp']).replace('Z', '+00:00'))
+    except (KeyError, ValueError):
+        return None
+    if timestamp.tzinfo is None:
+        cutoff = cutoff.replace(tzinfo=None)
+    return timestamp.strftime('%Y-%m') if timestamp < cutoff else None
+
+def _record_key(record):
+    return (record.get('project'), record.get('sample'), record.get('timestamp'))
+
+def load_archive_month(path):
+    if not os.path.exists(path):
+        return {}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_archive_month(path, archive):
+    """Write one month atomically; mtime=0 keeps unchanged months byte-identical for git."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = gzip.compress(json.dumps(archive, indent=1, default=str).encode('utf-8'), mtime=0)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+def compact_state(state, username, now=None):
+    """
+    Move processed/failed sample records older than STATE_ARCHIVE_DAYS into the
+    user's per-month archives and count them in state['archived_totals'].
+    Returns the number of records moved.
+    """
+    # The one-off positional migration reads the full history, so wait for the row index
+    if STATE_ARCHIVE_DAYS <= 0 or 'settled_row_hashes' not in state:
+        return 0
+    cutoff = (now or get_uk_time()) - timedelta(days=STATE_ARCHIVE_DAYS)
+
+    by_month, kept = {}, {}
+    for history in ARCHIVED_HISTORIES:
+        kept[history] = []
+        for record in state.get(history, []):
+            month = _archive_month(record, cutoff)
+            if month is None:
+                kept[history].append(record)
+            else:
+                by_month.setdefault(month, {}).setdefault(history, []).append(record)
+    if not by_month:
+        return 0
+
+    archived, moved = {}, 0
+    for month, histories in sorted(by_month.items()):
+        path = os.path.join(archive_dir_for(username), f"{month}.json.gz")
+        archive = load_archive_month(path)
+        for history, records in histories.items():
+            # A crash between writing the archive and the state can archive a record twice
+            known = {_record_key(r) for r in archive.get(history, [])}
+            new = [r for r in records if _record_key(r) not in known]
+            archive.setdefault(history, []).extend(new)
+            archived[history] = archived.get(history, 0) + len(new)
+            moved += len(records)
+        write_archive_month(path, archive)
+    # Only drop records from the state once every month they went to is written
+    state.update(kept)
+    totals = state.setdefault('archived_totals', {})
+    for history, count in archived.items():
+        totals[history] = totals.get(history, 0) + count
+    log.info("🗄️  Archived %s record(s) older than %s days into %s", moved, STATE_ARCHIVE_DAYS, archive_dir_for(username))
+    return moved
+
+def load_archived_history(username, history='processed_samples'):
+    """All archived records of one history for a user, oldest month first."""
+    folder = archive_dir_for(username)
+    if not os.path.isdir(folder):
+        return []
+    records = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.json.gz'):
+            records.extend(load_archive_month(os.path.join(folder, name)).get(history, []))
+    return records
+
+def drop_archived_samples(username, project_number, samples, history='processed_samples'):
+    """Remove a project's samples from the archives (e.g. found not saved on the LIMS). Returns the count."""
+    folder = archive_dir_for(username)
+    if not samples or not os.path.isdir(folder):
+        return 0
+    dropped = 0
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.json.gz'):
+            continue
+        path = os.path.join(folder, name)
+        archive = load_archive_month(path)
+        records = archive.get(history, [])
+        kept = [r for r in records if not (r.get('project') == project_number and r.get('sample') in samples)]
+        if len(kept) != len(records):
+            dropped += len(records) - len(kept)
+            archive[history] = kept
+            write_archive_month(path, archive)
+    return dropped
+
+def failed_samples_total(state):
+    """Failed attempts recorded so far, including archived ones."""
+    return len(state.get('failed_samples', [])) + state.get('archived_totals', {}).get('failed_samples', 0)
+
 # ============================================================================
 # STATE MANAGEMENT FOR GITHUB ACTIONS
 # ============================================================================
 
+def state_summary(state):
+    """Counts and position of a state, for logging instead of the whole state."""
+    return (f"{state.get('total_samples_processed', 0)} processed, "
+            f"{failed_samples_total(state)} failed, "
+            f"{len(state.get('retry_queue', []))} awaiting retry, "
+            f"{len(state.get('pending_samples', []))} pending; "
+            f"project {state.get('current_project')} at index {state.get('current_sample_index', 0)}")
+
 def load_state(username):
     """Load automation state from user-specific file."""
     config = get_user_config(username)
@@ -1193,43 +2248,73 @@ def load_state(username):
         if os.path.exists(state_file):
             with open(state_file, 'r') as f:
                 state = json.load(f)
-            print(f"📂 State loaded for {username}: {state}")
+            log.info("📂 State loaded for %s: %s", username, state_summary(state))
+            log.debug("Full state for %s: %s", username, state)
+            load_wait_latencies(username, state.pop('wait_latencies', None))
+            # Targets from before per-row confirmation were single, unchecked replays
+            result_targets.clear()
+            result_targets.update({kind: target for kind, target in state.get('result_targets', {}).items()
+                                   if isinstance(target, list)})
+            result_target_candidates.clear()
+            result_target_candidates.update(state.get('result_target_candidates', {}))
             return state
     except Exception as e:
-        print(f"⚠️ Could not load state for {username}: {e}")
+        log.warning("⚠️ Could not load state for %s: %s", username, e)
     
     default_state = {
         'current_project': None,
         'current_sample_index': 0,
         'processed_samples': [],
         'failed_samples': [],
+        'retry_queue': [],
         'completed_projects': [],
         'last_run_time': None,
         'total_samples_processed': 0,
         'user': username
     }
-    print(f"🆕 Using default state for {username}")
+    load_wait_latencies(username)
+    log.info("🆕 Using default state for %s", username)
     return default_state
 
+def peek_state(username):
+    """Read a user's state file without printing it or touching the loaded latencies/targets."""
+    state_file = get_user_config(username)['state_file']
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file, 'r') as f:
+        return json.load(f)
+
 def save_state(state, username):
     """Save automation state to user-specific file."""
     config = get_user_config(username)
     state_file = config['state_file']
     
+    # Carry the learned result targets along with the rest of the state
+    state.pop('wait_latencies', None)
+    save_wait_latencies(username)
+    state['result_targets'] = result_targets
+    state['result_target_candidates'] = result_target_candidates
+    
+    try:
+        compact_state(state, username)
+    except Exception as e:
+        log.warning("⚠️ Could not archive old state history for %s: %s", username, e)
+    
     try:
         with open(state_file, 'w') as f:
             json.dump(state, f, indent=2, default=str)
-        print(f"💾 State saved for {username}: {state}")
+        log.info("💾 State saved for %s: %s", username, state_summary(state))
+        log.debug("Full state for %s: %s", username, state)
     except Exception as e:
-        print(f"❌ Error saving state for {username}: {e}")
+        log.error("❌ Error saving state for %s: %s", username, e)
 
 def count_samples_on_website(driver):
     """Count samples on website using record count element."""
     try:
-        print("Counting samples on website...")
+        log.info("Counting samples on website...")
         
         try:
-            record_count_element = WebDriverWait(driver, 15).until(
+            record_count_element = wait_until(driver, "fibre.record_count", 15,
                 EC.presence_of_element_located((By.ID, "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA.RECORDCOUNT.TOP"))
             )
             
@@ -1237,24 +2322,28 @@ def count_samples_on_website(driver):
             
             if record_count_text.isdigit():
                 total_samples = int(record_count_text)
-                print(f"✅ Found total samples: {total_samples}")
+                log.info("✅ Found total samples: %s", total_samples)
                 return total_samples
             else:
-                print(f"⚠️ Record count not a number: '{record_count_text}'")
+                log.warning("⚠️ Record count not a number: '%s'", record_count_text)
                 
         except TimeoutException:
-            print("⚠️ Record count element not found")
+            log.warning("⚠️ Record count element not found")
         
         return -1
         
     except Exception as e:
-        print(f"❌ Error counting samples: {e}")
+        log.error("❌ Error counting samples: %s", e)
         return -1
 
+# Rows per project that validate_results_sheet() rejected in this run's sheet. They
+# are still samples on the LIMS, so they count towards the spreadsheet side.
+rejected_rows_by_project = {}
+
 def verify_sample_counts(driver, project_df, project_number):
     """Compare sample counts between spreadsheet and website."""
     try:
-        spreadsheet_count = len(project_df)
+        spreadsheet_count = len(project_df) + rejected_rows_by_project.get(int(project_number), 0)
         website_count = count_samples_on_website(driver)
         
         result = {
@@ -1284,43 +2373,1112 @@ def verify_sample_counts(driver, project_df, project_number):
             'reason': f'Error during verification: {str(e)}'
         }
 
-def get_next_sample_to_process(df, state):
-    """Determine the next sample to process."""
+# ============================================================================
+# CACHED SAMPLE-COUNT VERIFICATION
+# ============================================================================
+
+# A project whose counts did not match is set aside until its sheet rows change,
+# or until this many hours have passed (the website count may have been fixed)
+COUNT_RECHECK_HOURS = 24
+
+def project_fingerprint(project_df):
+    """
+    Content fingerprint of a project's sheet rows, built from the per-row hashes
+    (sheet_row_hashes), so source positions and scheduling columns do not count.
+    Rejected rows of the project count too, since they are part of its sample count.
+    """
+    rows = sorted(sheet_row_hashes(project_df).items())
+    rejected = rejected_rows_by_project.get(int(project_df["Project Number"].iloc[0]), 0) if len(project_df) else 0
+    return hashlib.sha1(json.dumps([len(project_df), rejected, rows]).encode('utf-8')).hexdigest()
+
+def _project_rows(df, project_number):
+    return df[df["Project Number"] == project_number]
+
+def is_project_count_blocked(df, state, project_number):
+    """True while a project with mismatched counts should be left alone."""
+    cached = state.get('count_verifications', {}).get(str(int(project_number)))
+    if not cached or cached['match']:
+        return False
+    if cached['fingerprint'] != project_fingerprint(_project_rows(df, project_number)):
+        # The sheet rows were edited; verify again
+        return False
+    age = get_uk_time() - datetime.fromisoformat(cached['checked'])
+    return age < timedelta(hours=COUNT_RECHECK_HOURS)
+
+def verify_sample_counts_cached(driver, state, project_df, project_number):
+    """
+    verify_sample_counts() with a per-project cache keyed on the sheet rows'
+    fingerprint and the website count. A project that matched is not counted
+    again until its rows change; a mismatched one is re-verified whenever
+    either side changes.
+    """
+    cache = state.setdefault('count_verifications', {})
+    key = str(int(project_number))
+    fingerprint = project_fingerprint(project_df)
+    cached = cache.get(key)
+    
+    if cached and cached['fingerprint'] == fingerprint and cached['match']:
+        log.info("✅ Sample counts for project %s verified earlier and sheet unchanged", project_number)
+        return cached
+    
+    if cached and cached['fingerprint'] == fingerprint:
+        website_count = count_samples_on_website(driver)
+        if website_count == cached['website_count']:
+            log.info("♻️  Project %s: sheet and website count unchanged since last verification", project_number)
+            cached['checked'] = get_uk_time().isoformat()
+            return cached
+    
+    verification = verify_sample_counts(driver, project_df, project_number)
+    verification['fingerprint'] = fingerprint
+    verification['checked'] = get_uk_time().isoformat()
+    cache[key] = verification
+    return verification
+
+# ============================================================================
+# SESSION AND PROJECT NAVIGATION
+# ============================================================================
+
+def open_lab_project_list(driver, username, password):
+    """Log in and open the Lab Project List. Returns (success, failure reason)."""
+    if not login(driver, username, password, username):
+        return False, "Login failed"
+    if not click_lab_button(driver) or not click_lab_project_list_button(driver):
+        return False, "Navigation failed"
+    return True, None
+
+def open_project_fibre_analysis(driver, project_number, username):
+    """
+    Search for a project from the Lab Project List and open its Fibre Analysis
+    records. Returns (success, failure reason).
+    """
+    wait_for_no_overlay(driver, site="project.overlay")
+    clear_search_criteria(driver)
+    
+    if not input_project_number(driver, project_number, username):
+        return False, "Failed to input project"
+    
+    if not press_enter_or_search_on_project_number(driver, project_number):
+        return False, "Failed to search project"
+    
+    verify_project_numbers(driver, username)
+    
+    if not click_view_fibre_analysis_button(driver, username):
+        return False, "Failed to open analysis"
+    return True, None
+
+# ============================================================================
+# NEXT-PROJECT PREFETCH (WATCH MODE)
+# ============================================================================
+
+# In watch mode the browser outlives a run. Once a save is confirmed the next
+# project (if it differs) is searched and opened in a second tab of the same
+# session, so the next run starts with a tab switch instead of the search /
+# "Creating Fibre Analysis records" chain.
+PREFETCH_NEXT_PROJECT = os.environ.get('PREFETCH_NEXT_PROJECT', 'true').lower() == 'true'
+FIBRE_FIRST_BUTTON_ID = "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.FOOTER_CONTROLS.First.ICON"
+
+def predict_next_project(df, state, project_number, sample_no, order=None):
+    """The project the scheduler will pick once this sample is saved, if it is a different one."""
+    trial = copy.deepcopy(state)
+    remove_pending_sample(trial, project_number, sample_no)
+    next_project, _, _ = _get_next_fresh_sample(df, trial, order)
+    return next_project if next_project not in (None, project_number) else None
+
+def prefetch_project(driver, project_number, username):
+    """
+    Open a project's Fibre Analysis records in a new tab of the logged-in
+    session, then switch back. Logging in again there would replace the
+    session the current tab is using, so without a known main menu URL
+    nothing is prefetched.
+    Returns {'project', 'handle', 'opened'} or None if the project could not be opened.
+    """
+    main_menu = main_menu_urls.get(driver.session_id)
+    if not main_menu:
+        return None
+    original = driver.current_window_handle
+    driver.switch_to.new_window('tab')
+    handle = driver.current_window_handle
+    log.info("🔮 Prefetching project %s in a second tab...", project_number)
+    
+    try:
+        driver.get(main_menu)
+        if click_lab_button(driver) and click_lab_project_list_button(driver):
+            opened, reason = open_project_fibre_analysis(driver, project_number, username)
+        else:
+            opened, reason = False, "Navigation failed"
+    except Exception as e:
+        opened, reason = False, f"Prefetch error: {e}"
+    
+    if not opened:
+        log.warning("⚠️ Prefetch of project %s failed: %s", project_number, reason)
+        driver.close()
+    driver.switch_to.window(original)
+    if not opened:
+        return None
+    return {'project': project_number, 'handle': handle, 'opened': get_uk_time().isoformat()}
+
+def adopt_prefetched_project(driver, browser, project_number):
+    """
+    Switch to the tab prefetched for this project and close the others.
+    Returns False if there is no usable prefetched tab (wrong project, closed,
+    or the LIMS session expired while it waited).
+    """
+    prefetched = browser.pop('prefetched', None)
+    if not prefetched or prefetched['project'] != project_number:
+        return False
     try:
-        projects = df["Project Number"].unique()
+        if prefetched['handle'] not in driver.window_handles:
+            return False
+        for handle in driver.window_handles:
+            if handle != prefetched['handle']:
+                driver.switch_to.window(handle)
+                driver.close()
+        driver.switch_to.window(prefetched['handle'])
+        wait_until(driver, "prefetch.fibre_form", 5,
+            EC.presence_of_element_located((By.ID, FIBRE_FIRST_BUTTON_ID)),
+            record_timeouts=False
+        )
+        wait_for_no_overlay(driver, site="prefetch.overlay")
+    except Exception as e:
+        log.warning("⚠️ Prefetched tab for project %s is no longer usable: %s", project_number, e)
+        return False
+    
+    log.info("⚡ Using the tab prefetched for project %s at %s", project_number, prefetched['opened'])
+    return True
+
+# ============================================================================
+# PROJECT RECORD GRID
+# ============================================================================
+
+# The grid cell IDs below follow the form's naming but have not been checked
+# against the real LIMS. The grid is therefore only a "skip if already complete"
+# hint; navigation always goes by sample number with the Next button.
+RECORD_GRID_PREFIX = "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA.V.R"
+# Grid columns that may hold the sample number, in order of preference
+RECORD_SAMPLE_FIELDS = ('SAMPLE_NO', 'SAMPLE_NUMBER', 'SAMPLE_ID')
+# Grid columns that are all filled in once a record has been completed
+RECORD_COMPLETION_FIELDS = ('SAMPLE_SIZE', 'PLMENDTIME', 'ANALYST_ASSESSMENT')
+# Grid columns holding the analysis result options lists (FIBRE_ANALYSIS_OPTIONS_LIST_0, _1, ...)
+RECORD_RESULT_FIELD_PREFIX = 'FIBRE_ANALYSIS_OPTIONS_LIST'
+
+# Scraped records of the project currently open: {'project': n, 'records': {sample: record}}
+project_records_cache = {}
+
+def _read_record_grid(driver):
+    """Read every cell of the Fibre Analysis record grid in one script call."""
+    script = """
+        var prefix = arguments[0], rows = {};
+        document.querySelectorAll('[id^="' + prefix + '"]').forEach(function (el) {
+            var match = el.id.slice(prefix.length).match(/^(\\d+)\\.([A-Z0-9_]+)$/);
+            if (!match) { return; }
+            var value = (typeof el.value === 'string') ? el.value : (el.innerText || el.textContent || '');
+            rows[match[1]] = rows[match[1]] || {};
+            rows[match[1]][match[2]] = value.replace(/\\s+/g, ' ').trim();
+        });
+        return rows;
+    """
+    return driver.execute_script(script, RECORD_GRID_PREFIX) or {}
+
+def parse_record_grid(rows):
+    """
+    Turn raw grid rows ({row number: {field: text}}) into {sample number: record}.
+    A record holds whether it is completed and the key field values.
+    """
+    records = {}
+    for row_number in sorted(rows, key=int):
+        fields = rows[row_number]
+        sample_field = next((f for f in RECORD_SAMPLE_FIELDS if fields.get(f)), None)
+        if sample_field is None:
+            continue
+        sample_no = normalize_sample_number(fields[sample_field].split('-')[-1])
+        if sample_no is None:
+            continue
         
-        if state['current_project'] is None:
-            if len(projects) > 0:
-                state['current_project'] = int(projects[0])
-                state['current_sample_index'] = 0
-            else:
-                return None, None, None
+        # Only columns the grid actually shows can prove completion. The form
+        # fields are filled before the result is entered, so a record also
+        # needs its result options lists shown, with a selection made.
+        shown = [f for f in RECORD_COMPLETION_FIELDS if f in fields]
+        results = sorted(f for f in fields if f.startswith(RECORD_RESULT_FIELD_PREFIX))
+        records[sample_no] = {
+            'complete': bool(shown) and all(fields[f] for f in shown) and any(fields[f] for f in results),
+            'fields': {f: fields[f] for f in (sample_field,) + RECORD_COMPLETION_FIELDS + tuple(results) if f in fields}
+        }
+    return records
+
+def scrape_project_records(driver, project_number, refresh=False):
+    """
+    Return the scraped records of the open project, reading the grid only once
+    per project visit.
+    """
+    if not refresh and project_records_cache.get('project') == project_number:
+        return project_records_cache['records']
+    
+    try:
+        records = parse_record_grid(_read_record_grid(driver))
+    except Exception as e:
+        log.warning("⚠️ Could not scrape Fibre Analysis records for project %s: %s", project_number, e)
+        records = {}
+    
+    project_records_cache.clear()
+    project_records_cache.update({'project': project_number, 'records': records})
+    completed = sum(1 for r in records.values() if r['complete'])
+    log.info("📋 Project %s: %s records on the LIMS, %s already completed", project_number, len(records), completed)
+    return records
+
+def record_sample_already_done(state, project_number, sample_no, record):
+    """Treat a sample the LIMS already has results for as processed, without re-entering it."""
+    log.info("⏭️  Sample %s of project %s is already completed on the LIMS - skipping", sample_no, project_number)
+    state['processed_samples'].append({
+        'project': project_number,
+        'sample': sample_no,
+        'timestamp': get_uk_time().isoformat(),
+        'source': 'lims',
+        'lims_fields': record.get('fields', {})
+    })
+    record_sample_success(state, project_number, sample_no)
+
+# ============================================================================
+# RESULTS SHEET VALIDATION
+# ============================================================================
+
+REQUIRED_SHEET_COLUMNS = ("Project Number", "Sample No.", "Analysis 1")
+
+# Rows listed individually in the printed report; the rest are only counted
+VALIDATION_REPORT_ROWS = 20
+
+def validate_results_sheet(df):
+    """
+    Check the whole results sheet in one vectorized pass, before any browser work.
+    Flags rows whose project number is missing after forward-filling or not an
+    integer, whose sample number is missing, not an integer or repeated within
+    the project, and whose 'Analysis 1' is empty or not a known analyte.
+    Returns (valid rows with integer project and sample numbers, report); the
+    report's rejected_by_project counts the rejected rows of each project.
+    """
+    missing_columns = [c for c in REQUIRED_SHEET_COLUMNS if c not in df.columns]
+    if missing_columns:
+        report = {'total_rows': len(df), 'valid_rows': 0, 'invalid_rows': len(df),
+                  'issues': {'missing_columns': missing_columns}, 'rows': [], 'rejected_by_project': {}}
+        return df.iloc[0:0], report
+    
+    projects = pd.to_numeric(df["Project Number"], errors='coerce')
+    raw_samples = df["Sample No."].astype(str).str.strip()
+    samples = pd.to_numeric(raw_samples, errors='coerce')
+    analysis = df["Analysis 1"]
+    known_analyte = analysis.astype(str).str.contains('|'.join(ANALYTE_KINDS), regex=True)
+    
+    checks = {
+        'project_number_gap': projects.isna() | (projects != projects.round()),
+        'missing_sample_number': df["Sample No."].isna() | raw_samples.eq(''),
+        'invalid_sample_number': df["Sample No."].notna() & raw_samples.ne('') & (samples.isna() | (samples != samples.round())),
+        'duplicate_sample_number': samples.notna() & projects.notna() &
+            pd.DataFrame({'p': projects, 's': samples}).duplicated(keep=False),
+        'missing_analysis_result': analysis.isna() | analysis.astype(str).str.strip().eq(''),
+    }
+    checks['unknown_analysis_result'] = ~checks['missing_analysis_result'] & ~known_analyte
+    issues = pd.DataFrame(checks)
+    invalid = issues.any(axis=1)
+    
+    rows = []
+    for index in issues.index[invalid]:
+        rows.append({
+            'row': int(df.at[index, '_source_row']) if '_source_row' in df.columns else int(index) + 2,
+            'source': int(df.at[index, '_source']) if '_source' in df.columns else 0,
+            'project': None if pd.isna(projects[index]) else str(df.at[index, "Project Number"]),
+            'sample': str(df.at[index, "Sample No."]),
+            'analysis_1': None if pd.isna(analysis[index]) else str(analysis[index]),
+            'issues': [name for name in checks if issues.at[index, name]]
+        })
+    
+    # Rejected rows that still belong to a project keep counting towards its sample count
+    counted = invalid & ~checks['project_number_gap']
+    report = {
+        'total_rows': len(df),
+        'valid_rows': int((~invalid).sum()),
+        'invalid_rows': int(invalid.sum()),
+        'issues': {name: int(flags.sum()) for name, flags in checks.items() if flags.any()},
+        'rows': rows,
+        'rejected_by_project': {int(p): int(n) for p, n in projects[counted].value_counts().items()}
+    }
+    
+    valid = df[~invalid].copy()
+    valid["Project Number"] = projects[~invalid].astype(int)
+    valid["Sample No."] = samples[~invalid].astype(int)
+    return valid, report
+
+def print_validation_report(report):
+    """Print a summary of validate_results_sheet() and the first invalid rows."""
+    if not report['invalid_rows']:
+        log.info("✅ Sheet validation: all %s rows valid", report['total_rows'])
+        return
+    
+    log.warning("⚠️ Sheet validation: %s of %s rows rejected %s", report['invalid_rows'], report['total_rows'], report['issues'])
+    for row in report['rows'][:VALIDATION_REPORT_ROWS]:
+        log.info("   Source %s row %s: project %s, sample %s, Analysis 1 %r -> %s", row['source'], row['row'], row['project'], row['sample'], row['analysis_1'], ', '.join(row['issues']))
+    if len(report['rows']) > VALIDATION_REPORT_ROWS:
+        log.info("   ... and %s more", len(report['rows']) - VALIDATION_REPORT_ROWS)
+
+# ============================================================================
+# PROJECT SCHEDULER
+# ============================================================================
+
+# Optional sheet columns that only decide the order projects are worked in
+DUE_DATE_COLUMN = 'Due Date'
+TURNAROUND_COLUMN = 'Turnaround'
+SCHEDULING_COLUMNS = (DUE_DATE_COLUMN, TURNAROUND_COLUMN)
+
+# Ordering keys, most significant first. A user can set 'project_order' in
+# USER_CONFIG to any list of PROJECT_ORDER_KEYS names.
+DEFAULT_PROJECT_ORDER = ['due', 'turnaround', 'sheet']
+# The project in progress is only interrupted for one that is strictly more urgent on these keys
+PREEMPTING_ORDER_KEYS = ('due', 'turnaround')
+TURNAROUND_UNIT_HOURS = {'h': 1, 'd': 24, 'w': 168}
+
+def parse_turnaround_hours(value):
+    """Turnaround cell -> hours. Accepts '24', '24h', '3 days', '1 week' and 'same day'."""
+    text = str(value).strip().lower()
+    if 'same day' in text:
+        return 8.0
+    match = re.match(r'^(\d+(?:\.\d+)?)\s*([a-z]?)', text)
+    if not match:
+        return None
+    return float(match.group(1)) * TURNAROUND_UNIT_HOURS.get(match.group(2), 1)
+
+def _project_minimum(df, column, convert):
+    """Smallest value of a column per project, for projects that have one."""
+    if column not in df.columns:
+        return {}
+    values = convert(df[column])
+    return values.groupby(df["Project Number"]).min().dropna().to_dict()
+
+def build_schedule_context(df, state, pending_by_project):
+    """Per-project facts the ordering keys read, computed once per run."""
+    first_seen = state.setdefault('project_first_seen', {})
+    now = get_uk_time().isoformat()
+    for project_number in pending_by_project:
+        first_seen.setdefault(str(project_number), now)
+    
+    projects = [int(p) for p in df["Project Number"].unique()]
+    return {
+        'pending': pending_by_project,
+        'first_seen': first_seen,
+        'sheet_position': {p: i for i, p in enumerate(projects)},
+        'due': _project_minimum(df, DUE_DATE_COLUMN,
+                                lambda s: pd.to_datetime(s, dayfirst=True, errors='coerce')),
+        'turnaround': _project_minimum(df, TURNAROUND_COLUMN,
+                                       lambda s: s.map(parse_turnaround_hours).astype(float)),
+    }
+
+# name -> function(context, project) returning a comparable value, or None if unknown
+PROJECT_ORDER_KEYS = {
+    'due': lambda ctx, p: ctx['due'].get(p),                    # earliest due date first
+    'turnaround': lambda ctx, p: ctx['turnaround'].get(p),      # shortest turnaround first
+    'shortest': lambda ctx, p: len(ctx['pending'].get(p, [])),  # fewest pending samples first
+    'age': lambda ctx, p: ctx['first_seen'].get(str(p)),        # waiting longest first
+    'sheet': lambda ctx, p: ctx['sheet_position'].get(p),       # sheet order
+}
+
+def project_sort_key(ctx, project_number, order):
+    """Sort key for a project; projects without a value for a key go after those with one."""
+    key = []
+    for name in order:
+        value = PROJECT_ORDER_KEYS[name](ctx, project_number)
+        key.append((1, 0) if value is None else (0, value))
+    return tuple(key)
+
+def choose_project(ctx, candidates, current, order):
+    """
+    Pick the project to work on: stay on the current one while it has work,
+    unless another is strictly more urgent on the preempting keys.
+    """
+    ranked = sorted(candidates, key=lambda p: project_sort_key(ctx, p, order))
+    if current not in ranked:
+        return ranked[0]
+    
+    urgent = [name for name in order if name in PREEMPTING_ORDER_KEYS]
+    if urgent and project_sort_key(ctx, ranked[0], urgent) < project_sort_key(ctx, current, urgent):
+        log.info("⚡ Project %s is more urgent than project %s - switching", ranked[0], current)
+        return ranked[0]
+    return current
+
+# ============================================================================
+# ROW-LEVEL CHANGE DETECTION ON THE RESULTS SHEET
+# ============================================================================
+
+# Columns left out of the row hash: the start time is always recalculated from
+# the current UK time, so edits to it do not need the sample entered again.
+# The source bookkeeping columns move whenever rows are inserted, and the
+# scheduling columns only change the order work is done in.
+ROW_HASH_IGNORED_COLUMNS = ('Stereo Binocular Start Time', '_source', '_source_row') + SCHEDULING_COLUMNS
+
+def sample_key(project_number, sample_no):
+    """State key of a sample: '<project>:<sample>'."""
+    return f"{int(project_number)}:{sample_no}"
+
+def parse_sample_key(key):
+    project_number, sample_no = key.split(':')
+    return int(project_number), int(sample_no)
+
+def sheet_row_hashes(df):
+    """
+    Content hash of every sheet row, keyed by sample_key(), computed in one
+    vectorized pass. Rows without a usable project or sample number are left
+    out, as are repeats of a key already seen.
+    """
+    projects = pd.to_numeric(df["Project Number"], errors='coerce')
+    samples = pd.to_numeric(df["Sample No."].astype(str).str.strip(), errors='coerce')
+    usable = projects.notna() & samples.notna() & (samples == samples.round())
+    
+    keys = (projects[usable].astype('int64').astype(str) + ':' +
+            samples[usable].astype('int64').astype(str))
+    content = df.loc[usable, [c for c in df.columns if c not in ROW_HASH_IGNORED_COLUMNS]]
+    hashes = pd.util.hash_pandas_object(content.astype(str), index=False).astype(str)
+    
+    index = pd.Series(hashes.values, index=keys.values)
+    index = index[~index.index.duplicated(keep='first')]
+    return index.to_dict()
+
+# Row hashes of the sheet fetched by this run: {sample_key: hash}. Not saved with
+# the state - only the hash each sample was settled at is (settled_row_hashes).
+sheet_row_index = {}
+
+def _keys_done_before_tracking(df, state):
+    """
+    Keys the positional scheduler had saved, worked past or marked complete,
+    for states without a row index yet.
+    """
+    done = {sample_key(r['project'], r['sample']) for r in state.get('processed_samples', [])
+            if isinstance(r.get('sample'), int)}
+    # Every row of a completed project stays settled until the row is edited;
+    # the old scheduler never recorded most of those samples individually
+    completed = df[df["Project Number"].isin(set(state.get('completed_projects', [])))]
+    for project_number, sample in zip(completed["Project Number"], completed["Sample No."]):
+        if normalize_sample_number(sample) is not None:
+            done.add(sample_key(project_number, normalize_sample_number(sample)))
+    current = state.get('current_project')
+    current_rows = df[df["Project Number"] == current].reset_index(drop=True) if current is not None else df.iloc[0:0]
+    for position, sample in enumerate(current_rows["Sample No."]):
+        if position < state.get('current_sample_index', 0) and normalize_sample_number(sample) is not None:
+            done.add(sample_key(current, normalize_sample_number(sample)))
+    return done
+
+def _migrate_row_tracking(df, state):
+    """Build settled_row_hashes from a state written by an older scheduler."""
+    previous = state.pop('sheet_row_hashes', None)
+    if previous is not None:
+        # Everything the old full index did not have pending or queued was settled at its hash
+        open_keys = set(state.get('pending_samples', []))
+        open_keys |= {sample_key(r['project'], r['sample']) for r in state.get('retry_queue', [])}
+        settled = {k: h for k, h in previous.items() if k not in open_keys}
+    else:
+        # None adopts whatever hash the row has now
+        settled = dict.fromkeys(_keys_done_before_tracking(df, state))
+    state['settled_row_hashes'] = settled
+    log.info("🧮 Row tracking set up with %s settled sample(s)", len(settled))
+
+def settle_sample(state, project_number, sample_no):
+    """Record the row content a sample was saved, skipped or given up at; it is scheduled again only if that changes."""
+    if isinstance(sample_no, int):
+        key = sample_key(project_number, sample_no)
+        state.setdefault('settled_row_hashes', {})[key] = sheet_row_index.get(key)
+
+def update_pending_samples(df, state):
+    """
+    Hash the sheet rows and schedule every sample whose row is not settled at
+    its current content: new rows, and rows edited since they were saved.
+    Rows missing from this fetch keep their settled hash, so a row that is
+    temporarily dropped (e.g. by validation) is not scheduled again when it
+    comes back unchanged. Returns (new, edited) key lists.
+    """
+    if df.empty:
+        log.warning("⚠️ No usable sheet rows - keeping the pending samples from the last run")
+        return [], []
+    
+    current = sheet_row_hashes(df)
+    sheet_row_index.clear()
+    sheet_row_index.update(current)
+    if 'settled_row_hashes' not in state:
+        _migrate_row_tracking(df, state)
+    settled = state['settled_row_hashes']
+    
+    # Samples settled before their hash was known (legacy or reconciled) adopt the current one
+    for key in [k for k in current if k in settled and settled[k] is None]:
+        settled[key] = current[key]
+    
+    edited = [k for k in current if k in settled and settled[k] != current[k]]
+    for key in edited:
+        del settled[key]
+    
+    # An edited row is fresh work again; drop any retry or checkpoint from the old content
+    retry_keys = set()
+    for retry in list(state.get('retry_queue', [])):
+        key = sample_key(retry['project'], retry['sample'])
+        if key in current and retry.get('row_hash') not in (None, current[key]):
+            state['retry_queue'].remove(retry)
+            clear_sample_checkpoint(state, retry['project'], retry['sample'])
+            edited.append(key)
+        else:
+            retry_keys.add(key)
+    for key, checkpoint in list(state.get('sample_checkpoints', {}).items()):
+        if key in current and checkpoint.get('row_hash') not in (None, current[key]):
+            del state['sample_checkpoints'][key]
+    
+    previous_pending = set(state.get('pending_samples', []))
+    pending = [k for k in current if k not in settled and k not in retry_keys]
+    new = [k for k in pending if k not in previous_pending and k not in edited]
+    if new or edited:
+        log.info("🧮 Sheet delta: %s new, %s edited since settled", len(new), len(edited))
+    
+    # Projects with new work are no longer complete
+    reopened = {parse_sample_key(k)[0] for k in pending}
+    state['completed_projects'] = [p for p in state.get('completed_projects', []) if p not in reopened]
+    
+    # Keep pending work in sheet order
+    state['pending_samples'] = pending
+    return new, edited
+
+def remove_pending_sample(state, project_number, sample_no):
+    """Take a sample off the pending list once it has been saved, skipped or failed."""
+    if isinstance(sample_no, int):
+        key = sample_key(project_number, sample_no)
+        state['pending_samples'] = [k for k in state.get('pending_samples', []) if k != key]
+
+# ============================================================================
+# RETRY QUEUE FOR FAILED SAMPLES
+# ============================================================================
+
+MAX_SAMPLE_ATTEMPTS = 3            # Total attempts per sample, including the first
+RETRY_BACKOFF_MINUTES = [10, 30]   # Wait before the 2nd, 3rd, ... attempt
+RETRY_INTERLEAVE_EVERY = 3         # While fresh work remains, every Nth run takes a retry
+
+# Analytes with a result-entry plan, matched as substrings of 'Analysis 1' in this order
+ANALYTE_KINDS = ("NAD", "Chrysotile", "Amosite", "Crocidolite")
+
+def analysis_result_kind(analysis_1_result):
+    """Return the analyte handled for an 'Analysis 1' value, or None if it is empty or unknown."""
+    if pd.isna(analysis_1_result):
+        return None
+    for kind in ANALYTE_KINDS:
+        if kind in str(analysis_1_result):
+            return kind
+    return None
+
+def _retry_due(retry, now):
+    due = retry.get('next_attempt_after')
+    return not due or datetime.fromisoformat(due) <= now
+
+def record_sample_failure(state, project_number, sample_no, reason, permanent=False):
+    """
+    Record a failed attempt and decide whether the sample is retried later.
+    Transient failures are requeued until MAX_SAMPLE_ATTEMPTS is reached;
+    permanent ones (bad sheet data) are abandoned straight away.
+    """
+    now = get_uk_time()
+    retry_queue = state.setdefault('retry_queue', [])
+    active = state.get('active_retry')
+    existing = next((r for r in retry_queue
+                     if active and r['project'] == active['project'] and r['sample'] == active['sample']), None)
+    attempts = (existing['attempts'] if existing else 0) + 1
+
+    will_retry = not permanent and attempts < MAX_SAMPLE_ATTEMPTS
+    state['failed_samples'].append({
+        'project': project_number,
+        'sample': sample_no,
+        'reason': reason,
+        'timestamp': now.isoformat(),
+        'attempt': attempts,
+        'permanent': permanent,
+        'will_retry': will_retry
+    })
+
+    if existing:
+        retry_queue.remove(existing)
+    if not will_retry:
+        clear_sample_checkpoint(state, project_number, sample_no)
+        settle_sample(state, project_number, sample_no)
+    if will_retry:
+        backoff = RETRY_BACKOFF_MINUTES[min(attempts, len(RETRY_BACKOFF_MINUTES)) - 1]
+        retry_queue.append({
+            'project': project_number,
+            'sample': sample_no,
+            'attempts': attempts,
+            'last_reason': reason,
+            'next_attempt_after': (now + timedelta(minutes=backoff)).isoformat(),
+            'row_hash': sheet_row_index.get(sample_key(project_number, sample_no)) if isinstance(sample_no, int) else None
+        })
+        log.info("🔁 Sample %s of project %s queued for retry (attempt %s/%s, not before %s minutes)", sample_no, project_number, attempts, MAX_SAMPLE_ATTEMPTS, backoff)
+    else:
+        kind = "permanent failure" if permanent else f"{attempts} failed attempts"
+        log.info("🛑 Giving up on sample %s of project %s after %s", sample_no, project_number, kind)
+
+    # The sample is no longer fresh work either way; a retry lives in the retry queue
+    remove_pending_sample(state, project_number, sample_no)
+    state['active_retry'] = None
+
+def record_sample_success(state, project_number, sample_no):
+    """Clear a successfully saved sample from the pending list or the retry queue."""
+    active = state.get('active_retry')
+    if active:
+        state['retry_queue'] = [r for r in state.get('retry_queue', [])
+                                if not (r['project'] == project_number and r['sample'] == sample_no)]
+        log.info("🔁 Retried sample %s of project %s saved on attempt %s", sample_no, project_number, active['attempts'] + 1)
+    else:
+        remove_pending_sample(state, project_number, sample_no)
+    state['active_retry'] = None
+    clear_sample_checkpoint(state, project_number, sample_no)
+    settle_sample(state, project_number, sample_no)
+
+def _find_sample_row(df, project_number, sample_no):
+    """Locate a sample in the sheet by project and sample number rather than by position."""
+    project_df = df[df["Project Number"] == project_number].reset_index(drop=True)
+    for index, row in project_df.iterrows():
+        if normalize_sample_number(row["Sample No."]) == sample_no:
+            return row, index
+    return None, None
+
+def _pick_due_retry(df, state):
+    """Return (retry, sample_data, sample_index) for the oldest due retry still in the sheet."""
+    now = get_uk_time()
+    for retry in list(state.get('retry_queue', [])):
+        if not _retry_due(retry, now) or is_project_count_blocked(df, state, retry['project']):
+            continue
+        sample_data, sample_index = _find_sample_row(df, retry['project'], retry['sample'])
+        if sample_data is None:
+            log.warning("⚠️ Retry for sample %s of project %s no longer in sheet - dropping", retry['sample'], retry['project'])
+            state['retry_queue'].remove(retry)
+            continue
+        return retry, sample_data, sample_index
+    return None, None, None
+
+def _get_next_fresh_sample(df, state, order=None):
+    """
+    Determine the next pending sample. Projects are picked by the scheduler
+    (choose_project); samples are found by (project, sample number), so rows
+    inserted into the sheet do not shift the work.
+    """
+    pending_by_project = {}
+    for key in state.get('pending_samples', []):
+        project_number, sample_no = parse_sample_key(key)
+        pending_by_project.setdefault(project_number, []).append(sample_no)
+    
+    projects = [int(p) for p in df["Project Number"].unique()]
+    for project_number in projects:
+        if project_number not in pending_by_project and project_number not in state['completed_projects']:
+            state['completed_projects'].append(project_number)
+    
+    candidates = [
+        p for p in projects
+        if p in pending_by_project and not is_project_count_blocked(df, state, p)
+    ]
+    if not candidates:
+        log.info("🏁 All projects completed!")
+        return None, None, None
+    
+    if state['current_project'] not in candidates and state['current_project'] in pending_by_project:
+        log.info("⏸️  Project %s is waiting for its sample counts to be fixed", state['current_project'])
+    ctx = build_schedule_context(df, state, pending_by_project)
+    current = choose_project(ctx, candidates, state['current_project'], order or DEFAULT_PROJECT_ORDER)
+    
+    for sample_no in pending_by_project[current]:
+        sample_data, sample_index = _find_sample_row(df, current, sample_no)
+        if sample_data is not None:
+            state['current_project'] = current
+            state['current_sample_index'] = sample_index
+            return current, sample_data, sample_index
+    
+    return None, None, None
+
+def get_next_sample_to_process(df, state, order=None):
+    """
+    Determine the next sample to process.
+    Due retries are interleaved with fresh work: while fresh samples remain,
+    one run in every RETRY_INTERLEAVE_EVERY takes a retry; once fresh work is
+    exhausted, retries are taken whenever they are due.
+    Sets state['active_retry'] to the retry entry being worked, or None.
+    """
+    try:
+        state['active_retry'] = None
         
-        current_project_df = df[df["Project Number"] == state['current_project']].reset_index(drop=True)
+        fresh_project, fresh_data, fresh_index = _get_next_fresh_sample(df, state, order)
+        retry, retry_data, retry_index = _pick_due_retry(df, state)
         
-        if state['current_sample_index'] >= len(current_project_df):
-            state['completed_projects'].append(state['current_project'])
-            
-            remaining_projects = [p for p in projects if int(p) not in state['completed_projects']]
-            
-            if remaining_projects:
-                state['current_project'] = int(remaining_projects[0])
-                state['current_sample_index'] = 0
-                current_project_df = df[df["Project Number"] == state['current_project']].reset_index(drop=True)
-            else:
-                print("🏁 All projects completed!")
-                return None, None, None
+        runs_since_retry = state.get('runs_since_retry', 0)
+        take_retry = retry is not None and (
+            fresh_project is None or runs_since_retry + 1 >= RETRY_INTERLEAVE_EVERY
+        )
         
-        if state['current_sample_index'] < len(current_project_df):
-            sample_data = current_project_df.iloc[state['current_sample_index']]
-            return state['current_project'], sample_data, state['current_sample_index']
+        if take_retry:
+            state['active_retry'] = dict(retry)
+            state['runs_since_retry'] = 0
+            log.info("🔁 Retrying sample %s of project %s (previous attempts: %s, last failure: %s)", retry['sample'], retry['project'], retry['attempts'], retry['last_reason'])
+            return retry['project'], retry_data, retry_index
         
-        return None, None, None
+        if fresh_project is not None:
+            state['runs_since_retry'] = runs_since_retry + 1
+        elif state.get('retry_queue'):
+            log.info("⏳ %s sample(s) waiting for their retry backoff", len(state['retry_queue']))
+        return fresh_project, fresh_data, fresh_index
         
     except Exception as e:
-        print(f"❌ Error getting next sample: {e}")
+        log.error("❌ Error getting next sample: %s", e)
         return None, None, None
 
+# ============================================================================
+# STEP CHECKPOINTS FOR RESUMING A SAMPLE
+# ============================================================================
+
+FIBRE_FORM_PREFIX = "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1."
+
+# Form steps in the order they are performed: (step name, failure reason)
+SAMPLE_STEPS = [
+    ('sample_size', 'Failed to set sample size'),
+    ('start_time', 'Failed to input start time'),
+    ('plm_end_time', 'Failed to set PLM end time'),
+    ('assessment_dropdown', 'Failed to copy value to dropdown'),
+    ('analysis_tab', 'Failed to click analysis tab'),
+    ('analysis_result', 'Failed to handle analysis result'),
+]
+
+# Steps that only change what is on screen and must be redone whenever a later step runs
+UI_ONLY_STEPS = {'analysis_tab'}
+
+# Start/end times are derived from "now"; older checkpoints get fresh times
+TIME_STEPS = {'start_time', 'plm_end_time'}
+CHECKPOINT_TIME_FRESHNESS_MINUTES = 5
+
+# In-session resumes after a step fails, before the sample is handed to the retry queue
+IN_SESSION_RESUMES = 1
+
+# Form field read back to confirm a checkpointed step is still applied
+STEP_FORM_FIELDS = {
+    'sample_size': 'SAMPLE_SIZE',
+    'start_time': 'STEREOBINOCULARSTARTTIME',
+    'plm_end_time': 'PLMENDTIME',
+    'assessment_dropdown': 'ANALYST_ASSESSMENT',
+}
+
+def get_sample_checkpoint(state, project_number, sample_no):
+    """Return the checkpoint of a sample, creating an empty one if needed."""
+    checkpoints = state.setdefault('sample_checkpoints', {})
+    return checkpoints.setdefault(sample_key(project_number, sample_no), {
+        'completed_steps': [],
+        'values': {},
+        'updated': None,
+        'row_hash': sheet_row_index.get(sample_key(project_number, sample_no))
+    })
+
+def mark_step_completed(checkpoint, step, value):
+    """Record that a step finished and the value it committed to the form."""
+    if step not in checkpoint['completed_steps']:
+        checkpoint['completed_steps'].append(step)
+    checkpoint['values'][step] = value
+    checkpoint['updated'] = get_uk_time().isoformat()
+
+def clear_sample_checkpoint(state, project_number, sample_no):
+    """Forget the checkpoint of a sample that was saved or abandoned."""
+    state.get('sample_checkpoints', {}).pop(sample_key(project_number, sample_no), None)
+
+def read_form_values(driver):
+    """Read the checkpointed Fibre Analysis form fields back in a single script call."""
+    script = """
+        var prefix = arguments[0], fields = arguments[1], out = {};
+        fields.forEach(function (name) {
+            var el = document.getElementById(prefix + name);
+            if (!el) { out[name] = null; return; }
+            if (el.tagName === 'SELECT') {
+                var opt = el.options[el.selectedIndex];
+                out[name] = opt ? opt.text : '';
+            } else {
+                out[name] = (el.value !== undefined ? el.value : el.textContent) || '';
+            }
+        });
+        return out;
+    """
+    try:
+        return driver.execute_script(script, FIBRE_FORM_PREFIX, list(STEP_FORM_FIELDS.values())) or {}
+    except Exception as e:
+        log.warning("⚠️ Could not read form values back: %s", e)
+        return {}
+
+def _step_still_applied(driver, step, checkpoint, form_values):
+    """Decide whether a checkpointed step can be skipped given what the form shows now."""
+    if step not in checkpoint['completed_steps']:
+        return False
+
+    if step in TIME_STEPS:
+        updated = checkpoint.get('updated')
+        if not updated:
+            return False
+        age = get_uk_time() - datetime.fromisoformat(updated)
+        if age > timedelta(minutes=CHECKPOINT_TIME_FRESHNESS_MINUTES):
+            return False
+
+    if step == 'analysis_result':
+        # With a confirmed target the step is re-run: applying it only clicks
+        # what differs, on every analysis row, rather than trusting one row's view
+        return analysis_result_kind(checkpoint['values'].get(step)) not in result_targets
+
+    field = STEP_FORM_FIELDS.get(step)
+    if field is None:
+        # Nothing to read back; trust the checkpoint
+        return True
+
+    committed = str(checkpoint['values'].get(step) or '').strip().lower()
+    current = str(form_values.get(field) or '').strip().lower()
+    return bool(committed) and committed == current
+
+def _run_sample_step(step, driver, project_df, sample_index, username):
+    """Perform one form step. Returns (success, committed value)."""
+    if step == 'sample_size':
+        return bool(set_sample_size_value(driver, username)), 'sufficient'
+
+    if step == 'start_time':
+        result = input_realistic_stereo_binocular_start_time(driver)
+        if isinstance(result, tuple):
+            return result
+        return False, None
+
+    if step == 'plm_end_time':
+        if not set_realistic_plm_end_time(driver, username):
+            return False, None
+        return True, read_form_values(driver).get(STEP_FORM_FIELDS['plm_end_time'])
+
+    if step == 'assessment_dropdown':
+        if not copy_value_to_dropdown(driver):
+            return False, None
+        return True, read_form_values(driver).get(STEP_FORM_FIELDS['assessment_dropdown'])
+
+    if step == 'analysis_tab':
+        return bool(click_analysis_tab(driver, username)), None
+
+    if step == 'analysis_result':
+        ok = handle_analysis_1_result(driver=driver, df=project_df, row_index=sample_index, username=username)
+        return bool(ok), str(project_df.loc[sample_index, 'Analysis 1'])
+
+    raise ValueError(f"Unknown sample step: {step}")
+
+def run_sample_steps(driver, state, project_number, sample_no, project_df, sample_index, username):
+    """
+    Run the form steps for a sample, resuming from its checkpoint.
+    Completed steps whose values are still on the form are skipped. When a step
+    fails, the form is read back and the steps are resumed once more in the same
+    browser session before giving up.
+    Returns (success, failure reason, permanent).
+    """
+    checkpoint = get_sample_checkpoint(state, project_number, sample_no)
+    if checkpoint['completed_steps']:
+        log.info("📌 Resuming Sample %s from checkpoint - completed steps: %s", sample_no, checkpoint['completed_steps'])
+
+    resumes_left = IN_SESSION_RESUMES
+    while True:
+        form_values = read_form_values(driver)
+        step_names = [name for name, _ in SAMPLE_STEPS]
+        # Resume from the first step that is not still applied; everything after
+        # it is redone, including the UI-only steps leading up to it.
+        first_pending = next(
+            (i for i, name in enumerate(step_names)
+             if name not in UI_ONLY_STEPS and not _step_still_applied(driver, name, checkpoint, form_values)),
+            len(step_names)
+        )
+        while first_pending > 0 and step_names[first_pending - 1] in UI_ONLY_STEPS:
+            first_pending -= 1
+        if first_pending:
+            log.info("⏭️  Skipping steps already on the form: %s", step_names[:first_pending])
+
+        failed = None
+        for step, reason in SAMPLE_STEPS[first_pending:]:
+            with step_span(f"step.{step}"):
+                ok, value = _run_sample_step(step, driver, project_df, sample_index, username)
+            if not ok:
+                failed = (step, reason)
+                break
+            mark_step_completed(checkpoint, step, value)
+
+        if failed is None:
+            return True, None, False
+
+        step, reason = failed
+        if step == 'analysis_result' and analysis_result_kind(project_df.loc[sample_index, 'Analysis 1']) is None:
+            # Empty or unknown results in the sheet will not fix themselves on retry
+            return False, reason, True
+
+        if resumes_left <= 0:
+            return False, reason, False
+
+        resumes_left -= 1
+        log.info("🔄 Step '%s' failed - resuming Sample %s in the same session", step, sample_no)
+        handle_popup_ok_button(driver)
+        wait_for_form_update(driver)
+
+# ============================================================================
+# BROWSER SUPERVISOR
+# ============================================================================
+
+# Seconds any single WebDriver command may take before it is treated as wedged
+DRIVER_COMMAND_TIMEOUT = int(os.environ.get('DRIVER_COMMAND_TIMEOUT', '60'))
+# Chrome memory (chromedriver and all its processes) at which the Fibre Analysis
+# dialog is reopened, and at which the whole browser is restarted
+BROWSER_RELOAD_RSS_MB = int(os.environ.get('BROWSER_RELOAD_RSS_MB', '1500'))
+BROWSER_RESTART_RSS_MB = int(os.environ.get('BROWSER_RESTART_RSS_MB', '2500'))
+# Browser recoveries per sample before it is handed to the retry queue
+BROWSER_RECOVERIES = 1
+
+# Errors that mean the browser itself is gone or stuck, not the page
+BROWSER_FAILURES = (WebDriverException, DriverConnectionError)
+
+def _proc_table():
+    """{pid: (ppid, cpu seconds, rss bytes)} for every process, read from /proc."""
+    table = {}
+    clock_ticks, page_size = os.sysconf('SC_CLK_TCK'), os.sysconf('SC_PAGE_SIZE')
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                # The command name may contain spaces; fields resume after the last ')'
+                fields = f.read().rsplit(')', 1)[1].split()
+            ppid, utime, stime, rss_pages = int(fields[1]), int(fields[11]), int(fields[12]), int(fields[21])
+        except (OSError, IndexError, ValueError):
+            continue
+        table[int(name)] = (ppid, (utime + stime) / clock_ticks, rss_pages * page_size)
+    return table
+
+def process_tree_usage(root_pid, include_root=False):
+    """
+    Total (cpu seconds, rss bytes) of a process's descendants (and the process
+    itself with include_root), via psutil when installed, else /proc.
+    Returns None when the process is gone or cannot be inspected.
+    """
+    if psutil is not None:
+        try:
+            root = psutil.Process(root_pid)
+            processes = root.children(recursive=True) + ([root] if include_root else [])
+        except psutil.Error:
+            return None
+        cpu = rss = 0
+        for process in processes:
+            try:
+                times = process.cpu_times()
+                cpu += times.user + times.system
+                rss += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return cpu, rss
+
+    if not os.path.isdir('/proc'):
+        return None
+    table = _proc_table()
+    if root_pid not in table:
+        return None
+    children_of = {}
+    for pid, (ppid, _, _) in table.items():
+        children_of.setdefault(ppid, []).append(pid)
+    pending = list(children_of.get(root_pid, [])) + ([root_pid] if include_root else [])
+    cpu = rss = 0
+    while pending:
+        pid = pending.pop()
+        cpu += table[pid][1]
+        rss += table[pid][2]
+        if pid != root_pid:
+            pending.extend(children_of.get(pid, []))
+    return cpu, rss
+
+def browser_rss_mb(driver):
+    """Memory of chromedriver and the Chrome processes it started, or None if unknown."""
+    try:
+        usage = process_tree_usage(driver.service.process.pid, include_root=True)
+    except AttributeError:
+        return None
+    return usage[1] / 2**20 if usage else None
+
+def check_browser_health(driver):
+    """Returns ('ok' | 'reload' | 'restart', reason)."""
+    try:
+        driver.execute_script("return document.readyState")
+    except BROWSER_FAILURES as e:
+        return 'restart', f"browser not responding ({e.__class__.__name__})"
+
+    rss = browser_rss_mb(driver)
+    if rss is None:
+        return 'ok', 'memory unknown'
+    if rss >= BROWSER_RESTART_RSS_MB:
+        return 'restart', f"Chrome using {rss:.0f} MB (restart at {BROWSER_RESTART_RSS_MB} MB)"
+    if rss >= BROWSER_RELOAD_RSS_MB:
+        return 'reload', f"Chrome using {rss:.0f} MB (reload at {BROWSER_RELOAD_RSS_MB} MB)"
+    return 'ok', f"Chrome using {rss:.0f} MB"
+
+def recover_browser(driver, action, reason, username, password, project_number, sample_no):
+    """
+    Reopen the Fibre Analysis dialog ('reload') or start a new browser ('restart'),
+    then go back to the sample. Returns (driver, back on the sample); the driver
+    returned is the one to use and quit from now on.
+    """
+    if action == 'reload':
+        log.info("🧹 %s - reopening the Fibre Analysis dialog", reason)
+        # close_fiber_analysis returns False for a dead browser, which falls through to a restart
+        opened = close_fiber_analysis(driver) and open_project_fibre_analysis(driver, project_number, username)[0]
+        if not opened:
+            action, reason = 'restart', 'dialog could not be reopened'
+
+    if action == 'restart':
+        log.info("♻️ %s - restarting the browser", reason)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        try:
+            driver = setup_chrome_for_github()
+        except Exception as e:
+            log.error("❌ Could not start a new browser: %s", e)
+            return None, False
+        span_context['driver'] = driver
+        opened, why = open_lab_project_list(driver, username, password)
+        if opened:
+            opened, why = open_project_fibre_analysis(driver, project_number, username)
+        if not opened:
+            log.error("❌ Could not get back to project %s: %s", project_number, why)
+            return driver, False
+
+    # Back on the sample; its steps then resume from the checkpoint in the state
+    if not click_sample_row_with_next_button(driver, sample_no, True, username):
+        log.error("❌ Could not get back to Sample %s after the browser recovery", sample_no)
+        return driver, False
+    wait_for_form_update(driver)
+    return driver, True
+
+def run_supervised_sample_steps(driver, state, project_number, sample_no, project_df, sample_index,
+                                username, password):
+    """
+    run_sample_steps with a browser health check before the steps and after a
+    failure. A bloated or unresponsive browser is recovered and the steps resume
+    from the sample's checkpoint.
+    Returns (driver, success, failure reason, permanent).
+    """
+    recoveries_left = BROWSER_RECOVERIES
+    action, reason = check_browser_health(driver)
+    while True:
+        if action != 'ok':
+            if recoveries_left <= 0:
+                return driver, False, f"Browser unhealthy: {reason}", False
+            recoveries_left -= 1
+            driver, restored = recover_browser(driver, action, reason, username, password,
+                                               project_number, sample_no)
+            if not restored:
+                return driver, False, f"Browser recovery failed: {reason}", False
+
+        # The steps catch their own driver errors; a dead browser shows up as a
+        # failed step and is picked up by the health check below
+        ok, failure_reason, permanent = run_sample_steps(
+            driver, state, project_number, sample_no, project_df, sample_index, username
+        )
+        if ok or permanent:
+            return driver, ok, failure_reason, permanent
+
+        # A failed step is only worth another go if the browser was the problem
+        action, reason = check_browser_health(driver)
+        if action == 'ok':
+            return driver, ok, failure_reason, permanent
+
 # Realistic Variable Timing System
 import random
 from datetime import datetime, timedelta
@@ -1330,19 +3488,29 @@ import pytz
 # REALISTIC TIMING PATTERNS
 # ============================================================================
 
+def force_run_requested():
+    """FORCE_RUN=true (the workflows' manual trigger input) bypasses timing and schedule checks."""
+    return os.environ.get('FORCE_RUN', '').lower() == 'true'
+
 def should_process_sample_now(state, username):
     """
     Rolling timing: Run 17-19 minutes after the last sample was SUCCESSFULLY processed.
     """
     uk_time = get_uk_time()
     
-    print(f"🕐 Current time for {username}: {uk_time.strftime('%H:%M')}")
+    log.info("🕐 Current time for %s: %s", username, uk_time.strftime('%H:%M'))
+    
+    if force_run_requested():
+        log.info("⚡ FORCE_RUN set - skipping the timing check for %s", username)
+        updated_state = state.copy()
+        updated_state['last_timing_check'] = uk_time.isoformat()
+        return True, updated_state
     
     last_sample_time = state.get('last_sample_time', None)
     
     # If no previous sample, start immediately
     if not last_sample_time:
-        print(f"🚀 No previous sample found for {username} - starting first sample!")
+        log.info("🚀 No previous sample found for %s - starting first sample!", username)
         updated_state = state.copy()
         updated_state['last_timing_check'] = uk_time.isoformat()
         return True, updated_state
@@ -1353,19 +3521,19 @@ def should_process_sample_now(state, username):
         time_since_last = (uk_time.replace(tzinfo=None) - last_time.replace(tzinfo=None)).total_seconds()
         minutes_since_last = time_since_last / 60
         
-        print(f"📊 Last successful sample for {username}: {last_time.strftime('%H:%M')}")
-        print(f"⏱️  Time since last successful sample: {minutes_since_last:.1f} minutes")
+        log.info("📊 Last successful sample for %s: %s", username, last_time.strftime('%H:%M'))
+        log.info("⏱️  Time since last successful sample: %.1f minutes", minutes_since_last)
         
         # Random interval between 17-19 minutes
         current_interval = state.get('current_interval')
         if current_interval is None:
             current_interval = random.randint(17, 19)
         
-        print(f"🎯 Target interval for {username}: {current_interval} minutes")
+        log.info("🎯 Target interval for %s: %s minutes", username, current_interval)
         
         # Check if enough time has passed
         if minutes_since_last >= (current_interval - 1):
-            print(f"✅ {minutes_since_last:.1f} minutes ≥ {current_interval-1} minutes - Time for next sample!")
+            log.info("✅ %.1f minutes ≥ %s minutes - Time for next sample!", minutes_since_last, current_interval - 1)
             
             next_interval = random.randint(17, 19)
             
@@ -1373,14 +3541,14 @@ def should_process_sample_now(state, username):
             updated_state['current_interval'] = next_interval
             updated_state['last_timing_check'] = uk_time.isoformat()
             
-            print(f"🔄 Next interval for {username} will be: {next_interval} minutes")
+            log.info("🔄 Next interval for %s will be: %s minutes", username, next_interval)
             return True, updated_state
         else:
             minutes_remaining = current_interval - minutes_since_last
             next_time = uk_time + timedelta(minutes=minutes_remaining)
             
-            print(f"⏰ Not time yet for {username} - need {minutes_remaining:.1f} more minutes")
-            print(f"⏰ Next sample at approximately: {next_time.strftime('%H:%M')}")
+            log.info("⏰ Not time yet for %s - need %.1f more minutes", username, minutes_remaining)
+            log.info("⏰ Next sample at approximately: %s", next_time.strftime('%H:%M'))
             
             updated_state = state.copy()
             updated_state['current_interval'] = current_interval
@@ -1388,7 +3556,7 @@ def should_process_sample_now(state, username):
             return False, updated_state
             
     except Exception as e:
-        print(f"⚠️  Error parsing last sample time for {username}: {e}")
+        log.warning("⚠️  Error parsing last sample time for %s: %s", username, e)
         updated_state = state.copy()
         updated_state['current_interval'] = random.randint(17, 19)
         updated_state['last_timing_check'] = uk_time.isoformat()
@@ -1400,12 +3568,12 @@ def navigate_to_first_sample(driver, username):
     The 'First' button takes you back to sample 1.
     """
     try:
-        print("📍 Navigating back to Sample 1 for new project...")
+        log.info("📍 Navigating back to Sample 1 for new project...")
         
         # Wait for any overlays to disappear
-        wait_for_no_overlay(driver)
+        wait_for_no_overlay(driver, site="nav.first_overlay")
         
-        first_button = WebDriverWait(driver, 10).until(
+        first_button = wait_until(driver, "nav.first_button", 10,
             EC.element_to_be_clickable((By.ID, "TBI_LAB_PROJEC_162148FIEL_FIBRE_ANAL_BLBA_FIBRE_ANALYSIS_UX.V.R1.FOOTER_CONTROLS.First.ICON"))
         )
         
@@ -1413,44 +3581,164 @@ def navigate_to_first_sample(driver, username):
         time.sleep(1)
         
         if click_element_safely(driver, first_button, "First button"):
-            print("✅ Clicked 'First' button - back at Sample 1")
+            log.info("✅ Clicked 'First' button - back at Sample 1")
         else:
             # Try ActionChains as fallback
             actions = ActionChains(driver)
             actions.move_to_element(first_button).click().perform()
-            print("✅ Clicked 'First' button using ActionChains - back at Sample 1")
+            log.info("✅ Clicked 'First' button using ActionChains - back at Sample 1")
         
         time.sleep(2)
         return True
         
     except Exception as e:
-        print(f"❌ Error navigating to first sample: {e}")
-        capture_screenshot(driver, "first_button_error.png", username)
+        log.error("❌ Error navigating to first sample: %s", e)
+        capture_screenshot(driver, "first_button_error.png", username, failure=True)
         return False
 
 # ============================================================================
-# MODIFIED MAIN FUNCTION WITH VARIABLE TIMING
+# HTTP ENGINE (NO BROWSER)
 # ============================================================================
 
-def main():
-    """Main function with multi-user support."""
-    # Get username from command line argument
-    if len(sys.argv) < 2:
-        print("❌ Usage: python automation_script.py <username>")
-        print("Available users: ryan, shane")
-        return
+# 'http' enters samples with plain HTTP calls (lims_http_client) and starts
+# Chrome only when that is not possible; 'selenium' (the default) always drives
+# the browser. Leave it off until LIMS_HTTP_ENDPOINTS_FILE holds endpoints taken
+# from real traffic (har_summary.py --endpoints).
+LIMS_ENGINE = os.environ.get('LIMS_ENGINE', 'selenium').lower()
+
+def result_options_for(section, record):
+    """The record's options lists with the learned selections of one analysis row applied."""
+    options = list(record.get('options') or [])
+    for control, text in section['options'].items():
+        index = int(control)
+        options.extend([''] * (index + 1 - len(options)))
+        options[index] = text
+    return options
+
+def process_sample_over_http(state, project_df, sample_index, username, password, project_number, sample_no):
+    """
+    Enter and save one sample without a browser.
+    Returns True/False once the sample was handled (saved, already done, or
+    failed and recorded), or None when the browser has to do it instead.
+    """
+    kind = analysis_result_kind(project_df.loc[sample_index, 'Analysis 1'])
+    target = result_targets.get(kind)
+    if not target or len(target) != 1:
+        # Only a Selenium replay can learn the options, and a save carries a single analysis row
+        log.info("🌐 No single-row learned %s result state - using the browser", kind)
+        return None
+
+    try:
+        with step_span("http.login"):
+            session = lims_http_client.get_session(LIMS_BASE_URL, username, password)
+        with step_span("http.open"):
+            records = lims_http_client.open_project(session, LIMS_BASE_URL, project_number)
+        if sample_no not in records:
+            log.info("🌐 Sample %s not found in project %s - using the browser", sample_no, project_number)
+            return None
+
+        record = records[sample_no]
+        if record.get('complete'):
+            record_sample_already_done(state, project_number, sample_no, {'fields': record})
+            return True
+
+        start_time, end_time = calculate_realistic_times()
+        fields = {
+            'sample_size': 'sufficient',
+            'start_time': start_time,
+            'plm_end_time': end_time,
+            'analyst_assessment': record.get('surveyors_assessment', ''),
+            'options': result_options_for(target[0], record),
+        }
+        log.info("💾 Saving Sample %s over HTTP...", sample_no)
+        with step_span("http.save"):
+            saved = lims_http_client.save_record(session, LIMS_BASE_URL, project_number, sample_no, fields)
+    except lims_http_client.LimsHttpUnavailable as e:
+        log.info("🌐 %s - using the browser", e)
+        return None
+    except lims_http_client.LimsHttpError as e:
+        log.error("❌ HTTP engine: %s", e)
+        lims_http_client.drop_session(LIMS_BASE_URL, username)
+        record_sample_failure(state, project_number, sample_no, f'Save failed: {e}')
+        return False
+
+    if not saved.get('complete') or not lims_http_client.saved_fields_match(saved, fields):
+        log.error("❌ The LIMS did not store every field of Sample %s", sample_no)
+        record_sample_failure(state, project_number, sample_no, 'Save failed: fields not stored')
+        return False
+
+    record_saved_sample(state, project_number, sample_no, engine='http')
+    return True
+
+# ============================================================================
+# SAVED-SAMPLE BOOKKEEPING
+# ============================================================================
+
+def record_saved_sample(state, project_number, sample_no, engine=None):
+    """Book a successfully saved sample: history, totals, learned result state, next sample."""
+    log.info("✅ Successfully completed and saved Sample %s", sample_no)
+    success_time = get_uk_time()
+    
+    # Update last_sample_time ONLY after successful save
+    state['last_sample_time'] = success_time.isoformat()
+    
+    entry = {
+        'project': project_number,
+        'sample': sample_no,
+        'timestamp': success_time.isoformat(),
+        'save_time': success_time.strftime('%d/%m/%Y %H:%M:%S'),
+        'pattern_used': state.get('current_pattern', 'unknown')
+    }
+    if engine:
+        entry['engine'] = engine
+    state['processed_samples'].append(entry)
+    state['total_samples_processed'] += 1
+    
+    commit_staged_result_target()
     
-    username = sys.argv[1].lower()
+    # INCREMENT THE SAMPLE INDEX (OR CLEAR THE RETRY) AFTER SUCCESSFUL SAVE!
+    record_sample_success(state, project_number, sample_no)
     
+    interval = state.get('current_interval') or 18
+    log.info("🕐 Next sample can be processed after: %s", (success_time + timedelta(minutes=interval)).strftime('%H:%M'))
+
+def print_progress(state):
+    log.info("📊 Progress Update:")
+    log.info("   ✅ Samples Processed: %s", state['total_samples_processed'])
+    log.info("   ❌ Samples Failed: %s", failed_samples_total(state))
+    log.info("   🔁 Samples Awaiting Retry: %s", len(state.get('retry_queue', [])))
+    log.info("   🏷️  Current Project: %s", state['current_project'])
+    log.info("   📍 Pending Samples: %s", len(state.get('pending_samples', [])))
+    log.info("   🎯 Current Pattern: %s", state.get('current_pattern', 'unknown'))
+    
+    # Show timing status
+    if 'last_sample_time' in state:
+        last_time = datetime.fromisoformat(state['last_sample_time'].replace('Z', '+00:00'))
+        next_possible = last_time + timedelta(minutes=state.get('current_interval', 18))
+        log.info("   🕐 Last successful sample: %s", last_time.strftime('%H:%M'))
+        log.info("   ⏰ Next sample possible at: %s", next_possible.strftime('%H:%M'))
+    else:
+        log.info("   🕐 No timing restriction - can process immediately")
+
+# ============================================================================
+# MODIFIED MAIN FUNCTION WITH VARIABLE TIMING
+# ============================================================================
+
+def run_automation(username, browser=None):
+    """
+    One pass of the pipeline for a user: timing gate, sheet, at most one sample.
+    browser is a dict kept by watch mode so the browser and a prefetched tab
+    survive between runs; without it a fresh browser is used and closed.
+    """
     try:
         config = get_user_config(username)
     except ValueError as e:
-        print(f"❌ {e}")
+        log.error("❌ %s", e)
         return
     
-    print(f"\n{'='*80}")
-    print(f"🚀 REALISTIC VARIABLE TIMING AUTOMATION - {username.upper()} - {get_uk_time().strftime('%Y-%m-%d %H:%M:%S %Z')}")
-    print(f"{'='*80}")
+    log.info("\n%s", '=' * 80)
+    log.info("🚀 REALISTIC VARIABLE TIMING AUTOMATION - %s - %s", username.upper(), get_uk_time().strftime('%Y-%m-%d %H:%M:%S %Z'))
+    log.info("%s", '=' * 80)
     
     # Load user-specific state
     state = load_state(username)
@@ -1459,278 +3747,357 @@ def main():
     should_process, updated_state = should_process_sample_now(state, username)
     
     if not should_process:
-        print(f"⏸️  Not time to process a sample for {username} yet. Exiting until next check.")
+        log.info("⏸️  Not time to process a sample for %s yet. Exiting until next check.", username)
         save_state(updated_state, username)
         return
     
-    print(f"🎯 Time to process a sample for {username}! Starting automation...")
+    log.info("🎯 Time to process a sample for %s! Starting automation...", username)
     
     # Load data from user-specific spreadsheet
-    spreadsheet_url = config['spreadsheet_url']
-    columns_to_extract = ["Project Number", "Sample No.", "Stereo Binocular Start Time", "Analysis 1"]
-    
-    df = load_data_from_google_sheets(spreadsheet_url, columns_to_extract)
+    spreadsheet_urls = get_spreadsheet_urls(config)
+    with step_span("sheet.load"):
+        df = load_data_from_sources(spreadsheet_urls, COLUMNS_TO_EXTRACT)
     if df is None:
-        print(f"❌ Failed to load data for {username}")
+        log.error("❌ Failed to load data for %s", username)
         save_state(updated_state, username)
         return
     
+    # Reject bad rows up front so they never reach the browser
+    df, validation = validate_results_sheet(df)
+    print_validation_report(validation)
+    rejected_rows_by_project.clear()
+    rejected_rows_by_project.update(validation['rejected_by_project'])
+    updated_state['last_sheet_validation'] = {
+        'checked': get_uk_time().isoformat(),
+        'total_rows': validation['total_rows'],
+        'invalid_rows': validation['invalid_rows'],
+        'issues': validation['issues']
+    }
+    
     # Get password from environment variable
     password = os.environ.get(config['password_env_var'], '')
     if not password:
-        print(f"❌ Password not found in environment variable {config['password_env_var']}")
+        log.error("❌ Password not found in environment variable %s", config['password_env_var'])
         save_state(updated_state, username)
         return
     
     # Note: We still need the spreadsheet for Analysis 1 column, but ignore the start time
     df["Stereo Binocular Start Time"] = df["Stereo Binocular Start Time"].astype(str).fillna("")
     
+    # Schedule only samples that are new or were edited since the last run
+    update_pending_samples(df, updated_state)
+    
     # Get next sample
-    project_number, sample_data, sample_index = get_next_sample_to_process(df, updated_state)
+    project_number, sample_data, sample_index = get_next_sample_to_process(df, updated_state, config.get('project_order'))
     
     if project_number is None:
-        print("🏁 All samples completed!")
+        log.info("🏁 All samples completed!")
         save_state(updated_state, username)
         return
     
         # In main(), after getting sample_data:
     sample_no = normalize_sample_number(sample_data["Sample No."])
     if sample_no is None:
-        print(f"❌ Invalid sample number in spreadsheet")
-        updated_state['current_sample_index'] += 1
+        log.error("❌ Invalid sample number in spreadsheet")
+        record_sample_failure(updated_state, project_number, str(sample_data["Sample No."]),
+                              'Invalid sample number in spreadsheet', permanent=True)
         save_state(updated_state, username)
         return
     
-    print(f"📋 Processing Project {project_number}, Sample {sample_no}")
-    print(f"🕐 Using real UK time with variable timing pattern")
-    
-    # Setup browser
-    driver = setup_chrome_for_github()
+    log.info("📋 Processing Project %s, Sample %s", project_number, sample_no)
+    log.info("🕐 Using real UK time with variable timing pattern")
     
-    try:
-    # Login and navigate
-        if not login(driver, username, password, username):
-            print("❌ Login failed")
-            print("🔄 Timing not updated - can retry immediately")
-            save_state(updated_state, username)
-            return
-        
-        if not click_lab_button(driver) or not click_lab_project_list_button(driver):
-            print("❌ Navigation failed")
-            save_state(updated_state, username)
-            return
-        
-        # Load project
-        wait_for_no_overlay(driver)
-        clear_search_criteria(driver)
-        
-        if not input_project_number(driver, project_number, username):
-            print("❌ Failed to input project")
+    if LIMS_ENGINE == 'http':
+        project_rows = df[df["Project Number"] == project_number].reset_index(drop=True)
+        handled = process_sample_over_http(updated_state, project_rows, sample_index, username, password,
+                                           project_number, sample_no)
+        if handled is not None:
+            if handled:
+                print_progress(updated_state)
             save_state(updated_state, username)
             return
+    
+    # Setup browser: reuse watch mode's browser if it has this project prefetched
+    driver = browser.pop('driver', None) if browser is not None else None
+    if driver is not None:
+        health, reason = check_browser_health(driver)
+        if health != 'ok':
+            log.info("🩺 Kept browser needs a %s (%s) - starting a fresh one", health, reason)
+            browser.pop('prefetched', None)
+    if driver is not None and not adopt_prefetched_project(driver, browser, project_number):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        driver = None
+    prefetched = driver is not None
+    if driver is None:
+        with step_span("browser.start"):
+            driver = setup_chrome_for_github()
+    span_context.clear()
+    span_context.update(driver=driver, username=username, project=project_number, sample=sample_no)
+    
+    try:
+        if not prefetched:
+            # Login and navigate
+            with step_span("login"):
+                opened, reason = open_lab_project_list(driver, username, password)
+            if not opened:
+                log.error("❌ %s", reason)
+                log.info("🔄 Timing not updated - can retry immediately")
+                save_state(updated_state, username)
+                return
+            
+            # Load project
+            with step_span("project.open"):
+                opened, reason = open_project_fibre_analysis(driver, project_number, username)
+            if not opened:
+                log.error("❌ %s", reason)
+                save_state(updated_state, username)
+                return
         
-        if not press_enter_or_search_on_project_number(driver, project_number):
-            print("❌ Failed to search project")
-            save_state(updated_state, username)
-            return
+        is_retry = updated_state.get('active_retry') is not None
         
-        verify_project_numbers(driver, username)
+        # Verify sample counts (cached until the project's sheet rows or website count change)
+        project_df = df[df["Project Number"] == project_number]
+        with step_span("project.verify_counts"):
+            verification = verify_sample_counts_cached(driver, updated_state, project_df, project_number)
         
-        if not click_view_fibre_analysis_button(driver, username):
-            print("❌ Failed to open analysis")
+        if not verification['match']:
+            log.error("❌ Sample count mismatch: %s", verification['reason'])
+            log.info("⏸️  Project %s set aside until its sheet rows change or %s hours pass", project_number, COUNT_RECHECK_HOURS)
+            updated_state['active_retry'] = None
             save_state(updated_state, username)
             return
         
-        # Verify sample counts (first time only)
-        if project_number not in updated_state['completed_projects'] and updated_state['current_sample_index'] == 0:
-            project_df = df[df["Project Number"] == project_number]
-            verification = verify_sample_counts(driver, project_df, project_number)
-            
-            if not verification['match']:
-                print(f"❌ Sample count mismatch: {verification['reason']}")
-                updated_state['completed_projects'].append(project_number)
-                updated_state['current_sample_index'] = 0
+        # Skip samples that already have results on the LIMS (manual entry, crashed runs)
+        with step_span("project.records"):
+            records = scrape_project_records(driver, project_number)
+        while records.get(sample_no, {}).get('complete'):
+            record_sample_already_done(updated_state, project_number, sample_no, records[sample_no])
+            next_project, sample_data, sample_index = get_next_sample_to_process(df, updated_state, config.get('project_order'))
+            next_sample_no = normalize_sample_number(sample_data["Sample No."]) if next_project is not None else None
+            if next_project != project_number or next_sample_no is None:
+                log.info("⏭️  No more pending samples in this project - continuing on the next run")
                 save_state(updated_state, username)
                 return
+            sample_no = next_sample_no
+            span_context['sample'] = sample_no
+            is_retry = updated_state.get('active_retry') is not None
+            log.info("📋 Processing Project %s, Sample %s", project_number, sample_no)
         
-        # Track if this is the first sample of a new project
-        is_new_project = (updated_state['current_sample_index'] == 0)
+        # Track if this is the first sample of a new project (retries may come from any project)
+        is_new_project = is_retry or (updated_state['current_sample_index'] == 0)
         
         # Navigate to sample using the corrected navigation logic
-        clicked = click_sample_row_with_next_button(driver, sample_no, is_new_project, username)
+        with step_span("sample.navigate"):
+            clicked = click_sample_row_with_next_button(driver, sample_no, is_new_project, username)
         if not clicked:
-            print(f"❌ Failed to navigate to Sample {sample_no}")
+            log.error("❌ Failed to navigate to Sample %s", sample_no)
             
             # Log this as a failed sample
-            updated_state['failed_samples'].append({
-                'project': project_number,
-                'sample': sample_no,
-                'reason': 'Failed to navigate to sample',
-                'timestamp': get_uk_time().isoformat()
-            })
-            updated_state['current_sample_index'] += 1
+            record_sample_failure(updated_state, project_number, sample_no, 'Failed to navigate to sample')
             save_state(updated_state, username)
             return
         
-        print(f"✅ Successfully navigated to and verified Sample {sample_no}")
+        log.info("✅ Successfully navigated to and verified Sample %s", sample_no)
         
         # Wait for form to be ready
-        wait_for_form_update(driver)
+        with step_span("sample.form_ready"):
+            wait_for_form_update(driver)
         
         # Process sample with real timing
         project_df = df[df["Project Number"] == project_number].reset_index(drop=True)
         
-        print(f"📝 Starting sample processing with realistic timing...")
-        
-        # Step 1: Set sample size
-        if not set_sample_size_value(driver, username):
-            print(f"❌ Failed to set sample size")
-            updated_state['failed_samples'].append({
-                'project': project_number,
-                'sample': sample_no,
-                'reason': 'Failed to set sample size',
-                'timestamp': get_uk_time().isoformat()
-            })
-            updated_state['current_sample_index'] += 1
-            save_state(updated_state, username)
-            return
-        
-        # Step 2: Input realistic start time (calculated from current UK time)
-        success, start_time_str = input_realistic_stereo_binocular_start_time(driver)
-        if not success:
-            print(f"❌ Failed to input start time")
-            updated_state['failed_samples'].append({
-                'project': project_number,
-                'sample': sample_no,
-                'reason': 'Failed to input start time',
-                'timestamp': get_uk_time().isoformat()
-            })
-            updated_state['current_sample_index'] += 1
-            save_state(updated_state, username)
-            return
-        
-        # Step 3: Set realistic end time (current UK time)
-        if not set_realistic_plm_end_time(driver, username):
-            print(f"❌ Failed to set PLM end time")
-            updated_state['failed_samples'].append({
-                'project': project_number,
-                'sample': sample_no,
-                'reason': 'Failed to set PLM end time',
-                'timestamp': get_uk_time().isoformat()
-            })
-            updated_state['current_sample_index'] += 1
-            save_state(updated_state, username)
-            return
-        
-        # Step 4: Copy value to dropdown
-        if not copy_value_to_dropdown(driver):
-            print(f"❌ Failed to copy value to dropdown")
-            updated_state['failed_samples'].append({
-                'project': project_number,
-                'sample': sample_no,
-                'reason': 'Failed to copy value to dropdown',
-                'timestamp': get_uk_time().isoformat()
-            })
-            updated_state['current_sample_index'] += 1
-            save_state(updated_state, username)
-            return
-        
-        # Step 5: Click analysis tab
-        if not click_analysis_tab(driver, username):
-            print(f"❌ Failed to click analysis tab")
-            updated_state['failed_samples'].append({
-                'project': project_number,
-                'sample': sample_no,
-                'reason': 'Failed to click analysis tab',
-                'timestamp': get_uk_time().isoformat()
-            })
-            updated_state['current_sample_index'] += 1
-            save_state(updated_state, username)
-            return
+        log.info("📝 Starting sample processing with realistic timing...")
         
-        # Step 6: Handle analysis result
-        if not handle_analysis_1_result(driver=driver, df=project_df, row_index=sample_index, username=username):
-            print(f"❌ Failed to handle analysis result")
-            updated_state['failed_samples'].append({
-                'project': project_number,
-                'sample': sample_no,
-                'reason': 'Failed to handle analysis result',
-                'timestamp': get_uk_time().isoformat()
-            })
-            updated_state['current_sample_index'] += 1
+        # Steps 1-6: sample size, start time, PLM end time, dropdown, analysis tab, result.
+        # Steps already committed for this sample (per its checkpoint) are skipped.
+        driver, steps_ok, failure_reason, permanent = run_supervised_sample_steps(
+            driver, updated_state, project_number, sample_no, project_df, sample_index,
+            username, password
+        )
+        if not steps_ok:
+            log.error("❌ %s", failure_reason)
+            record_sample_failure(updated_state, project_number, sample_no, failure_reason, permanent=permanent)
             save_state(updated_state, username)
             return
         
         # Step 7: Save immediately (end time will match save time)
-        print(f"💾 Saving Sample {sample_no} at current UK time...")
-        if not click_save_button(driver, username):
-            print(f"❌ Failed to save Sample {sample_no}")
-            updated_state['failed_samples'].append({
-                'project': project_number,
-                'sample': sample_no,
-                'reason': 'Save failed',
-                'timestamp': get_uk_time().isoformat()
-            })
+        log.info("💾 Saving Sample %s at current UK time...", sample_no)
+        with step_span("save"):
+            saved = click_save_button(driver, username)
+        if not saved:
+            log.error("❌ Failed to save Sample %s", sample_no)
+            record_sample_failure(updated_state, project_number, sample_no, 'Save failed')
         else:
-            print(f"✅ Successfully completed and saved Sample {sample_no}")
-            success_time = get_uk_time()
-            
-            # Update last_sample_time ONLY after successful save
-            updated_state['last_sample_time'] = success_time.isoformat()
-            
-            updated_state['processed_samples'].append({
-                'project': project_number,
-                'sample': sample_no,
-                'timestamp': success_time.isoformat(),
-                'save_time': success_time.strftime('%d/%m/%Y %H:%M:%S'),
-                'pattern_used': updated_state.get('current_pattern', 'unknown')
-            })
-            updated_state['total_samples_processed'] += 1
-            
-            # INCREMENT THE SAMPLE INDEX AFTER SUCCESSFUL SAVE!
-            updated_state['current_sample_index'] += 1
-            
-            interval = updated_state.get('current_interval') or 18
-            print(f"🕐 Next sample can be processed after: {(success_time + timedelta(minutes=interval)).strftime('%H:%M')}")
+            record_saved_sample(updated_state, project_number, sample_no)
+            # In watch mode, open the next project in a second tab for the next run
+            if browser is not None and PREFETCH_NEXT_PROJECT:
+                next_project = predict_next_project(df, updated_state, project_number, sample_no,
+                                                    config.get('project_order'))
+                if next_project is not None:
+                    with step_span("prefetch"):
+                        try:
+                            browser['prefetched'] = prefetch_project(driver, next_project, username)
+                        except Exception as e:
+                            log.warning("⚠️ Prefetch of project %s failed: %s", next_project, e)
         
-        print(f"📊 Progress Update:")
-        print(f"   ✅ Samples Processed: {updated_state['total_samples_processed']}")
-        print(f"   ❌ Samples Failed: {len(updated_state['failed_samples'])}")
-        print(f"   🏷️  Current Project: {updated_state['current_project']}")
-        print(f"   📍 Next Sample Index: {updated_state['current_sample_index']}")
-        print(f"   🎯 Current Pattern: {updated_state.get('current_pattern', 'unknown')}")
-        
-        # Show timing status
-        if 'last_sample_time' in updated_state:
-            last_time = datetime.fromisoformat(updated_state['last_sample_time'].replace('Z', '+00:00'))
-            next_possible = last_time + timedelta(minutes=updated_state.get('current_interval', 18))
-            print(f"   🕐 Last successful sample: {last_time.strftime('%H:%M')}")
-            print(f"   ⏰ Next sample possible at: {next_possible.strftime('%H:%M')}")
-        else:
-            print(f"   🕐 No timing restriction - can process immediately")
+        print_progress(updated_state)
         
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Unexpected error: %s", e)
         
-        updated_state['failed_samples'].append({
-            'project': project_number,
-            'sample': sample_no,
-            'reason': f'Processing error: {str(e)}',
-            'timestamp': get_uk_time().isoformat()
-        })
-        updated_state['current_sample_index'] += 1
-        print("🔄 Timing not updated due to error - can retry immediately")
-        print(f"✅ Automation completed for {username}")
+        record_sample_failure(updated_state, project_number, sample_no, f'Processing error: {str(e)}')
+        log.info("🔄 Timing not updated due to error - can retry immediately")
+        log.info("✅ Automation completed for %s", username)
     finally:
-        # Save state and cleanup
+        # Save state and cleanup; keep the browser for the next run if a tab was prefetched
+        if CAPTURE_HAR:
+            read_performance_log(driver)
+            write_har(username)
+        span_context.clear()
         save_state(updated_state, username)
-        if 'driver' in locals() and driver:
+        if browser is not None and browser.get('prefetched'):
+            browser['driver'] = driver
+        elif 'driver' in locals() and driver:
             try:
                 driver.quit()
             except:
                 pass
 
+# ============================================================================
+# WATCHER MODE
+# ============================================================================
+
+WATCH_INTERVAL_SECONDS = int(os.environ.get('WATCH_INTERVAL_SECONDS', '60'))
+COLUMNS_TO_EXTRACT = ["Project Number", "Sample No.", "Stereo Binocular Start Time", "Analysis 1"]
+
+def minutes_until_next_sample(state):
+    """Minutes before should_process_sample_now() would let the next sample start (0 if due)."""
+    last_sample_time = state.get('last_sample_time')
+    if not last_sample_time:
+        return 0
+    try:
+        last_time = datetime.fromisoformat(last_sample_time.replace('Z', '+00:00'))
+    except ValueError:
+        return 0
+    minutes_since_last = (get_uk_time().replace(tzinfo=None) - last_time.replace(tzinfo=None)).total_seconds() / 60
+    # Without a stored interval the gate picks 17-19 minutes; 17 is the earliest it can pass
+    interval = state.get('current_interval') or 17
+    return max(0, (interval - 1) - minutes_since_last)
+
+def has_pending_work(state, df):
+    """
+    True if the state holds a fresh sample or a due retry in a project that is
+    not set aside by the sample-count check.
+    """
+    now = get_uk_time()
+    projects = {parse_sample_key(key)[0] for key in state.get('pending_samples', [])}
+    projects |= {int(r['project']) for r in state.get('retry_queue', []) if _retry_due(r, now)}
+    return any(not is_project_count_blocked(df, state, p) for p in projects)
+
+# Validated sheet rows per user in watch mode: {username: (sheet versions, rows, rejected rows by project)}
+watch_sheets = {}
+
+def validated_watch_sheet(username, df, versions):
+    """The valid rows of a user's sheets, revalidated only when a sheet version changes."""
+    cached = watch_sheets.get(username)
+    if cached is None or cached[0] != versions:
+        valid, validation = validate_results_sheet(df)
+        cached = watch_sheets[username] = (versions, valid, validation['rejected_by_project'])
+    # Count fingerprints include the user's rejected rows
+    rejected_rows_by_project.clear()
+    rejected_rows_by_project.update(cached[2])
+    return cached[1]
+
+def watch_tick(username, seen_versions, browser=None):
+    """
+    Decide cheaply whether the pipeline should run for a user now and run it if so.
+    Outside the schedule or before the next sample is due nothing is fetched;
+    otherwise the sheets are revalidated (304 / unchanged hash reuse the parsed data).
+    """
+    config = get_user_config(username)
+    forced = force_run_requested()
+    if not forced and not within_schedule(config):
+        return 'off schedule'
+    
+    state = peek_state(username)
+    if not forced and minutes_until_next_sample(state) > 0:
+        return 'waiting'
+    
+    urls = get_spreadsheet_urls(config)
+    df = load_data_from_sources(urls, COLUMNS_TO_EXTRACT)
+    if df is None:
+        return 'sheet unavailable'
+    versions = tuple(sheet_cache[url]['version'] for url in urls)
+    changed = seen_versions.get(username) != versions
+    seen_versions[username] = versions
+    
+    if not changed and not has_pending_work(state, validated_watch_sheet(username, df, versions)):
+        return 'idle'
+    
+    log.info("🔔 %s: %s - running pipeline", username, 'sheet changed' if changed else 'pending work')
+    run_automation(username, browser)
+    return 'ran'
+
+def watch(usernames, interval=WATCH_INTERVAL_SECONDS):
+    """Run in one process, waking on sheet changes or pending work instead of a cron poll."""
+    log.info("👀 Watching %s every %ss (%s)", ', '.join(usernames), interval, get_uk_time().strftime('%Y-%m-%d %H:%M:%S %Z'))
+    seen_versions = {}
+    browsers = {username: {} for username in usernames}
+    last_status = {}
+    last_ran = {username: 0.0 for username in usernames}
+    try:
+        while True:
+            # Fair sharing: whoever has waited longest since their last run goes first
+            for username in sorted(usernames, key=last_ran.get):
+                try:
+                    status = watch_tick(username, seen_versions, browsers[username])
+                except Exception as e:
+                    status = f'error: {e}'
+                if status == 'ran':
+                    last_ran[username] = time.monotonic()
+                if status != last_status.get(username):
+                    log.info("👀 %s %s: %s", get_uk_time().strftime('%H:%M:%S'), username, status)
+                    last_status[username] = status
+            time.sleep(interval)
+    finally:
+        # Browsers kept alive for prefetched projects
+        for browser in browsers.values():
+            if browser.get('driver'):
+                try:
+                    browser['driver'].quit()
+                except Exception:
+                    pass
+
+def main():
+    """Main function with multi-user support."""
+    parser = argparse.ArgumentParser(description="Enter Fibre Analysis results on the LIMS.")
+    parser.add_argument('usernames', nargs='*', help=f"Users to run for: {', '.join(USER_CONFIG)}")
+    parser.add_argument('--watch', action='store_true',
+                        help='Stay running and start the pipeline only when there is work')
+    parser.add_argument('--interval', type=int, default=WATCH_INTERVAL_SECONDS,
+                        help='Seconds between sheet revalidations in watch mode')
+    args = parser.parse_args()
+    if not args.usernames:
+        print("❌ Usage: python automation_script.py <username> [<username> ...] [--watch]")
+        print(f"Available users: {', '.join(USER_CONFIG)}")
+        return
+    
+    usernames = [u.lower() for u in args.usernames]
+    for username in usernames:
+        try:
+            get_user_config(username)
+        except ValueError as e:
+            log.error("❌ %s", e)
+            return
+    
+    if args.watch:
+        watch(usernames, args.interval)
+    else:
+        for username in usernames:
+            run_automation(username)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,153 @@
+"""
+Benchmark the full pipeline against the local mock LIMS (mock_lims.py).
+
+Starts the mock in-process, registers a throwaway 'bench' user whose results
+sheet is the mock's /sheet.csv and whose state file lives in a temporary
+directory, then runs the pipeline (run_automation, the body of main()) once per
+sample in headless Chrome with FORCE_RUN=true so the 17-19 minute timing gate
+does not apply. Reports the wall time of every sample and the per-step
+timings collected by step_span().
+
+Usage:
+    python benchmark_mock_lims.py [--runs 10] [--keep-browser] [--json results.json]
+                                  [mock options, see mock_lims.py --help]
+
+--keep-browser keeps one browser between runs the way watch mode does, so the
+next-project prefetch is exercised. Chrome and chromedriver are needed exactly
+as for a normal run.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from mock_lims import add_server_arguments, build_projects, server_config_from_args, start_mock_lims
+
+BENCH_USER = 'bench'
+BENCH_PASSWORD_ENV = 'MOCK_LIMS_PASSWORD'
+
+# ============================================================================
+# SETUP
+# ============================================================================
+
+def configure_automation(base_url, workdir, sheet_url=None):
+    """Point automation_script at the mock and register the bench user."""
+    os.environ['LIMS_BASE_URL'] = base_url
+    os.environ['FORCE_RUN'] = 'true'
+    os.environ.setdefault(BENCH_PASSWORD_ENV, 'mock')
+
+    import automation_script
+    automation_script.LIMS_BASE_URL = base_url
+    automation_script.USER_CONFIG[BENCH_USER] = {
+        'spreadsheet_url': sheet_url or base_url + 'sheet.csv',
+        'password_env_var': BENCH_PASSWORD_ENV,
+        'state_file': os.path.join(workdir, 'automation_state_bench.json'),
+        # Benchmarks run at any hour
+        'schedule': {'days': list(range(7)), 'start': '00:00', 'end': '24:00'},
+    }
+    return automation_script
+
+def run_pipelines(automation_script, total_runs, browser=None):
+    """Run the pipeline total_runs times for the bench user; one result dict per run."""
+    runs = []
+    for run in range(1, total_runs + 1):
+        state = automation_script.load_state(BENCH_USER)
+        before = state.get('total_samples_processed', 0)
+
+        started = time.monotonic()
+        automation_script.run_automation(BENCH_USER, browser)
+        wall = time.monotonic() - started
+
+        state = automation_script.load_state(BENCH_USER)
+        last = state['processed_samples'][-1] if state.get('processed_samples') else {}
+        saved = state.get('total_samples_processed', 0) > before
+        runs.append({
+            'run': run,
+            'wall_seconds': wall,
+            'saved': saved,
+            'project': last.get('project') if saved else state.get('current_project'),
+            'sample': last.get('sample') if saved else None,
+        })
+    return runs
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def summarize(values, percentile):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'max': max(values),
+        'total': sum(values),
+    }
+
+def print_report(runs, step_timings, percentile):
+    print(f"\n{'='*80}")
+    print("📊 MOCK LIMS BENCHMARK")
+    print(f"{'='*80}")
+    for run in runs:
+        outcome = '✅ saved' if run['saved'] else '❌ not saved'
+        print(f"   Run {run['run']:>3}: {run['wall_seconds']:7.1f}s  {outcome}  "
+              f"project {run['project']} sample {run['sample']}")
+
+    saved = [r['wall_seconds'] for r in runs if r['saved']]
+    if saved:
+        stats = summarize(saved, percentile)
+        print(f"\n   Per saved sample: p50 {stats['p50']:.1f}s, p95 {stats['p95']:.1f}s, "
+              f"max {stats['max']:.1f}s over {stats['count']} sample(s)")
+
+    print(f"\n   {'Step':<28}{'count':>7}{'p50':>9}{'p95':>9}{'max':>9}{'total':>10}")
+    for step, values in sorted(step_timings.items(), key=lambda item: -sum(item[1])):
+        stats = summarize(values, percentile)
+        print(f"   {step:<28}{stats['count']:>7}{stats['p50']:>9.2f}{stats['p95']:>9.2f}"
+              f"{stats['max']:>9.2f}{stats['total']:>10.1f}")
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline against the mock LIMS.')
+    add_server_arguments(parser)
+    parser.add_argument('--runs', type=int, default=None,
+                        help='Pipeline runs (default: one per generated sample)')
+    parser.add_argument('--keep-browser', action='store_true',
+                        help='Reuse the browser between runs like watch mode (exercises the prefetch)')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    random.seed(args.seed)
+    projects = build_projects(args.projects, args.samples, args.seed)
+    server = start_mock_lims(args.port, projects, **server_config_from_args(args))
+    base_url = f"http://localhost:{args.port}/"
+    print(f"🧪 Mock LIMS on {base_url} with {args.projects} project(s) x {args.samples} sample(s)")
+
+    workdir = tempfile.mkdtemp(prefix='mock_lims_bench_')
+    automation_script = configure_automation(base_url, workdir)
+    # Screenshots and other run artefacts land in the scratch directory
+    os.chdir(workdir)
+
+    browser = {} if args.keep_browser else None
+    try:
+        runs = run_pipelines(automation_script, args.runs or args.projects * args.samples, browser)
+    finally:
+        if browser and browser.get('driver'):
+            browser['driver'].quit()
+        server.shutdown()
+
+    print_report(runs, automation_script.STEP_TIMINGS, automation_script.latency_percentile)
+    print(f"\n   Mock request counts: {server.lims['stats']}")
+    print(f"   Artefacts in {workdir}")
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump({'config': vars(args), 'runs': runs, 'steps': automation_script.STEP_TIMINGS,
+                       'mock_stats': server.lims['stats']}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Replay recorded LIMS pages against the locator plans, without a browser.
+
+Run the automation once with RECORD_DOM_DIR set to capture the page HTML at the
+end of every step span and before every result-plan click. This tool then
+checks the current result plans (RESULT_ELEMENT_PLANS) and the sample
+verification selectors (SAMPLE_VERIFICATION_SELECTORS) against those pages
+with a small HTML parser and CSS matcher, so a change to a plan or to
+verify_correct_sample_loaded can be regression-tested in seconds.
+
+Usage:
+    python dom_replay.py <recording dir> [<recording dir> ...] [--kinds NAD Chrysotile] [--verbose]
+
+A recording dir is one run's <RECORD_DOM_DIR>/<user>-<timestamp>/ folder or a
+parent folder holding several. The exit status is 1 when any check fails.
+
+Supported CSS: type, #id, .class, [attr], [attr=v], [attr*=v], [attr^=v],
+[attr$=v], :nth-child(n), :first-child, :last-child, the descendant and '>'
+combinators and selector lists. Visibility is judged from the hidden attribute
+and inline display/visibility styles only.
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+from html.parser import HTMLParser
+
+from automation_script import (
+    RESULT_ELEMENT_PLANS,
+    SAMPLE_VERIFICATION_SELECTORS,
+    normalize_sample_number,
+    parse_locator,
+)
+from selenium.webdriver.common.by import By
+
+# Step spans whose end-of-step page should show the loaded sample
+SAMPLE_LOADED_LABELS = ('sample.navigate',)
+
+# ============================================================================
+# HTML TREE
+# ============================================================================
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+class Node:
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+
+    def element_children(self):
+        return [c for c in self.children if isinstance(c, Node)]
+
+    def text(self):
+        parts = []
+        for child in self.children:
+            parts.append(child.text() if isinstance(child, Node) else child)
+        return ' '.join(' '.join(parts).split())
+
+    def iter(self):
+        for child in self.element_children():
+            yield child
+            yield from child.iter()
+
+    def is_visible(self):
+        node = self
+        while node is not None and node.tag != '#document':
+            style = node.attrs.get('style', '').replace(' ', '').lower()
+            if 'hidden' in node.attrs or 'display:none' in style or 'visibility:hidden' in style:
+                return False
+            if node.tag == 'input' and node.attrs.get('type', '').lower() == 'hidden':
+                return False
+            node = node.parent
+        return True
+
+class TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node('#document', {}, None)
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {name: value or '' for name, value in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, {name: value or '' for name, value in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+
+    def handle_endtag(self, tag):
+        # Close up to the matching open tag; stray end tags are ignored
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+def parse_html(html):
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+# ============================================================================
+# CSS SUBSET
+# ============================================================================
+
+IDENT = r'(?:\\.|[\w-])+'
+SIMPLE_SELECTOR = re.compile(
+    r'(?P<tag>\*|[a-zA-Z][\w-]*)'
+    r'|#(?P<id>' + IDENT + r')'
+    r'|\.(?P<cls>' + IDENT + r')'
+    r'|\[\s*(?P<attr>[\w-]+)\s*(?:(?P<op>[*^$]?=)\s*(?P<value>"[^"]*"|\'[^\']*\'|[^\]\s]+)\s*)?\]'
+    r'|:(?P<pseudo>nth-child|first-child|last-child)(?:\(\s*(?P<arg>\d+)\s*\))?'
+)
+COMBINATOR = re.compile(r'\s*>\s*|\s+')
+
+def _unescape(ident):
+    return re.sub(r'\\(.)', r'\1', ident)
+
+def parse_selector(selector):
+    """Parse one complex selector into [(combinator, [simple, ...]), ...], left to right."""
+    steps, combinator, pos = [], None, 0
+    selector = selector.strip()
+    while pos < len(selector):
+        compound = []
+        while pos < len(selector):
+            match = SIMPLE_SELECTOR.match(selector, pos)
+            if not match:
+                break
+            compound.append(match)
+            pos = match.end()
+        if not compound:
+            raise ValueError(f"Unsupported CSS at '{selector[pos:]}' in {selector}")
+        steps.append((combinator, compound))
+        match = COMBINATOR.match(selector, pos)
+        if pos < len(selector):
+            if not match or match.end() == pos:
+                raise ValueError(f"Unsupported CSS at '{selector[pos:]}' in {selector}")
+            combinator = '>' if '>' in match.group() else ' '
+            pos = match.end()
+    return steps
+
+def _matches_simple(node, simple):
+    if simple.group('tag'):
+        return simple.group('tag') == '*' or node.tag == simple.group('tag').lower()
+    if simple.group('id'):
+        return node.attrs.get('id') == _unescape(simple.group('id'))
+    if simple.group('cls'):
+        return _unescape(simple.group('cls')) in node.attrs.get('class', '').split()
+    if simple.group('attr'):
+        name = simple.group('attr').lower()
+        if name not in node.attrs:
+            return False
+        op = simple.group('op')
+        if not op:
+            return True
+        wanted, actual = simple.group('value').strip('"\''), node.attrs[name]
+        return {'=': actual == wanted, '*=': wanted in actual,
+                '^=': actual.startswith(wanted), '$=': actual.endswith(wanted)}[op]
+    siblings = node.parent.element_children() if node.parent else [node]
+    if simple.group('pseudo') == 'first-child':
+        return siblings[0] is node
+    if simple.group('pseudo') == 'last-child':
+        return siblings[-1] is node
+    return simple.group('arg') is not None and siblings.index(node) + 1 == int(simple.group('arg'))
+
+def _matches(node, steps):
+    """Match the last step against node, then walk up through the combinators."""
+    combinator, compound = steps[-1]
+    if node is None or node.tag == '#document' or not all(_matches_simple(node, s) for s in compound):
+        return False
+    if len(steps) == 1:
+        return True
+    if combinator == '>':
+        return _matches(node.parent, steps[:-1])
+    ancestor = node.parent
+    while ancestor is not None:
+        if _matches(ancestor, steps[:-1]):
+            return True
+        ancestor = ancestor.parent
+    return False
+
+def select(root, css):
+    """All elements matching a CSS selector (list), in document order."""
+    selectors = [parse_selector(part) for part in css.split(',')]
+    return [node for node in root.iter() if any(_matches(node, steps) for steps in selectors)]
+
+def find_elements(root, locator):
+    """Elements for a Selenium (By, value) locator."""
+    by, value = locator
+    if by == By.ID:
+        return [node for node in root.iter() if node.attrs.get('id') == value]
+    if by == By.CSS_SELECTOR:
+        return select(root, value)
+    raise ValueError(f"Unsupported locator strategy: {by}")
+
+# ============================================================================
+# RECORDINGS
+# ============================================================================
+
+def find_recordings(paths):
+    """Run folders (those holding a manifest.jsonl) under the given paths."""
+    runs = []
+    for path in paths:
+        for folder, _, files in os.walk(path):
+            if 'manifest.jsonl' in files:
+                runs.append(folder)
+    return sorted(runs)
+
+def load_manifest(run_dir):
+    with open(os.path.join(run_dir, 'manifest.jsonl')) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def load_snapshot(run_dir, entry, cache):
+    if entry['file'] not in cache:
+        with gzip.open(os.path.join(run_dir, entry['file']), 'rt', encoding='utf-8') as f:
+            cache[entry['file']] = parse_html(f.read())
+    return cache[entry['file']]
+
+# ============================================================================
+# CHECKS
+# ============================================================================
+
+def check_sample_verification(root, expected_sample_no):
+    """Replay verify_correct_sample_loaded on a page. Returns (passed, detail)."""
+    seen = []
+    for selector in SAMPLE_VERIFICATION_SELECTORS:
+        locator = (By.CSS_SELECTOR, selector) if selector.startswith('[') else (By.ID, selector)
+        for node in find_elements(root, locator):
+            if not node.is_visible():
+                continue
+            value = node.text() or node.attrs.get('value', '')
+            if value.strip():
+                if str(expected_sample_no) in value:
+                    return True, f"found in {selector}: {value!r}"
+                seen.append(value)
+    return False, f"values seen: {seen}" if seen else "no sample field with a value"
+
+def check_plan_step(root, action):
+    """Check one plan entry against the page it will be clicked on. Returns (status, detail)."""
+    try:
+        locator = parse_locator(action)
+        nodes = find_elements(root, locator)
+    except ValueError as e:
+        return 'error', str(e)
+    visible = [node for node in nodes if node.is_visible()]
+    if not nodes:
+        return 'missing', 'no matching element'
+    if not visible:
+        return 'hidden', f"{len(nodes)} match(es), none visible"
+    if len(visible) > 1:
+        # Selenium clicks the first one; flag it since the wrong element may be hit
+        return 'ambiguous', f"{len(visible)} visible matches"
+    return 'ok', ''
+
+def replay_run(run_dir, kinds, verbose):
+    """Run every check against one recording. Returns the number of failures."""
+    manifest, cache, failures = load_manifest(run_dir), {}, 0
+    print(f"\n📼 {run_dir} ({len(manifest)} snapshot(s))")
+
+    for entry in manifest:
+        if entry['label'] in SAMPLE_LOADED_LABELS and entry.get('sample') is not None:
+            expected = normalize_sample_number(entry['sample'])
+            passed, detail = check_sample_verification(load_snapshot(run_dir, entry, cache), expected)
+            failures += not passed
+            if verbose or not passed:
+                print(f"   {'✅' if passed else '❌'} sample {expected} verification at #{entry['seq']}: {detail}")
+
+    # Plan snapshots are named plan.<kind>.<index>, taken just before that entry is clicked
+    plan_pages = {}
+    for entry in manifest:
+        parts = entry['label'].split('.')
+        if len(parts) == 3 and parts[0] == 'plan':
+            plan_pages.setdefault(parts[1], {})[int(parts[2])] = entry
+
+    for kind, pages in sorted(plan_pages.items()):
+        if kinds and kind not in kinds:
+            continue
+        plan = RESULT_ELEMENT_PLANS.get(kind)
+        if plan is None:
+            print(f"   ⚠️ Recording has a {kind} plan but there is no such plan now")
+            continue
+        counts, unrecorded = {}, []
+        for index, action in enumerate(plan):
+            entry = pages.get(index)
+            if entry is None:
+                unrecorded.append(index)
+                continue
+            if entry.get('action') != action and verbose:
+                print(f"   ℹ️ {kind}[{index}] changed since recording: was {entry.get('action')}")
+            status, detail = check_plan_step(load_snapshot(run_dir, entry, cache), action)
+            counts[status] = counts.get(status, 0) + 1
+            if status in ('missing', 'hidden', 'error'):
+                failures += 1
+            if verbose or status != 'ok':
+                icon = {'ok': '✅', 'ambiguous': '⚠️'}.get(status, '❌')
+                print(f"   {icon} {kind}[{index}] {status}: {action} {detail}")
+        if unrecorded:
+            print(f"   ⚠️ {kind}: no recorded page for step(s) {unrecorded}")
+        print(f"   📋 {kind} plan: {len(plan)} step(s), {counts}")
+
+    return failures
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Check locator plans against recorded LIMS pages.')
+    parser.add_argument('recordings', nargs='+', help='Recording folders (or parents of them)')
+    parser.add_argument('--kinds', nargs='*', help='Only check these analyte plans')
+    parser.add_argument('--verbose', action='store_true', help='Also list the checks that pass')
+    args = parser.parse_args()
+
+    runs = find_recordings(args.recordings)
+    if not runs:
+        print("❌ No recordings found (looking for manifest.jsonl)")
+        sys.exit(1)
+
+    failures = sum(replay_run(run_dir, args.kinds, args.verbose) for run_dir in runs)
+    print(f"\n{'✅ All checks passed' if not failures else f'❌ {failures} check(s) failed'} "
+          f"across {len(runs)} recording(s)")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
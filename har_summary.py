@@ -0,0 +1,144 @@
+"""
+Summarize network captures written with CAPTURE_HAR set.
+
+For every pipeline step (step span) it shows how long the step took, how much
+of that was spent waiting on the LIMS (time to first byte), and its slowest
+requests with their timing breakdown, to tell a slow backend from a slow
+network or from our own waits.
+
+--endpoints lists instead every request the LIMS form sends with a body
+(its XHR calls), per method and path, with the steps that send it and an
+example payload. That is the groundwork for calling the LIMS without a
+browser: the operations have to be taken from this real traffic.
+
+Usage:
+    python har_summary.py <capture.har.gz> [<capture.har.gz> ...] [--top 5] [--step save]
+    python har_summary.py <capture.har.gz> [...] --endpoints
+"""
+import argparse
+import gzip
+import json
+import sys
+from urllib.parse import urlsplit
+
+def load_har(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)['log']
+
+def step_name(page_id):
+    """HAR page ids are '<step>#<n>'; the step is what is summarized."""
+    return page_id.rsplit('#', 1)[0] if page_id else '(between steps)'
+
+# ============================================================================
+# SUMMARY
+# ============================================================================
+
+def summarize(logs):
+    """Per step: occurrences, step time, request count, server wait and all entries."""
+    steps = {}
+    for log in logs:
+        for page in log.get('pages', []):
+            step = steps.setdefault(step_name(page['id']), {'runs': 0, 'step_ms': 0.0, 'entries': []})
+            step['runs'] += 1
+            step['step_ms'] += page.get('pageTimings', {}).get('onLoad') or 0
+        for entry in log.get('entries', []):
+            step = steps.setdefault(step_name(entry.get('pageref')), {'runs': 0, 'step_ms': 0.0, 'entries': []})
+            step['entries'].append(entry)
+    for step in steps.values():
+        step['requests'] = len(step['entries'])
+        step['network_ms'] = sum(e.get('time', 0) for e in step['entries'])
+        step['wait_ms'] = sum(max(e.get('timings', {}).get('wait', 0), 0) for e in step['entries'])
+    return steps
+
+def _breakdown(entry):
+    timings = entry.get('timings', {})
+    connect = sum(max(timings.get(k, 0), 0) for k in ('blocked', 'dns', 'connect', 'ssl'))
+    return (f"connect {connect:6.0f}  send {max(timings.get('send', 0), 0):5.0f}  "
+            f"wait {max(timings.get('wait', 0), 0):6.0f}  receive {max(timings.get('receive', 0), 0):6.0f}")
+
+def print_summary(steps, top, only_step=None):
+    print(f"\n{'='*80}")
+    print("🌐 NETWORK SUMMARY PER STEP (ms)")
+    print(f"{'='*80}")
+    print(f"   {'Step':<28}{'runs':>6}{'step':>10}{'requests':>10}{'network':>10}{'LIMS wait':>11}")
+    ordered = sorted(steps.items(), key=lambda item: -max(item[1]['step_ms'], item[1]['network_ms']))
+    for name, step in ordered:
+        if only_step and name != only_step:
+            continue
+        print(f"   {name:<28}{step['runs']:>6}{step['step_ms']:>10.0f}{step['requests']:>10}"
+              f"{step['network_ms']:>10.0f}{step['wait_ms']:>11.0f}")
+
+    for name, step in ordered:
+        if (only_step and name != only_step) or not step['entries']:
+            continue
+        print(f"\n   🐢 Slowest requests in {name}:")
+        for entry in sorted(step['entries'], key=lambda e: -e.get('time', 0))[:top]:
+            request, response = entry['request'], entry['response']
+            status = entry.get('_error') or response.get('status')
+            print(f"      {entry.get('time', 0):7.0f} ms  {request['method']:<5}{status!s:>5}  {_breakdown(entry)}")
+            print(f"                 {request['url'][:100]}")
+
+# ============================================================================
+# ENDPOINT INVENTORY
+# ============================================================================
+
+# Characters of the example request body shown per endpoint
+EXAMPLE_BODY_CHARS = 300
+
+def endpoint_inventory(logs):
+    """Requests sent with a body, grouped by (method, path): count, steps, statuses and one example body."""
+    endpoints = {}
+    for log in logs:
+        for entry in log.get('entries', []):
+            request = entry['request']
+            body = request.get('postData', {}).get('text')
+            if not body:
+                continue
+            key = (request['method'], urlsplit(request['url']).path)
+            endpoint = endpoints.setdefault(key, {'count': 0, 'steps': set(), 'statuses': set(), 'example': body})
+            endpoint['count'] += 1
+            endpoint['steps'].add(step_name(entry.get('pageref')))
+            endpoint['statuses'].add(entry.get('_error') or entry['response'].get('status'))
+    return endpoints
+
+def print_endpoints(endpoints):
+    print(f"\n{'='*80}")
+    print("📡 REQUESTS SENT WITH A BODY (LIMS XHR CALLS)")
+    print(f"{'='*80}")
+    for (method, path), endpoint in sorted(endpoints.items(), key=lambda item: -item[1]['count']):
+        statuses = ', '.join(str(s) for s in sorted(endpoint['statuses'], key=str))
+        print(f"\n   {method} {path}  x{endpoint['count']}  status {statuses}")
+        print(f"      steps: {', '.join(sorted(endpoint['steps']))}")
+        print(f"      body:  {endpoint['example'][:EXAMPLE_BODY_CHARS]}")
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize HAR captures by pipeline step.')
+    parser.add_argument('captures', nargs='+', help='.har or .har.gz files')
+    parser.add_argument('--top', type=int, default=5, help='Slowest requests listed per step')
+    parser.add_argument('--step', help='Only show this step (e.g. save, project.open)')
+    parser.add_argument('--endpoints', action='store_true', help='List the requests sent with a body instead')
+    args = parser.parse_args()
+
+    logs = []
+    for path in args.captures:
+        try:
+            logs.append(load_har(path))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Skipping {path}: {e}")
+    if not logs:
+        print("❌ No captures could be read")
+        sys.exit(1)
+
+    print(f"📂 {len(logs)} capture(s), {sum(len(log.get('entries', [])) for log in logs)} request(s)")
+    if args.endpoints:
+        print_endpoints(endpoint_inventory(logs))
+    else:
+        print_summary(summarize(logs), args.top, args.step)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Browser-free LIMS engine: the search, open and save operations of the Fibre
+Analysis form as plain HTTP calls over a pooled requests.Session.
+
+automation_script uses it only when LIMS_ENGINE=http (off by default, see
+process_sample_over_http); anything this engine cannot do falls back to Selenium.
+The real LIMS endpoints are not known yet. They are read from the JSON file
+named by LIMS_HTTP_ENDPOINTS_FILE ({operation: path}), written from the
+traffic that `python har_summary.py --endpoints` lists for a CAPTURE_HAR run.
+Without that file every operation raises LimsHttpUnavailable, so the browser
+does the work. mock_lims.MOCK_HTTP_ENDPOINTS maps the operations for the mock.
+
+Check the engine end to end against a local mock:
+    python lims_http_client.py [--projects 2] [--samples 5] [mock options, see mock_lims.py --help]
+"""
+import argparse
+import json
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Operations the engine needs a path for
+LIMS_HTTP_OPERATIONS = ('login', 'search', 'open', 'save')
+HTTP_TIMEOUT = 30
+# Opening a project makes the LIMS create its Fibre Analysis records first
+OPEN_TIMEOUT = 120
+POOL_SIZE = int(os.environ.get('LIMS_HTTP_POOL_SIZE', '4'))
+
+class LimsHttpError(Exception):
+    """The LIMS rejected or failed an operation; the message is what it reported."""
+
+class LimsHttpUnavailable(LimsHttpError):
+    """The LIMS does not offer this endpoint (or it is not configured); use the browser instead."""
+
+def load_endpoints(path):
+    """{operation: path relative to the LIMS base URL} from a JSON file, or {} without one."""
+    if not path:
+        return {}
+    with open(path, 'r') as f:
+        endpoints = json.load(f)
+    return {op: endpoints[op] for op in LIMS_HTTP_OPERATIONS if op in endpoints}
+
+# Path of each operation relative to the LIMS base URL (JSON POST)
+LIMS_HTTP_ENDPOINTS = load_endpoints(os.environ.get('LIMS_HTTP_ENDPOINTS_FILE'))
+
+# ============================================================================
+# SESSIONS
+# ============================================================================
+
+# Logged-in sessions kept for reuse across runs in one process: {(base_url, username): session}
+_sessions = {}
+
+def new_session(pool_size=POOL_SIZE):
+    """A requests.Session with a keep-alive connection pool."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Content-Type'] = 'application/json'
+    # Records of the projects opened in this session: {project number: {sample: record}}
+    session.project_records = {}
+    return session
+
+def call(session, base_url, operation, body, timeout=HTTP_TIMEOUT):
+    """POST one operation and return its JSON response; LimsHttpError on failure."""
+    if operation not in LIMS_HTTP_ENDPOINTS:
+        raise LimsHttpUnavailable(f"{operation}: no endpoint configured (LIMS_HTTP_ENDPOINTS_FILE)")
+    url = base_url.rstrip('/') + '/' + LIMS_HTTP_ENDPOINTS[operation].lstrip('/')
+    try:
+        response = session.post(url, data=json.dumps(body), timeout=timeout)
+    except requests.RequestException as e:
+        raise LimsHttpError(f"{operation} request failed: {e}")
+
+    try:
+        data = response.json()
+    except ValueError:
+        # An HTML page or plain-text 404 means this LIMS has no such endpoint
+        raise LimsHttpUnavailable(f"{operation}: no JSON endpoint at {url} (HTTP {response.status_code})")
+    if response.status_code == 401:
+        raise LimsHttpError(data.get('popup') or 'Session expired')
+    if response.status_code >= 400:
+        raise LimsHttpError(data.get('popup') or f"{operation} failed with HTTP {response.status_code}")
+    return data
+
+def get_session(base_url, username, password):
+    """Reuse this process's logged-in session for the user, logging in on first use."""
+    key = (base_url, username)
+    if key in _sessions:
+        return _sessions[key]
+    session = new_session()
+    if not call(session, base_url, 'login', {'user': username, 'password': password}).get('ok'):
+        raise LimsHttpError('Login failed')
+    _sessions[key] = session
+    return session
+
+def drop_session(base_url, username):
+    """Forget a session, e.g. after it expired; the next get_session logs in again."""
+    session = _sessions.pop((base_url, username), None)
+    if session is not None:
+        session.close()
+
+# ============================================================================
+# OPERATIONS
+# ============================================================================
+
+def open_project(session, base_url, project_number):
+    """
+    Search for a project and open its Fibre Analysis records, once per session.
+    Returns {sample number: record} with each record's 1-based 'record_index'.
+    """
+    if project_number in session.project_records:
+        return session.project_records[project_number]
+    if not call(session, base_url, 'search', {'project': str(project_number)}).get('found'):
+        raise LimsHttpError(f"Project {project_number} not found")
+    data = call(session, base_url, 'open', {'project': project_number}, timeout=OPEN_TIMEOUT)
+    records = {}
+    for index, record in enumerate(data.get('records', []), start=1):
+        records[int(record['sample_no'])] = dict(record, record_index=index)
+    session.project_records[project_number] = records
+    return records
+
+def save_record(session, base_url, project_number, sample_no, fields):
+    """Save the form fields of one record and return the record as stored by the LIMS."""
+    records = open_project(session, base_url, project_number)
+    index = records[sample_no]['record_index']
+    data = call(session, base_url, 'save', {'project': project_number, 'index': index, 'fields': fields})
+    if 'record' not in data:
+        raise LimsHttpError(data.get('popup') or 'Save returned no record')
+    records[sample_no] = dict(data['record'], record_index=index)
+    return data['record']
+
+def saved_fields_match(record, fields):
+    """Whether the LIMS stored every field that was sent."""
+    for name, value in fields.items():
+        if name == 'options':
+            if any(v and record.get('options', [])[i:i + 1] != [v] for i, v in enumerate(value)):
+                return False
+        elif str(record.get(name, '')) != str(value):
+            return False
+    return True
+
+# ============================================================================
+# SELF-CHECK AGAINST THE MOCK LIMS
+# ============================================================================
+
+def main():
+    from mock_lims import (MOCK_HTTP_ENDPOINTS, OPTION_LISTS, add_server_arguments, build_projects,
+                           server_config_from_args, start_mock_lims)
+
+    parser = argparse.ArgumentParser(description='Check the HTTP engine against the mock LIMS.')
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    LIMS_HTTP_ENDPOINTS.clear()
+    LIMS_HTTP_ENDPOINTS.update(MOCK_HTTP_ENDPOINTS)
+    projects = build_projects(args.projects, args.samples, args.seed)
+    server = start_mock_lims(args.port, projects, **server_config_from_args(args))
+    base_url = f"http://localhost:{args.port}/"
+    print(f"🧪 Mock LIMS on {base_url} with {args.projects} project(s) x {args.samples} sample(s)")
+
+    failures, started = 0, time.monotonic()
+    try:
+        session = get_session(base_url, 'check', 'check')
+        for project_number in projects:
+            for sample_no, record in sorted(open_project(session, base_url, project_number).items()):
+                fields = {
+                    'sample_size': 'sufficient',
+                    'start_time': '01/01/2025 09:00:00',
+                    'plm_end_time': '01/01/2025 09:16:00',
+                    'analyst_assessment': record['surveyors_assessment'],
+                    'options': [options[0] for options in OPTION_LISTS],
+                }
+                try:
+                    saved = save_record(session, base_url, project_number, sample_no, fields)
+                    ok = saved.get('complete') and saved_fields_match(saved, fields)
+                except LimsHttpError as e:
+                    ok, saved = False, {'error': str(e)}
+                failures += not ok
+                print(f"   {'✅' if ok else '❌'} {project_number} sample {sample_no}" + ('' if ok else f": {saved}"))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    elapsed = time.monotonic() - started
+    total = sum(len(r) for r in projects.values())
+    print(f"\n{'✅' if not failures else '❌'} {total - failures}/{total} sample(s) saved over HTTP "
+          f"in {elapsed:.1f}s ({total / elapsed * 60:.0f} samples/min); mock request counts: {server.lims['stats']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Multi-user load test against the local mock LIMS (mock_lims.py).
+
+For each concurrency level N in the sweep, a fresh mock is started and N
+simulated users run their pipelines at the same time, each in its own worker
+process with its own headless Chrome, state file and slice of the results
+sheet. While they run, the CPU and RSS of every worker's browser processes
+(chromedriver and Chrome) are sampled. The report gives, per level:
+throughput, per-sample wall time, per-step latency percentiles and browser
+CPU / peak RSS per worker - i.e. how many concurrent sessions one runner
+can sustain.
+
+Usage:
+    python load_test.py [--sweep 1 2 4 8] [--projects 1] [--samples 4]
+                        [--json load_test.json] [mock options, see mock_lims.py --help]
+
+--projects and --samples are per simulated user; each user runs one pipeline
+per sample. psutil is used for process sampling when installed, otherwise /proc.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from automation_script import latency_percentile as percentile, process_tree_usage, psutil
+from mock_lims import FIRST_PROJECT_NUMBER, add_server_arguments, build_projects, server_config_from_args, start_mock_lims
+
+SAMPLE_INTERVAL = 1.0   # Seconds between browser CPU/RSS samples
+
+# ============================================================================
+# BROWSER PROCESS SAMPLING
+# ============================================================================
+
+def browser_usage(worker_pid):
+    """Total (cpu seconds, rss bytes) of the processes a worker started (chromedriver, Chrome)."""
+    return process_tree_usage(worker_pid) or (0.0, 0)
+
+def monitor_browsers(workers, samples, stop):
+    """Sample every worker's browser CPU % and RSS until stop is set."""
+    previous = {}
+    while not stop.wait(SAMPLE_INTERVAL):
+        now = time.monotonic()
+        for worker_id, process in workers.items():
+            if process.poll() is not None:
+                continue
+            cpu, rss = browser_usage(process.pid)
+            if worker_id in previous:
+                last_time, last_cpu = previous[worker_id]
+                # Chrome restarts between runs, so CPU time can go backwards
+                cpu_percent = max(0.0, cpu - last_cpu) / (now - last_time) * 100
+                samples.setdefault(worker_id, []).append({'cpu_percent': cpu_percent, 'rss': rss})
+            previous[worker_id] = (now, cpu)
+
+# ============================================================================
+# WORKER (ONE SIMULATED USER)
+# ============================================================================
+
+def run_worker(args):
+    """Entry point of a worker process: run the bench user's pipelines and write the results."""
+    from benchmark_mock_lims import configure_automation, run_pipelines
+
+    os.makedirs(args.workdir, exist_ok=True)
+    automation_script = configure_automation(args.base_url, args.workdir, args.sheet_url)
+    os.chdir(args.workdir)
+
+    runs = run_pipelines(automation_script, args.runs)
+    with open(args.result, 'w') as f:
+        json.dump({'runs': runs, 'steps': automation_script.STEP_TIMINGS}, f)
+
+def start_worker(worker_id, base_url, projects, runs, level_dir):
+    workdir = os.path.join(level_dir, f'worker_{worker_id}')
+    sheet_url = base_url + 'sheet.csv?projects=' + ','.join(str(p) for p in projects)
+    command = [
+        sys.executable, os.path.abspath(__file__), '--worker',
+        '--base-url', base_url, '--sheet-url', sheet_url, '--runs', str(runs),
+        '--workdir', workdir, '--result', os.path.join(level_dir, f'worker_{worker_id}.json'),
+    ]
+    log = open(os.path.join(level_dir, f'worker_{worker_id}.log'), 'w')
+    return subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+# ============================================================================
+# SWEEP
+# ============================================================================
+
+def run_level(level, args, out_dir):
+    """Run one concurrency level and return its summary."""
+    user_projects = {
+        w: [FIRST_PROJECT_NUMBER + w * args.projects + p for p in range(args.projects)]
+        for w in range(level)
+    }
+    projects = build_projects(level * args.projects, args.samples, args.seed)
+    server = start_mock_lims(args.port, projects, **server_config_from_args(args))
+    base_url = f"http://localhost:{args.port}/"
+    level_dir = os.path.join(out_dir, f'level_{level}')
+    os.makedirs(level_dir, exist_ok=True)
+
+    print(f"\n🚦 Level {level}: {level} user(s) x {args.projects * args.samples} sample(s)")
+    started = time.monotonic()
+    workers = {w: start_worker(w, base_url, user_projects[w], args.projects * args.samples, level_dir)
+               for w in range(level)}
+    usage_samples, stop = {}, threading.Event()
+    monitor = threading.Thread(target=monitor_browsers, args=(workers, usage_samples, stop))
+    monitor.start()
+    try:
+        for process in workers.values():
+            process.wait()
+    finally:
+        stop.set()
+        monitor.join()
+        server.shutdown()
+        server.server_close()
+    wall = time.monotonic() - started
+
+    runs, steps, per_worker = [], {}, {}
+    for w in workers:
+        try:
+            with open(os.path.join(level_dir, f'worker_{w}.json')) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            print(f"   ⚠️ Worker {w} produced no results (see {level_dir}/worker_{w}.log)")
+            result = {'runs': [], 'steps': {}}
+        runs.extend(result['runs'])
+        for step, values in result['steps'].items():
+            steps.setdefault(step, []).extend(values)
+        usage = usage_samples.get(w, [])
+        per_worker[w] = {
+            'saved': sum(1 for r in result['runs'] if r['saved']),
+            'cpu_percent_mean': sum(u['cpu_percent'] for u in usage) / len(usage) if usage else None,
+            'cpu_percent_peak': max((u['cpu_percent'] for u in usage), default=None),
+            'rss_peak_mb': max((u['rss'] for u in usage), default=0) / 2**20 if usage else None,
+        }
+
+    saved_walls = [r['wall_seconds'] for r in runs if r['saved']]
+    return {
+        'level': level,
+        'wall_seconds': wall,
+        'runs': len(runs),
+        'saved': len(saved_walls),
+        'throughput_per_minute': len(saved_walls) / wall * 60 if wall else 0.0,
+        'sample_p50': percentile(saved_walls, 50) if saved_walls else None,
+        'sample_p95': percentile(saved_walls, 95) if saved_walls else None,
+        'steps': {step: {'count': len(v), 'p50': percentile(v, 50), 'p95': percentile(v, 95), 'max': max(v)}
+                  for step, v in steps.items()},
+        'workers': per_worker,
+        'mock_stats': dict(server.lims['stats']),
+    }
+
+def _fmt(value, spec):
+    return format(value, spec) if value is not None else '-'
+
+def print_report(levels):
+    print(f"\n{'='*80}")
+    print("📊 LOAD TEST REPORT")
+    print(f"{'='*80}")
+    print(f"   {'Users':>5}{'saved':>7}{'/runs':>6}{'samples/min':>13}{'p50 s':>8}{'p95 s':>8}"
+          f"{'CPU % (mean)':>14}{'RSS MB (peak)':>15}")
+    for level in levels:
+        workers = level['workers'].values()
+        cpu = [w['cpu_percent_mean'] for w in workers if w['cpu_percent_mean'] is not None]
+        rss = [w['rss_peak_mb'] for w in workers if w['rss_peak_mb'] is not None]
+        print(f"   {level['level']:>5}{level['saved']:>7}{'/' + str(level['runs']):>6}"
+              f"{level['throughput_per_minute']:>13.2f}{_fmt(level['sample_p50'], '.1f'):>8}"
+              f"{_fmt(level['sample_p95'], '.1f'):>8}"
+              f"{_fmt(sum(cpu) / len(cpu) if cpu else None, '.0f'):>14}{_fmt(max(rss) if rss else None, '.0f'):>15}")
+
+    for level in levels:
+        print(f"\n   Per-step latency at {level['level']} user(s):")
+        print(f"   {'Step':<28}{'count':>7}{'p50':>9}{'p95':>9}{'max':>9}")
+        for step, stats in sorted(level['steps'].items(), key=lambda item: -item[1]['p95']):
+            print(f"   {step:<28}{stats['count']:>7}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['max']:>9.2f}")
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep concurrent user pipelines against the mock LIMS.')
+    add_server_arguments(parser)
+    parser.add_argument('--sweep', type=int, nargs='+', default=[1, 2, 4], help='Concurrent users per level')
+    parser.add_argument('--json', help='Also write the report to this file')
+    # Worker mode (used internally)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    parser.add_argument('--sheet-url', help=argparse.SUPPRESS)
+    parser.add_argument('--runs', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    out_dir = tempfile.mkdtemp(prefix='load_test_')
+    print(f"🧪 Load test sweep {args.sweep}, process sampling via {'psutil' if psutil else '/proc'}; "
+          f"worker logs in {out_dir}")
+    levels = [run_level(level, args, out_dir) for level in args.sweep]
+    print_report(levels)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': vars(args), 'levels': levels}, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+if __name__ == "__main__":
+    main()
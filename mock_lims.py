@@ -0,0 +1,609 @@
+"""
+Local stand-in for the AlphaTracker LIMS, for offline runs and benchmarks.
+
+Serves a small single-page app that reproduces the element IDs
+automation_script.py relies on: the LOGIN_UX fields, the Lab menu, the
+TBI_LAB_PROJEC_162148FIEL project search, the Fibre Analysis dialog (A5dlg2)
+with its record grid, form fields, Analysis tab and options lists, the footer
+First / Next / PreSaveChecks icons, A5dlg1 message popups and the
+AUILockUIPage overlay shown while a request is in flight. The results sheet
+for the generated projects is served as CSV at /sheet.csv.
+
+Usage:
+    python mock_lims.py [--port 8765] [--projects 2] [--samples 5]
+                        [--latency-ms 150] [--jitter-ms 50] [--popup-rate 0.1]
+                        [--create-records-seconds 3] [--save-ms 800]
+                        [--save-error-rate 0] [--seed 1]
+
+Then run the automation against it:
+    LIMS_BASE_URL=http://localhost:8765/ python automation_script.py <username>
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# ============================================================================
+# CONFIGURATION AND DATA
+# ============================================================================
+
+DEFAULT_CONFIG = {
+    'latency_ms': 150,              # Mean server time per request
+    'jitter_ms': 50,                # Uniform +/- variation on latency_ms
+    'popup_rate': 0.1,              # Chance that an action is followed by an A5dlg1 popup
+    'create_records_seconds': 3.0,  # How long "Creating Fibre Analysis records" is shown
+    'save_ms': 800,                 # Server time for a PreSaveChecks save
+    'save_error_rate': 0.0,         # Chance that a save is rejected
+    'verbose': False,
+}
+
+ANALYSIS_RESULTS = ['NAD', 'Chrysotile', 'Amosite', 'Crocidolite']
+
+# Options offered by each of the six Fibre Analysis options lists (VALUE.I.0 - I.4)
+OPTION_LISTS = [
+    ['Not Detected', 'Detected', 'Trace', 'Not Analysed', 'See Comments'],
+    ['None', 'Chrysotile', 'Amosite', 'Crocidolite', 'Other'],
+    ['No', 'Yes', 'Trace', 'Not Applicable', 'See Comments'],
+    ['None', 'Low', 'Medium', 'High', 'Very High'],
+    ['PLM', 'Stereo', 'PLM and Stereo', 'Dispersion', 'Other'],
+    ['No', 'Yes', 'Pending', 'Not Applicable', 'See Comments'],
+]
+
+FIRST_PROJECT_NUMBER = 31700
+
+# The mock's JSON endpoints for lims_http_client (the real LIMS's are not known yet)
+MOCK_HTTP_ENDPOINTS = {
+    'login': 'api/login',
+    'search': 'api/search',
+    'open': 'api/open',
+    'save': 'api/PreSaveChecks',
+}
+
+def build_projects(project_count, samples_per_project, seed=1):
+    """Generate projects of fresh (not yet completed) Fibre Analysis records."""
+    rng = random.Random(seed)
+    projects = {}
+    for p in range(project_count):
+        project_number = FIRST_PROJECT_NUMBER + p
+        records = []
+        for sample_no in range(1, samples_per_project + 1):
+            result = rng.choice(ANALYSIS_RESULTS)
+            records.append({
+                'sample_no': sample_no,
+                'analysis_1': result,
+                'surveyors_assessment': result,
+                'sample_size': '',
+                'start_time': '',
+                'plm_end_time': '',
+                'analyst_assessment': '',
+                'options': [''] * len(OPTION_LISTS),
+                'complete': False,
+            })
+        projects[project_number] = records
+    return projects
+
+def sheet_csv(projects, only=None):
+    """
+    The results sheet for the generated projects (or just the project numbers
+    in only), with the project number on the first row of each project.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["Project Number", "Sample No.", "Stereo Binocular Start Time", "Analysis 1"])
+    for project_number, records in projects.items():
+        if only is not None and project_number not in only:
+            continue
+        for i, record in enumerate(records):
+            writer.writerow([project_number if i == 0 else '', record['sample_no'], '', record['analysis_1']])
+    return out.getvalue()
+
+def public_record(project_number, record):
+    """Record as sent to the page."""
+    fields = {k: v for k, v in record.items() if k != 'analysis_1'}
+    fields['label'] = f"{project_number}-{record['sample_no']}"
+    return fields
+
+# ============================================================================
+# PAGE
+# ============================================================================
+
+APP_HTML = r"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Mock LIMS</title>
+<style>
+  body { font-family: sans-serif; margin: 0; padding: 12px; }
+  #AUILockUIPage { position: fixed; top: 0; left: 0; right: 0; bottom: 0; background: rgba(0,0,0,0.05); z-index: 1000; }
+  .dialog { border: 1px solid #888; background: #fff; padding: 8px; margin: 8px 0; }
+  .popup { position: fixed; top: 30px; right: 30px; z-index: 1100; }
+  .hidden { display: none; }
+  table { border-collapse: collapse; }
+  td { border: 1px solid #ccc; padding: 2px 6px; cursor: pointer; }
+  .tab, .icon, .option { display: inline-block; border: 1px solid #aaa; padding: 2px 8px; margin: 2px; cursor: pointer; }
+</style></head>
+<body><div id="app"></div>
+<script>
+var P = 'TBI_LAB_PROJEC_162148FIEL', F = P + '_FIBRE_ANAL_BLBA', UX = F + '_FIBRE_ANALYSIS_UX';
+var OPTION_LISTS = __OPTION_LISTS__;
+var app = document.getElementById('app');
+var view = {project: null, records: [], index: 1, activeList: null};
+var pending = 0;
+
+function byId(id) { return document.getElementById(id); }
+function make(tag, id, text, cls) {
+    var el = document.createElement(tag);
+    if (id) { el.id = id; }
+    if (text !== undefined && text !== null) { el.textContent = text; }
+    if (cls) { el.className = cls; }
+    return el;
+}
+function lock() {
+    pending++;
+    if (!byId('AUILockUIPage')) { document.body.appendChild(make('div', 'AUILockUIPage')); }
+}
+function unlock() {
+    pending = Math.max(0, pending - 1);
+    if (!pending && byId('AUILockUIPage')) { byId('AUILockUIPage').remove(); }
+}
+function showPopup(text) {
+    var old = byId('A5dlg1');
+    if (old) { old.remove(); }
+    var dlg = make('div', 'A5dlg1', null, 'dialog popup');
+    dlg.appendChild(make('div', 'A5dlg1.MESSAGE', text));
+    var ok = make('button', 'A5dlg1.BUTTON.ok', 'OK');
+    ok.onclick = function () { dlg.remove(); };
+    dlg.appendChild(ok);
+    document.body.appendChild(dlg);
+}
+function call(path, body) {
+    lock();
+    return fetch('/api/' + path, {method: 'POST', headers: {'Content-Type': 'application/json'},
+                                  body: JSON.stringify(body || {})})
+        .then(function (r) { return r.json().then(function (data) { data.status = r.status; return data; }); })
+        .then(function (data) { unlock(); if (data.popup) { showPopup(data.popup); } return data; },
+              function (err) { unlock(); showPopup('Request failed: ' + err); throw err; });
+}
+
+// ---- Login -----------------------------------------------------------------
+function renderLogin() {
+    app.innerHTML = '';
+    var user = make('input', 'LOGIN_UX.V.R1.USERID');
+    var password = make('input', 'LOGIN_UX.V.R1.PASSWORD');
+    password.type = 'password';
+    var button = make('button', 'LOGIN_UX.V.R1.LOGIN_BTN', 'Log in');
+    button.onclick = function () {
+        call('login', {user: user.value, password: password.value}).then(function (data) {
+            if (data.ok) { window.location.href = '/TabbedUI_MainMenu'; }
+        });
+    };
+    [user, password, button].forEach(function (el) { app.appendChild(el); });
+}
+
+// ---- Main menu and project search -------------------------------------------
+function renderMenu() {
+    app.innerHTML = '';
+    var lab = make('a', 'tb1FRAME_12.A', 'Lab');
+    lab.href = '#';
+    lab.onclick = function (e) {
+        e.preventDefault();
+        if (byId('labMenu')) { return; }
+        var menu = make('div', 'labMenu');
+        var list = make('button', null, 'Lab Project List');
+        list.onclick = renderProjectList;
+        menu.appendChild(list);
+        app.appendChild(menu);
+    };
+    app.appendChild(lab);
+}
+function renderProjectList() {
+    var old = byId('projectList');
+    if (old) { old.remove(); }
+    var box = make('div', 'projectList', null, 'dialog');
+    var input = make('input', P + '.S.PROJECT_NUMBER');
+    input.onkeydown = function (e) { if (e.key === 'Enter') { search(); } };
+    var clear = make('a', null, 'Clear Search Criteria');
+    clear.href = '#';
+    clear.onclick = function (e) { e.preventDefault(); byId('projectResults').innerHTML = ''; };
+    var button = make('button', P + '.SEARCHBTN', 'Search');
+    button.onclick = search;
+    [input, clear, button, make('div', 'projectResults')].forEach(function (el) { box.appendChild(el); });
+    app.appendChild(box);
+}
+function search() {
+    var project = byId(P + '.S.PROJECT_NUMBER').value.trim();
+    call('search', {project: project}).then(function (data) {
+        var results = byId('projectResults');
+        results.innerHTML = '';
+        if (!data.found) { return; }
+        var row = make('div');
+        row.appendChild(make('span', P + '.V.R1.PROJECT_NUMBER', data.display));
+        var view_button = make('button', P + '.V.R1._UNBOUND_BUTTON_1', 'View Fibre Analysis');
+        view_button.onclick = function () { openFibreAnalysis(data.project); };
+        row.appendChild(view_button);
+        results.appendChild(row);
+    });
+}
+function openFibreAnalysis(project) {
+    var creating = make('div', 'creatingRecords', 'Creating Fibre Analysis records', 'dialog popup');
+    document.body.appendChild(creating);
+    var shown = Date.now();
+    call('open', {project: project}).then(function (data) {
+        // Stay up long enough for a polling client to see it
+        setTimeout(function () {
+            creating.remove();
+            view.project = project;
+            view.records = data.records;
+            view.index = 1;
+            renderFibreDialog();
+        }, Math.max(0, 1000 - (Date.now() - shown)));
+    });
+}
+
+// ---- Fibre Analysis dialog ---------------------------------------------------
+function renderFibreDialog() {
+    var old = byId('A5dlg2');
+    if (old) { old.remove(); }
+    var dlg = make('div', 'A5dlg2', null, 'dialog');
+    var title = make('div');
+    title.appendChild(make('span', F + '.TITLE', 'Fibre Analysis - ' + view.project));
+    var close = make('span', 'A5dlg2.TITLE.TOOLS.', ' [x] ', 'icon');
+    close.onclick = function () { dlg.remove(); };
+    title.appendChild(close);
+    title.appendChild(make('span', null, ' Records: '));
+    title.appendChild(make('span', F + '.RECORDCOUNT.TOP', String(view.records.length)));
+    dlg.appendChild(title);
+
+    var grid = make('table', F + '.GRID');
+    view.records.forEach(function (record, i) {
+        var row = make('tr');
+        [['SAMPLE_NO', record.label], ['SAMPLE_SIZE', record.sample_size],
+         ['PLMENDTIME', record.plm_end_time], ['ANALYST_ASSESSMENT', record.analyst_assessment]].concat(
+            record.options.map(function (text, c) { return ['FIBRE_ANALYSIS_OPTIONS_LIST_' + c, text]; })
+        ).forEach(function (cell) {
+            row.appendChild(make('td', F + '.V.R' + (i + 1) + '.' + cell[0], cell[1]));
+        });
+        grid.appendChild(row);
+    });
+    dlg.appendChild(grid);
+
+    var form = make('div', UX + '.FORM');
+    var R = UX + '.V.R1.';
+    form.appendChild(make('input', R + 'SAMPLE_NO'));
+    ['SAMPLE_SIZE', 'STEREOBINOCULARSTARTTIME', 'PLMENDTIME'].forEach(function (name) {
+        var input = make('input', R + name);
+        input.onkeydown = function (e) { if (e.key === 'Enter') { update(name, input.value); } };
+        input.onchange = function () { update(name, input.value); };
+        form.appendChild(input);
+    });
+    var surveyor = make('input', R + 'SURVEYORS_ASSESSMENT');
+    surveyor.readOnly = true;
+    form.appendChild(surveyor);
+    var assessment = make('select', R + 'ANALYST_ASSESSMENT');
+    ['', 'NAD', 'Chrysotile', 'Amosite', 'Crocidolite'].forEach(function (text) {
+        assessment.appendChild(make('option', null, text));
+    });
+    assessment.onchange = function () { update('ANALYST_ASSESSMENT', assessment.value); };
+    form.appendChild(assessment);
+
+    form.appendChild(make('div', R + 'MAIN_TAB.0.TAB', 'Details', 'tab'));
+    var analysisTab = make('div', R + 'MAIN_TAB.1.TAB', 'Analysis', 'tab');
+    analysisTab.onclick = function () { byId('analysisPanel').classList.remove('hidden'); };
+    form.appendChild(analysisTab);
+    form.appendChild(renderAnalysisPanel());
+
+    var footer = make('div', R + 'FOOTER_CONTROLS');
+    [['First', '|<'], ['Next', '>'], ['PreSaveChecks', 'Save']].forEach(function (icon) {
+        var el = make('span', R + 'FOOTER_CONTROLS.' + icon[0] + '.ICON', icon[1], 'icon');
+        footer.appendChild(el);
+    });
+    form.appendChild(footer);
+    dlg.appendChild(form);
+    app.appendChild(dlg);
+
+    byId(R + 'FOOTER_CONTROLS.First.ICON').onclick = function () { loadRecord(1); };
+    byId(R + 'FOOTER_CONTROLS.Next.ICON').onclick = function () {
+        if (view.index < view.records.length) { loadRecord(view.index + 1); }
+    };
+    byId(R + 'FOOTER_CONTROLS.PreSaveChecks.ICON').onclick = save;
+    fillForm(view.records[view.index - 1]);
+}
+function renderAnalysisPanel() {
+    var panel = make('div', 'analysisPanel', null, 'hidden');
+    panel.appendChild(make('div', null, 'Analysis 1'));
+    panel.appendChild(make('span', UX + '_analysis_tab_1', 'Analysis 1', 'tab'));
+    panel.appendChild(make('span', UX + '_analysis_tab_2', 'Analysis 2', 'tab'));
+    var displayName = make('span', UX + '.FIBRE_ANALYSIS_LIST.DISPLAY_NAME.I.0', 'Analysis 1');
+    displayName.onclick = function () { openOptions(0); };
+    panel.appendChild(displayName);
+
+    var list = make('div', UX + '.V.R1.FIBRE_ANALYSIS_LIST.CONTROL.0');
+    var table = make('table'), body = make('tbody'), row = make('tr');
+    ['Analysis 1', 'Fibre', 'Result'].forEach(function (text) { row.appendChild(make('td', null, text)); });
+    body.appendChild(row); table.appendChild(body); list.appendChild(table);
+    list.onclick = function () { openOptions(0); };
+    panel.appendChild(list);
+
+    OPTION_LISTS.forEach(function (options, c) {
+        var control = make('div', UX + '.V.R1.FIBRE_ANALYSIS_OPTIONS_LIST.CONTROL.' + c);
+        var t = make('table'), b = make('tbody'), r = make('tr'), cell = make('td'), input = make('input');
+        input.readOnly = true;
+        cell.appendChild(input); r.appendChild(cell); r.appendChild(make('td', null, 'v'));
+        b.appendChild(r); t.appendChild(b); control.appendChild(t);
+        control.onclick = function () { openOptions(c); };
+        panel.appendChild(control);
+    });
+    panel.appendChild(make('div', 'optionsPopup', null, 'dialog hidden'));
+    return panel;
+}
+function openOptions(c) {
+    // The popup stays open for the most recently clicked list
+    view.activeList = c;
+    var popup = byId('optionsPopup');
+    popup.innerHTML = '';
+    OPTION_LISTS[c].forEach(function (text, i) {
+        var option = make('div', UX + '.FIBRE_ANALYSIS_OPTIONS_LIST.VALUE.I.' + i, text, 'option');
+        option.onclick = function (e) { e.stopPropagation(); chooseOption(text); };
+        popup.appendChild(option);
+    });
+    popup.classList.remove('hidden');
+}
+function chooseOption(text) {
+    var c = view.activeList;
+    byId(UX + '.V.R1.FIBRE_ANALYSIS_OPTIONS_LIST.CONTROL.' + c).querySelector('input').value = text;
+    update('OPTION.' + c, text);
+}
+function fillForm(record) {
+    var R = UX + '.V.R1.';
+    byId(R + 'SAMPLE_NO').value = 'Sample ' + record.sample_no;
+    byId(R + 'SAMPLE_SIZE').value = record.sample_size;
+    byId(R + 'STEREOBINOCULARSTARTTIME').value = record.start_time;
+    byId(R + 'PLMENDTIME').value = record.plm_end_time;
+    byId(R + 'SURVEYORS_ASSESSMENT').value = record.surveyors_assessment;
+    byId(R + 'ANALYST_ASSESSMENT').value = record.analyst_assessment;
+    record.options.forEach(function (text, c) {
+        byId(UX + '.V.R1.FIBRE_ANALYSIS_OPTIONS_LIST.CONTROL.' + c).querySelector('input').value = text;
+    });
+}
+function loadRecord(index) {
+    call('record', {project: view.project, index: index}).then(function (data) {
+        view.index = index;
+        view.records[index - 1] = data.record;
+        fillForm(data.record);
+    });
+}
+function update(field, value) {
+    call('update', {project: view.project, index: view.index, field: field, value: value});
+}
+function save() {
+    var R = UX + '.V.R1.';
+    var fields = {
+        sample_size: byId(R + 'SAMPLE_SIZE').value,
+        start_time: byId(R + 'STEREOBINOCULARSTARTTIME').value,
+        plm_end_time: byId(R + 'PLMENDTIME').value,
+        analyst_assessment: byId(R + 'ANALYST_ASSESSMENT').value,
+        options: OPTION_LISTS.map(function (_, c) {
+            return byId(UX + '.V.R1.FIBRE_ANALYSIS_OPTIONS_LIST.CONTROL.' + c).querySelector('input').value;
+        })
+    };
+    call('PreSaveChecks', {project: view.project, index: view.index, fields: fields}).then(function (data) {
+        if (data.record) {
+            view.records[view.index - 1] = data.record;
+            var r = 'R' + view.index + '.';
+            byId(F + '.V.' + r + 'SAMPLE_SIZE').textContent = data.record.sample_size;
+            byId(F + '.V.' + r + 'PLMENDTIME').textContent = data.record.plm_end_time;
+            byId(F + '.V.' + r + 'ANALYST_ASSESSMENT').textContent = data.record.analyst_assessment;
+            data.record.options.forEach(function (text, c) {
+                byId(F + '.V.' + r + 'FIBRE_ANALYSIS_OPTIONS_LIST_' + c).textContent = text;
+            });
+        }
+    });
+}
+
+if (window.location.pathname.indexOf('TabbedUI_MainMenu') >= 0) { renderMenu(); } else { renderLogin(); }
+</script></body></html>
+""".replace('__OPTION_LISTS__', json.dumps(OPTION_LISTS))
+
+# ============================================================================
+# SERVER
+# ============================================================================
+
+def _simulate_latency(lims, base_ms=None):
+    config = lims['config']
+    base = config['latency_ms'] if base_ms is None else base_ms
+    delay = max(0.0, base + random.uniform(-config['jitter_ms'], config['jitter_ms']))
+    time.sleep(delay / 1000.0)
+
+def _maybe_popup(lims, text='Record updated.'):
+    return text if random.random() < lims['config']['popup_rate'] else None
+
+def _find_record(lims, body):
+    records = lims['projects'].get(int(body['project']))
+    index = int(body['index'])
+    if records is None or not 1 <= index <= len(records):
+        return None
+    return records[index - 1]
+
+def handle_api(lims, action, body, session_ok):
+    """Handle one /api/<action> call. Returns (HTTP status, response dict)."""
+    with lims['lock']:
+        lims['stats'][action] = lims['stats'].get(action, 0) + 1
+
+    if action == 'login':
+        _simulate_latency(lims)
+        return 200, {'ok': bool(body.get('user')) and bool(body.get('password'))}
+    if not session_ok:
+        return 401, {'popup': 'Your session has expired. Please log in again.'}
+
+    if action == 'search':
+        _simulate_latency(lims)
+        try:
+            project_number = int(body.get('project', ''))
+        except ValueError:
+            return 200, {'found': False}
+        found = project_number in lims['projects']
+        return 200, {'found': found, 'project': project_number, 'display': f"CE-{project_number}"}
+
+    if action == 'open':
+        time.sleep(lims['config']['create_records_seconds'])
+        project_number = int(body['project'])
+        records = [public_record(project_number, r) for r in lims['projects'].get(project_number, [])]
+        return 200, {'records': records}
+
+    record = _find_record(lims, body)
+    if record is None:
+        return 404, {'popup': 'Record not found.'}
+    project_number = int(body['project'])
+
+    if action == 'record':
+        _simulate_latency(lims)
+        return 200, {'record': public_record(project_number, record), 'popup': _maybe_popup(lims, 'Record loaded.')}
+
+    if action == 'update':
+        _simulate_latency(lims)
+        return 200, {'popup': _maybe_popup(lims)}
+
+    if action == 'PreSaveChecks':
+        _simulate_latency(lims, lims['config']['save_ms'])
+        if random.random() < lims['config']['save_error_rate']:
+            return 500, {'popup': 'Save failed: a required field is missing.'}
+        fields = body.get('fields', {})
+        with lims['lock']:
+            for name in ('sample_size', 'start_time', 'plm_end_time', 'analyst_assessment'):
+                record[name] = fields.get(name, record[name])
+            record['options'] = fields.get('options', record['options'])
+            # Complete only once the form fields are filled in and a result has been selected
+            record['complete'] = (all(record[n] for n in ('sample_size', 'plm_end_time', 'analyst_assessment'))
+                                  and any(record['options']))
+            lims['stats']['saved'] = lims['stats'].get('saved', 0) + 1
+        return 200, {'record': public_record(project_number, record), 'popup': _maybe_popup(lims, 'Record saved.')}
+
+    return 404, {'popup': f'Unknown action {action}'}
+
+class MockLimsHandler(BaseHTTPRequestHandler):
+    server_version = "MockLIMS/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.lims['config']['verbose']:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type, headers=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _session_ok(self):
+        cookie = self.headers.get('Cookie', '')
+        return any(part.strip() == f"MOCKSESSION={token}"
+                   for part in cookie.split(';') for token in self.server.lims['sessions'])
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path
+        lims = self.server.lims
+        if path == '/sheet.csv':
+            # ?projects=31700,31701 serves a per-user slice of the sheet
+            only = parse_qs(url.query).get('projects')
+            only = {int(p) for p in only[0].split(',')} if only else None
+            self._send(200, sheet_csv(lims['projects'], only), 'text/csv')
+        elif path == '/api/stats':
+            with lims['lock']:
+                self._send(200, json.dumps(lims['stats']), 'application/json')
+        elif path in ('/', '/TabbedUI_MainMenu'):
+            _simulate_latency(lims)
+            self._send(200, APP_HTML, 'text/html; charset=utf-8')
+        else:
+            self._send(404, 'Not found', 'text/plain')
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if not path.startswith('/api/'):
+            self._send(404, 'Not found', 'text/plain')
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            body = {}
+
+        action = path[len('/api/'):]
+        status, response = handle_api(self.server.lims, action, body, self._session_ok())
+        headers = {}
+        if action == 'login' and response.get('ok'):
+            token = secrets.token_hex(8)
+            self.server.lims['sessions'].add(token)
+            headers['Set-Cookie'] = f"MOCKSESSION={token}; Path=/"
+        self._send(status, json.dumps(response), 'application/json', headers)
+
+def start_mock_lims(port=8765, projects=None, **config):
+    """
+    Start the mock LIMS on a background thread. Returns the server; its base URL
+    is http://localhost:<port>/ and server.lims holds the records and stats.
+    Call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer(('localhost', port), MockLimsHandler)
+    server.daemon_threads = True
+    server.lims = {
+        'config': {**DEFAULT_CONFIG, **config},
+        'projects': projects if projects is not None else build_projects(2, 5),
+        'sessions': set(),
+        'stats': {},
+        'lock': threading.Lock(),
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def add_server_arguments(parser):
+    """Mock LIMS options shared with the benchmark scripts."""
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--projects', type=int, default=2, help='Number of projects to generate')
+    parser.add_argument('--samples', type=int, default=5, help='Samples per project')
+    parser.add_argument('--latency-ms', type=float, default=DEFAULT_CONFIG['latency_ms'])
+    parser.add_argument('--jitter-ms', type=float, default=DEFAULT_CONFIG['jitter_ms'])
+    parser.add_argument('--popup-rate', type=float, default=DEFAULT_CONFIG['popup_rate'])
+    parser.add_argument('--create-records-seconds', type=float, default=DEFAULT_CONFIG['create_records_seconds'])
+    parser.add_argument('--save-ms', type=float, default=DEFAULT_CONFIG['save_ms'])
+    parser.add_argument('--save-error-rate', type=float, default=DEFAULT_CONFIG['save_error_rate'])
+    parser.add_argument('--seed', type=int, default=1)
+
+def server_config_from_args(args):
+    return {
+        'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms,
+        'popup_rate': args.popup_rate,
+        'create_records_seconds': args.create_records_seconds,
+        'save_ms': args.save_ms,
+        'save_error_rate': args.save_error_rate,
+    }
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local mock of the LIMS.')
+    add_server_arguments(parser)
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    projects = build_projects(args.projects, args.samples, args.seed)
+    server = start_mock_lims(args.port, projects, verbose=args.verbose, **server_config_from_args(args))
+    print(f"🧪 Mock LIMS on http://localhost:{args.port}/ with projects {list(projects)}")
+    print(f"   Results sheet: http://localhost:{args.port}/sheet.csv (?projects=a,b for a slice)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+Reconcile a user's state file with what is actually saved on the LIMS.
+
+The processed_samples history (the state file plus its monthly archives in
+state_archive/<username>/) and the LIMS can drift apart, e.g. after a crash
+between click_save_button and save_state, or after a failed rebase of the state
+file in the workflow. This job visits each project with a small pool of browser
+sessions, reads back the Fibre Analysis records and reports (or repairs) the
+differences. Each session runs in its own worker process, so the automation
+module's globals (wait latencies, span context, record cache) are never shared.
+A repair only rewrites the sample bookkeeping fields of the state file.
+
+Usage:
+    python reconcile_state.py <username> [--projects 31733 31648 ...] [--workers 2]
+                              [--min-interval 20] [--repair] [--restart]
+
+Progress is written to reconcile_<username>.json after every project, so an
+interrupted run picks up where it stopped; pass --restart to start over.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+from automation_script import (
+    clear_sample_checkpoint,
+    close_fiber_analysis,
+    drop_archived_samples,
+    get_uk_time,
+    get_user_config,
+    load_archived_history,
+    open_lab_project_list,
+    open_project_fibre_analysis,
+    peek_state,
+    remove_pending_sample,
+    sample_key,
+    scrape_project_records,
+    settle_sample,
+    setup_chrome_for_github,
+)
+
+# ============================================================================
+# PROGRESS FILE (RESUMABLE RUNS)
+# ============================================================================
+
+def progress_file_for(username):
+    return f"reconcile_{username}.json"
+
+def load_progress(username, restart=False):
+    """Load the results of an earlier, possibly interrupted, run."""
+    path = progress_file_for(username)
+    if not restart and os.path.exists(path):
+        with open(path, 'r') as f:
+            progress = json.load(f)
+        print(f"📂 Resuming reconciliation for {username}: {len(progress['projects'])} project(s) already checked")
+        return progress
+    return {'started': get_uk_time().isoformat(), 'projects': {}}
+
+def save_progress(username, progress):
+    with open(progress_file_for(username), 'w') as f:
+        json.dump(progress, f, indent=2, default=str)
+
+# ============================================================================
+# RATE LIMITING
+# ============================================================================
+
+class RateLimiter:
+    """Blocks so project visits start at least min_interval seconds apart across worker processes."""
+
+    def __init__(self, min_interval, context):
+        self.min_interval = min_interval
+        self.lock = context.Lock()
+        self.next_slot = context.Value('d', 0.0, lock=False)
+
+    def wait_for_slot(self):
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_slot.value)
+            self.next_slot.value = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+# ============================================================================
+# COMPARISON
+# ============================================================================
+
+def processed_samples_by_project(state, archived=()):
+    """Map project -> set of sample numbers the state (and its archived history) believes are saved."""
+    processed = {}
+    for record in list(archived) + state.get('processed_samples', []):
+        try:
+            processed.setdefault(int(record['project']), set()).add(int(record['sample']))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return processed
+
+def compare_project(project_number, state_samples, lims_records):
+    """Compare what the state says was saved with what the LIMS shows."""
+    lims_complete = {s for s, r in lims_records.items() if r['complete']}
+    return {
+        'project': project_number,
+        'checked': get_uk_time().isoformat(),
+        'lims_records': len(lims_records),
+        'lims_complete': sorted(lims_complete),
+        'state_processed': sorted(state_samples),
+        # The state thinks these were saved but the LIMS has no results
+        'missing_on_lims': sorted(state_samples - lims_complete),
+        # The LIMS has results the state does not know about
+        'missing_in_state': sorted(lims_complete - state_samples),
+    }
+
+def default_projects(state, archived=()):
+    """Projects the state has touched, in the order first seen."""
+    projects = []
+    candidates = [r.get('project') for r in list(archived) + state.get('processed_samples', [])]
+    candidates += state.get('completed_projects', []) + [state.get('current_project')]
+    for project in candidates:
+        if project is not None and int(project) not in projects:
+            projects.append(int(project))
+    return projects
+
+# ============================================================================
+# WORKERS
+# ============================================================================
+
+def reconcile_worker(worker_id, username, password, work, results, state_samples, limiter):
+    """
+    Check projects from the work queue in one browser session, in its own
+    process, and put each result on the results queue (then None when done).
+    """
+    driver = None
+    try:
+        while True:
+            project_number = work.get()
+            if project_number is None:
+                return
+
+            if driver is None:
+                try:
+                    driver = setup_chrome_for_github()
+                except Exception as e:
+                    results.put({'project': project_number, 'error': f'Could not start a browser: {e}'})
+                    continue
+                opened, reason = open_lab_project_list(driver, username, password)
+                if not opened:
+                    print(f"❌ Worker {worker_id}: {reason}")
+                    driver.quit()
+                    driver = None
+                    results.put({'project': project_number, 'error': reason})
+                    continue
+
+            limiter.wait_for_slot()
+            print(f"🔍 Worker {worker_id}: checking project {project_number}")
+            try:
+                opened, reason = open_project_fibre_analysis(driver, project_number, username)
+                if opened:
+                    records = scrape_project_records(driver, project_number, refresh=True)
+                    close_fiber_analysis(driver)
+                    if records:
+                        result = compare_project(project_number, state_samples.get(project_number, set()), records)
+                    else:
+                        result = {'project': project_number, 'error': 'No records could be read from the LIMS'}
+                else:
+                    result = {'project': project_number, 'error': reason}
+            except Exception as e:
+                result = {'project': project_number, 'error': f'Reconciliation error: {e}'}
+
+            if 'error' in result:
+                # Start from a clean session for the next project
+                print(f"⚠️ Worker {worker_id}: project {project_number}: {result['error']}")
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+                driver = None
+
+            results.put(result)
+    finally:
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        results.put(None)
+
+def run_workers(username, password, projects, state_samples, progress, worker_count, min_interval):
+    """Check projects with worker processes, saving progress here as each result comes in."""
+    context = multiprocessing.get_context('spawn')
+    work, results = context.Queue(), context.Queue()
+    for project_number in projects:
+        work.put(project_number)
+    for _ in range(worker_count):
+        work.put(None)
+
+    limiter = RateLimiter(min_interval, context)
+    workers = [
+        context.Process(target=reconcile_worker,
+                        args=(i + 1, username, password, work, results, state_samples, limiter))
+        for i in range(worker_count)
+    ]
+    for worker in workers:
+        worker.start()
+
+    running = worker_count
+    while running:
+        try:
+            result = results.get(timeout=5)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+            continue
+        if result is None:
+            running -= 1
+            continue
+        progress['projects'][str(result['project'])] = result
+        save_progress(username, progress)
+
+    for worker in workers:
+        worker.join()
+
+# ============================================================================
+# REPAIR AND REPORT
+# ============================================================================
+
+def repair_state(state, results, username):
+    """
+    Apply reconciliation results to the state:
+    samples the LIMS has but the state lacks are recorded as processed (and
+    taken off the pending list and the retry queue), and samples the state
+    claims but the LIMS lacks are queued for re-entry (and removed from the
+    hot state and the user's archives).
+    """
+    added = requeued = 0
+    now = get_uk_time().isoformat()
+    retry_queue = state.setdefault('retry_queue', [])
+
+    for result in results:
+        if 'error' in result:
+            continue
+        project_number = result['project']
+
+        for sample_no in result['missing_in_state']:
+            state['processed_samples'].append({
+                'project': project_number,
+                'sample': sample_no,
+                'timestamp': now,
+                'source': 'reconcile'
+            })
+            # Already on the LIMS, so the runner must not schedule it again
+            settle_sample(state, project_number, sample_no)
+            remove_pending_sample(state, project_number, sample_no)
+            clear_sample_checkpoint(state, project_number, sample_no)
+            key = sample_key(project_number, sample_no)
+            retry_queue[:] = [r for r in retry_queue if sample_key(r['project'], r['sample']) != key]
+            added += 1
+
+        missing = set(result['missing_on_lims'])
+        if missing:
+            state['processed_samples'] = [
+                r for r in state['processed_samples']
+                if not (r.get('project') == project_number and r.get('sample') in missing)
+            ]
+            dropped = drop_archived_samples(username, project_number, missing)
+            if dropped:
+                totals = state.setdefault('archived_totals', {})
+                totals['processed_samples'] = max(0, totals.get('processed_samples', 0) - dropped)
+            for sample_no in sorted(missing):
+                if not any(r['project'] == project_number and r['sample'] == sample_no for r in retry_queue):
+                    retry_queue.append({
+                        'project': project_number,
+                        'sample': sample_no,
+                        'attempts': 0,
+                        'last_reason': 'Not saved on the LIMS (reconciliation)',
+                        'next_attempt_after': now
+                    })
+                    requeued += 1
+
+    return added, requeued
+
+# Fields of the state file a repair may change; everything else is left as it is on disk
+REPAIRED_FIELDS = ('processed_samples', 'retry_queue', 'pending_samples', 'settled_row_hashes',
+                   'sample_checkpoints', 'archived_totals')
+
+def write_repaired_state(username, results):
+    """
+    Repair the user's state file as it is now and merge back only the sample
+    bookkeeping fields. Unlike save_state this does not write this process's
+    wait latencies or result targets and does not archive any history.
+    Returns (added, requeued), or None when the user has no state file.
+    """
+    state = peek_state(username)
+    if not state:
+        return None
+    state.setdefault('processed_samples', [])
+    added, requeued = repair_state(state, results, username)
+
+    # Re-read right before writing, in case the automation saved in the meantime
+    latest = peek_state(username)
+    latest.update({field: state[field] for field in REPAIRED_FIELDS if field in state})
+    state_file = get_user_config(username)['state_file']
+    with open(state_file + '.tmp', 'w') as f:
+        json.dump(latest, f, indent=2, default=str)
+    os.replace(state_file + '.tmp', state_file)
+    return added, requeued
+
+def print_report(results):
+    print(f"\n{'='*80}")
+    print("📊 RECONCILIATION REPORT")
+    print(f"{'='*80}")
+    for result in sorted(results, key=lambda r: r['project']):
+        if 'error' in result:
+            print(f"   ⚠️  {result['project']}: {result['error']}")
+        elif result['missing_on_lims'] or result['missing_in_state']:
+            print(f"   ❌ {result['project']}: missing on LIMS {result['missing_on_lims']}, "
+                  f"missing in state {result['missing_in_state']}")
+        else:
+            print(f"   ✅ {result['project']}: {len(result['lims_complete'])} completed sample(s) in sync")
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile a user's state file with the LIMS.")
+    parser.add_argument('username')
+    parser.add_argument('--projects', type=int, nargs='*', help='Projects to check (default: all in the state)')
+    parser.add_argument('--workers', type=int, default=2, help='Concurrent browser sessions')
+    parser.add_argument('--min-interval', type=float, default=20.0,
+                        help='Minimum seconds between project visits across all workers')
+    parser.add_argument('--repair', action='store_true', help='Write the differences back to the state file')
+    parser.add_argument('--restart', action='store_true', help='Ignore progress from an earlier run')
+    args = parser.parse_args()
+
+    username = args.username.lower()
+    config = get_user_config(username)
+    password = os.environ.get(config['password_env_var'], '')
+    if not password:
+        print(f"❌ Password not found in environment variable {config['password_env_var']}")
+        return
+
+    state = peek_state(username)
+    archived = load_archived_history(username)
+    projects = args.projects or default_projects(state, archived)
+    progress = load_progress(username, args.restart)
+
+    todo = [p for p in projects if str(p) not in progress['projects']]
+    worker_count = max(1, min(args.workers, len(todo)))
+    print(f"🚀 Reconciling {len(todo)} of {len(projects)} project(s) for {username} with {worker_count} worker(s)")
+    if todo:
+        run_workers(username, password, todo, processed_samples_by_project(state, archived),
+                    progress, worker_count, args.min_interval)
+
+    results = [progress['projects'][str(p)] for p in projects if str(p) in progress['projects']]
+    print_report(results)
+
+    if args.repair:
+        repaired = write_repaired_state(username, results)
+        if repaired is None:
+            print(f"❌ No state file for {username} - nothing to repair")
+        else:
+            print(f"🔧 State repaired: {repaired[0]} sample(s) recorded as processed, {repaired[1]} queued for re-entry")
+
+if __name__ == "__main__":
+    main()
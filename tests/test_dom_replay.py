@@ -0,0 +1,52 @@
+"""
+Locator plans checked offline against pages recorded from mock_lims.py
+(tests/dom_recordings). Re-record after changing the mock or a plan with
+    RECORD_DOM_DIR=tests/dom_recordings python benchmark_mock_lims.py --runs 10
+and replace the old recording folder.
+"""
+import os
+
+import pytest
+
+import dom_replay
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dom_recordings')
+RUNS = dom_replay.find_recordings([RECORDINGS])
+
+def plan_pages(run_dir):
+    pages = {}
+    for entry in dom_replay.load_manifest(run_dir):
+        parts = entry['label'].split('.')
+        if len(parts) == 3 and parts[0] == 'plan':
+            pages.setdefault(parts[1], {})[int(parts[2])] = entry
+    return pages
+
+def test_recordings_are_present():
+    assert RUNS
+
+@pytest.mark.parametrize('run_dir', RUNS)
+def test_recorded_pages_pass_every_check(run_dir):
+    assert dom_replay.replay_run(run_dir, None, False) == 0
+
+@pytest.mark.parametrize('run_dir', RUNS)
+def test_every_plan_step_has_a_recorded_page(run_dir):
+    pages = plan_pages(run_dir)
+    for kind, plan in dom_replay.RESULT_ELEMENT_PLANS.items():
+        assert sorted(pages.get(kind, {})) == list(range(len(plan))), kind
+
+@pytest.mark.parametrize('run_dir', RUNS)
+def test_changed_locator_is_reported(run_dir, monkeypatch):
+    plans = {kind: list(plan) for kind, plan in dom_replay.RESULT_ELEMENT_PLANS.items()}
+    plans['NAD'][1] = plans['NAD'][1].replace('FIBRE_ANALYSIS_LIST', 'FIBRE_ANALYSIS_GRID')
+    monkeypatch.setattr(dom_replay, 'RESULT_ELEMENT_PLANS', plans)
+
+    assert dom_replay.replay_run(run_dir, ['NAD'], False) == 1
+
+@pytest.mark.parametrize('run_dir', RUNS)
+def test_wrong_sample_fails_verification(run_dir):
+    cache = {}
+    for entry in dom_replay.load_manifest(run_dir):
+        if entry['label'] == 'sample.navigate':
+            root = dom_replay.load_snapshot(run_dir, entry, cache)
+            assert dom_replay.check_sample_verification(root, entry['sample'])[0]
+            assert not dom_replay.check_sample_verification(root, 99)[0]
@@ -0,0 +1,75 @@
+"""
+The optional HTTP engine against the mock LIMS, and its fallback to the
+browser when no endpoints are configured (the default).
+"""
+import contextlib
+import socket
+
+import pandas as pd
+import pytest
+
+import automation_script as a
+import lims_http_client
+from mock_lims import MOCK_HTTP_ENDPOINTS, build_projects, start_mock_lims
+
+PROJECT = 31700
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def mock_lims(monkeypatch):
+    projects = build_projects(1, 3)
+    port = free_port()
+    server = start_mock_lims(port, projects, latency_ms=0, jitter_ms=0, popup_rate=0,
+                             create_records_seconds=0, save_ms=0)
+    monkeypatch.setattr(a, 'LIMS_BASE_URL', f"http://localhost:{port}/")
+    monkeypatch.setattr(lims_http_client, '_sessions', {})
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def learned_nad(monkeypatch):
+    monkeypatch.setattr(a, 'result_targets', {'NAD': [{'select': [], 'options': {'0': 'Not Detected'}}]})
+    monkeypatch.setattr(a, 'step_span', lambda name: contextlib.nullcontext())
+
+def fresh_state():
+    return {'current_project': PROJECT, 'current_sample_index': 0, 'processed_samples': [],
+            'failed_samples': [], 'retry_queue': [], 'completed_projects': [],
+            'total_samples_processed': 0, 'user': 'test'}
+
+def project_rows():
+    return pd.DataFrame({'Project Number': [PROJECT], 'Sample No.': [1], 'Analysis 1': ['NAD']})
+
+def test_no_endpoints_without_a_file():
+    assert lims_http_client.load_endpoints(None) == {}
+
+def test_unconfigured_endpoints_fall_back_to_browser(mock_lims, learned_nad, monkeypatch):
+    monkeypatch.setattr(lims_http_client, 'LIMS_HTTP_ENDPOINTS', {})
+    state = fresh_state()
+
+    assert a.process_sample_over_http(state, project_rows(), 0, 'test', 'pw', PROJECT, 1) is None
+    assert state['processed_samples'] == []
+    assert not mock_lims.lims['stats']
+
+def test_unlearned_result_falls_back_to_browser(mock_lims, monkeypatch):
+    monkeypatch.setattr(lims_http_client, 'LIMS_HTTP_ENDPOINTS', dict(MOCK_HTTP_ENDPOINTS))
+    monkeypatch.setattr(a, 'result_targets', {})
+
+    assert a.process_sample_over_http(fresh_state(), project_rows(), 0, 'test', 'pw', PROJECT, 1) is None
+
+def test_saves_over_http_and_opens_project_once(mock_lims, learned_nad, monkeypatch):
+    monkeypatch.setattr(lims_http_client, 'LIMS_HTTP_ENDPOINTS', dict(MOCK_HTTP_ENDPOINTS))
+    state = fresh_state()
+
+    for sample_no in (1, 2):
+        assert a.process_sample_over_http(state, project_rows(), 0, 'test', 'pw', PROJECT, sample_no) is True
+
+    saved = mock_lims.lims['projects'][PROJECT][:2]
+    assert all(r['complete'] and r['options'][0] == 'Not Detected' for r in saved)
+    assert [r['engine'] for r in state['processed_samples']] == ['http', 'http']
+    assert mock_lims.lims['stats']['open'] == 1
+    assert mock_lims.lims['stats']['login'] == 1
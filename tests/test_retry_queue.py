@@ -0,0 +1,58 @@
+"""Retry backoff of failed samples."""
+from datetime import datetime, timedelta
+
+import pytz
+import pytest
+
+import automation_script as a
+
+NOW = pytz.timezone('Europe/London').localize(datetime(2025, 6, 15, 12, 0))
+
+@pytest.fixture(autouse=True)
+def fixed_time(monkeypatch):
+    monkeypatch.setattr(a, 'get_uk_time', lambda: NOW)
+
+def new_state():
+    return {'failed_samples': [], 'retry_queue': [], 'pending_samples': ['7:1'], 'settled_row_hashes': {}}
+
+def fail_again(state, reason='Step failed'):
+    """Fail the sample once more as a retry run would."""
+    state['active_retry'] = dict(state['retry_queue'][0]) if state['retry_queue'] else None
+    a.record_sample_failure(state, 7, 1, reason)
+
+def test_backoff_grows_until_the_attempts_run_out():
+    state = new_state()
+    waits = []
+    for _ in range(a.MAX_SAMPLE_ATTEMPTS - 1):
+        fail_again(state)
+        assert len(state['retry_queue']) == 1
+        retry = state['retry_queue'][0]
+        waits.append(datetime.fromisoformat(retry['next_attempt_after']) - NOW)
+    
+    assert waits == [timedelta(minutes=m) for m in a.RETRY_BACKOFF_MINUTES[:a.MAX_SAMPLE_ATTEMPTS - 1]]
+    assert state['retry_queue'][0]['attempts'] == a.MAX_SAMPLE_ATTEMPTS - 1
+    assert state['pending_samples'] == []
+    
+    fail_again(state)
+    
+    assert state['retry_queue'] == []
+    assert [f['attempt'] for f in state['failed_samples']] == list(range(1, a.MAX_SAMPLE_ATTEMPTS + 1))
+    assert not state['failed_samples'][-1]['will_retry']
+    # Given up at the current row content, so it is not scheduled again until edited
+    assert '7:1' in state['settled_row_hashes']
+
+def test_retry_is_not_due_before_its_backoff():
+    state = new_state()
+    fail_again(state)
+    retry = state['retry_queue'][0]
+    
+    assert not a._retry_due(retry, NOW)
+    assert a._retry_due(retry, NOW + timedelta(minutes=a.RETRY_BACKOFF_MINUTES[0]))
+
+def test_permanent_failure_is_not_retried():
+    state = new_state()
+    a.record_sample_failure(state, 7, 1, 'Empty Analysis 1', permanent=True)
+    
+    assert state['retry_queue'] == []
+    assert state['failed_samples'][0]['permanent']
+    assert state['pending_samples'] == []
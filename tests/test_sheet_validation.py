@@ -0,0 +1,46 @@
+"""Up-front validation of the results sheet rows."""
+import pandas as pd
+
+import automation_script as a
+
+def sheet(rows):
+    return pd.DataFrame(rows, columns=['Project Number', 'Sample No.', 'Analysis 1'])
+
+def test_valid_rows_get_integer_numbers():
+    valid, report = a.validate_results_sheet(sheet([['101', '1', 'NAD'], [101.0, ' 2 ', 'Chrysotile detected']]))
+    
+    assert report['invalid_rows'] == 0
+    assert report['rejected_by_project'] == {}
+    assert list(valid['Project Number']) == [101, 101]
+    assert list(valid['Sample No.']) == [1, 2]
+
+def test_each_problem_is_flagged():
+    df = sheet([
+        ['101', '1', 'NAD'],
+        [None, '2', 'NAD'],          # project number gap
+        ['101', '', 'NAD'],          # missing sample number
+        ['101', '3a', 'NAD'],        # not an integer
+        ['101', '4', 'NAD'],
+        ['101', '4', 'Amosite'],     # repeated in the project
+        ['101', '5', ''],            # empty result
+        ['101', '6', 'Tremolite'],   # no result-entry plan
+    ])
+    
+    valid, report = a.validate_results_sheet(df)
+    
+    assert list(valid['Sample No.']) == [1]
+    assert report['invalid_rows'] == 7
+    assert report['issues'] == {
+        'project_number_gap': 1, 'missing_sample_number': 1, 'invalid_sample_number': 1,
+        'duplicate_sample_number': 2, 'missing_analysis_result': 1, 'unknown_analysis_result': 1,
+    }
+    assert [r['row'] for r in report['rows']] == [3, 4, 5, 6, 7, 8, 9]
+    # Rows without a project cannot count towards any project's sample count
+    assert report['rejected_by_project'] == {101: 6}
+
+def test_missing_columns_reject_the_whole_sheet():
+    valid, report = a.validate_results_sheet(pd.DataFrame({'Project Number': [1], 'Sample No.': [1]}))
+    
+    assert valid.empty
+    assert report['issues'] == {'missing_columns': ['Analysis 1']}
+    assert report['invalid_rows'] == 1
@@ -0,0 +1,59 @@
+"""Moving old sample records out of the state file into per-month archives."""
+from datetime import datetime, timedelta
+
+import pytz
+import pytest
+
+import automation_script as a
+
+NOW = pytz.timezone('Europe/London').localize(datetime(2025, 6, 15, 12, 0))
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(a, 'STATE_ARCHIVE_DIR', str(tmp_path))
+    monkeypatch.setattr(a, 'STATE_ARCHIVE_DAYS', 30)
+    return tmp_path
+
+def record(project, sample, days_ago):
+    return {'project': project, 'sample': sample, 'timestamp': (NOW - timedelta(days=days_ago)).isoformat()}
+
+def test_archive_month_of_old_records_only():
+    cutoff = NOW - timedelta(days=30)
+    assert a._archive_month(record(1, 1, 45), cutoff) == '2025-05'
+    assert a._archive_month(record(1, 1, 5), cutoff) is None
+    # Naive timestamps from older states compare against a naive cutoff
+    assert a._archive_month({'timestamp': '2025-01-02T09:00:00'}, cutoff) == '2025-01'
+    assert a._archive_month({'timestamp': 'not a date'}, cutoff) is None
+    assert a._archive_month({}, cutoff) is None
+
+def test_compact_state_moves_old_records_and_counts_them():
+    old, recent = record(1, 1, 45), record(1, 2, 5)
+    failed = record(1, 3, 100)
+    state = {'settled_row_hashes': {}, 'processed_samples': [old, recent], 'failed_samples': [failed]}
+    
+    assert a.compact_state(state, 'tester', now=NOW) == 2
+    
+    assert state['processed_samples'] == [recent]
+    assert state['failed_samples'] == []
+    assert state['archived_totals'] == {'processed_samples': 1, 'failed_samples': 1}
+    assert a.load_archived_history('tester') == [old]
+    assert a.load_archived_history('tester', 'failed_samples') == [failed]
+
+def test_compact_state_does_not_archive_a_record_twice():
+    old = record(1, 1, 45)
+    a.compact_state({'settled_row_hashes': {}, 'processed_samples': [old]}, 'tester', now=NOW)
+    
+    # The state was not saved after the archive was written
+    state = {'settled_row_hashes': {}, 'processed_samples': [old], 'archived_totals': {'processed_samples': 1}}
+    a.compact_state(state, 'tester', now=NOW)
+    
+    assert state['processed_samples'] == []
+    assert state['archived_totals'] == {'processed_samples': 1}
+    assert a.load_archived_history('tester') == [old]
+
+def test_compact_state_waits_for_the_row_index(archive_dir):
+    state = {'processed_samples': [record(1, 1, 45)]}
+    
+    assert a.compact_state(state, 'tester', now=NOW) == 0
+    assert len(state['processed_samples']) == 1
+    assert not (archive_dir / 'tester').exists()
@@ -0,0 +1,107 @@
+"""
+Migration of the committed state files (written by the positional scheduler)
+to settled_row_hashes, checked against a sheet rebuilt from their projects.
+"""
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import automation_script as a
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_FILES = ['automation_state.json', 'automation_state_shane.json']
+NEW_PROJECT = 99999
+SAMPLES_PER_PROJECT = 3
+
+def load_committed_state(name):
+    with open(os.path.join(REPO, name), 'r') as f:
+        return json.load(f)
+
+def sheet_for(state):
+    """A sheet holding every project the state mentions, plus one new project."""
+    samples = {}
+    for project_number in state['completed_projects']:
+        samples.setdefault(project_number, set()).update(range(1, SAMPLES_PER_PROJECT + 1))
+    for record in state['processed_samples']:
+        samples.setdefault(record['project'], set()).add(record['sample'])
+    if state.get('current_project') is not None:
+        samples.setdefault(state['current_project'], set()).update(range(1, SAMPLES_PER_PROJECT + 1))
+    samples[NEW_PROJECT] = {1, 2}
+    
+    rows = [{'Project Number': p, 'Sample No.': s, 'Stereo Binocular Start Time': '', 'Analysis 1': 'NAD'}
+            for p in samples for s in sorted(samples[p])]
+    return pd.DataFrame(rows)
+
+@pytest.mark.parametrize('name', STATE_FILES)
+def test_completed_projects_stay_settled(name):
+    state = load_committed_state(name)
+    df = sheet_for(state)
+    
+    a.update_pending_samples(df, state)
+    
+    completed = set(state['completed_projects'])
+    assert completed, "the committed state should have completed projects"
+    pending_projects = {a.parse_sample_key(k)[0] for k in state['pending_samples']}
+    assert not pending_projects & completed
+    assert {a.sample_key(NEW_PROJECT, 1), a.sample_key(NEW_PROJECT, 2)} <= set(state['pending_samples'])
+    # Only the new project and the unfinished part of the current project are left
+    assert pending_projects <= {NEW_PROJECT, state['current_project']}
+    # Completed projects are still complete
+    assert completed <= set(state['completed_projects'])
+
+@pytest.mark.parametrize('name', STATE_FILES)
+def test_processed_samples_stay_settled(name):
+    state = load_committed_state(name)
+    a.update_pending_samples(sheet_for(state), state)
+    
+    processed = {a.sample_key(r['project'], r['sample']) for r in load_committed_state(name)['processed_samples']}
+    assert processed
+    assert not processed & set(state['pending_samples'])
+
+@pytest.mark.parametrize('name', STATE_FILES)
+def test_edited_row_of_completed_project_is_scheduled(name):
+    state = load_committed_state(name)
+    df = sheet_for(state)
+    a.update_pending_samples(df, state)
+    
+    project_number = state['completed_projects'][0]
+    edited = df.copy()
+    row = edited.index[(edited['Project Number'] == project_number) & (edited['Sample No.'] == 1)][0]
+    edited.loc[row, 'Analysis 1'] = 'Chrysotile'
+    
+    _, changed = a.update_pending_samples(edited, state)
+    
+    assert changed == [a.sample_key(project_number, 1)]
+    assert a.sample_key(project_number, 1) in state['pending_samples']
+    assert project_number not in state['completed_projects']
+
+def test_migration_from_full_row_index_keeps_open_samples_unsettled():
+    # The scheduler before settled_row_hashes kept a full index of the sheet
+    state = {
+        'sheet_row_hashes': {'1:1': 'a', '1:2': 'b', '1:3': 'c', '2:1': 'd'},
+        'pending_samples': ['1:2'],
+        'retry_queue': [{'project': 2, 'sample': 1, 'attempts': 1}],
+        'completed_projects': [],
+    }
+    
+    a._migrate_row_tracking(pd.DataFrame(columns=['Project Number', 'Sample No.']), state)
+    
+    assert 'sheet_row_hashes' not in state
+    assert state['settled_row_hashes'] == {'1:1': 'a', '1:3': 'c'}
+
+def test_migration_without_row_index_settles_work_done_by_position():
+    df = pd.DataFrame({'Project Number': [1, 1, 2, 2, 2, 3],
+                       'Sample No.': ['1', '2', '1', '2', '3', '1']})
+    state = {
+        'processed_samples': [{'project': 3, 'sample': 1}],
+        'completed_projects': [1],
+        'current_project': 2,
+        'current_sample_index': 2,
+    }
+    
+    a._migrate_row_tracking(df, state)
+    
+    # Hashes are adopted from the sheet on the next update_pending_samples
+    assert state['settled_row_hashes'] == dict.fromkeys(['1:1', '1:2', '2:1', '2:2', '3:1'])